@@ -1,5 +1,16 @@
 # 导入函数库
 from jqdata import *
+import numpy as np
+try:
+    # 本地引擎特有: 按预计算的状态矩阵一次过滤一批股票、一次提交整篮委托、记录结构化交易流水，
+    # 聚宽平台上没有，退回逐只处理，流水不记录；多因子排名退回按市值分位区间选股，
+    # 一篮子的成交量比例退回取历史计算
+    from jqdata import tradable_mask, factor_rank, basket_volume_ratio, order_target_basket, record_event
+except ImportError:
+    tradable_mask = factor_rank = basket_volume_ratio = order_target_basket = None
+
+    def record_event(event, **fields):
+        pass
 
 '''
 今天目标处理两个问题：
@@ -41,54 +52,110 @@ def initialize(context):
     g.buy_date = None  # 买入日期
     g.initial_portfolio_value = 0  # 初始投资组合价值
     g.kc_buffer = 0.05     #添加科创板保护缓冲比例参数
+    g.profit_target = 0.15  # 收益率门槛(条件1/条件2的分界)
+    g.min_hold_days = 7     # 最少持有天数(之后才检查布林带收紧)
     
+    # 修改点11: 布林带收紧检测器可插拔, "relative"=相对收紧, "absolute"=绝对收紧(见SQUEEZE_DETECTORS)
+    g.squeeze_detector = "relative"
     # 修改点1: 添加相对收紧阈值参数
     g.relative_squeeze_ratio = 0.7  # 相对收紧比例阈值(当前宽度<历史平均宽度的70%)
+    # 绝对收紧阈值: 小市值股价通常在5-20元之间，布林带宽度=4×标准差，阈值1.0对应20日标准差0.25
+    g.absolute_squeeze_threshold = 1.0  # 布林带宽度绝对阈值
+    # 布林带参数: 窗口长度、带宽倍数、取多少天历史(当前窗口之外的窗口用来算历史平均宽度，绝对收紧只用当前窗口)
+    g.boll_window = 20
+    g.boll_k = 2
+    g.boll_history = 40
+    g.basket_indicator = None  # 当前一篮子的增量布林带/成交量状态
+    # 修改点13: 盘中回撤监控，开启后每根bar(分钟回放时每分钟)更新回撤，达到阈值当场进入清仓
+    g.intraday_stop_loss = False
+    g.drawdown_tracker = DrawdownTracker()
+    # 修改点16: 多因子选股(本地引擎)，None时按原来的市值5%-10%分位区间选股
+    # 因子: cap=市值, turnover=换手率, momentum=短期动量, volatility=波动率, liquidity=流动性
+    # 权重为负偏好因子值小的股票，如 {'cap': -1.0, 'momentum': -0.3, 'volatility': -0.3}
+    g.factor_weights = None
+    g.factor_method = 'rank'  # 'rank'=分位排名, 'zscore'=标准分
+    g.factor_window = 20      # 换手率/动量/波动率/流动性的回看天数
+    # 修改点17: 成交量萎缩的回看天数(最近一天 vs 之前4天平均)，可以参数扫描
+    g.volume_lookback = 4
     
     # 运行函数
     run_daily(trade, 'every_bar')
     run_daily(after_market_update, 'after_close')
 
 
-def check_stocks(context):
-    """选择市值在5%到10%分位数之间的最小10支股票"""
-    # 使用前一天作为查询日期
-    query_date = context.previous_date
-    
-    # 查询所有A股股票的市值
-    q_all = query(
-        valuation.code,
-        valuation.market_cap
-    )
-    df_all = get_fundamentals(q_all, date=query_date)  # 指定查询日期
-    
-    if df_all is None or len(df_all) == 0:
-        return []
-    
-    # 去除市值NaN值（如果有）
-    df_all = df_all.dropna(subset=['market_cap'])
-    
-    # 按市值升序排序
-    df_sorted = df_all.sort_values('market_cap', ascending=True)
-    
-    # 计算5%和10%分位数对应的索引位置
-    n = len(df_sorted)
-    idx_low = int(n * 0.05)  # 5%分位数位置（向下取整）
-    idx_high = int(n * 0.10)  # 10%分位数位置（向下取整）
+# 按查询日期缓存的市值分位区间快照 {(查询日期, 下分位, 上分位): 按市值升序的股票列表}
+# 以及多因子排名 {(查询日期, 因子权重, 标准化方法, 回看天数): 按合成分数降序的股票列表}
+_quantile_band_cache = {}
+
+def select_quantile_band(codes, values, low, high):
+    """
+    按values升序取排名在[low, high)分位区间内的代码，区间内按values升序返回
+    用argpartition做部分选择(O(n))，只对区间内的少量股票排序
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    # 计算分位数对应的索引位置（向下取整）
+    idx_low = int(n * low)
+    idx_high = int(n * high)
     
     # 确保idx_high > idx_low，避免切片为空
     if idx_low >= idx_high:
         idx_high = idx_low + 1
         if idx_high > n:
             idx_high = n
+    if idx_low >= idx_high:
+        return []
+    
+    # 排名idx_low和idx_high-1放到正确位置后，两者之间就是区间[idx_low, idx_high)
+    part = np.argpartition(values, (idx_low, idx_high - 1))
+    band = part[idx_low:idx_high]
+    band = band[np.argsort(values[band], kind='stable')]
+    return list(np.asarray(codes)[band])
+
+def check_stocks(context):
+    """选择市值在5%到10%分位数之间的最小10支股票"""
+    # 使用前一天作为查询日期
+    query_date = context.previous_date
     
-    # 选择市值排名在5%到10%之间的股票
-    selected_df = df_sorted.iloc[idx_low:idx_high]  # 切片: [idx_low, idx_high)
+    # 修改点16: 设置了因子权重时，全市场按多因子合成分数从高到低选股
+    if g.factor_weights:
+        if factor_rank is not None:
+            weights = tuple(sorted(g.factor_weights.items()))
+            cache_key = (query_date, weights, g.factor_method, g.factor_window)
+            ranked = _quantile_band_cache.get(cache_key)
+            if ranked is None:
+                # 缓存完整排名，多个实例共用这个缓存时各自按自己的持仓数量截取
+                ranked = factor_rank(g.factor_weights, g.factor_method, g.factor_window)
+                _quantile_band_cache[cache_key] = ranked
+            # 多取几倍候选，过滤停牌和ST后仍够持仓数量
+            return filter_paused_stock(ranked[:g.stocknum * 5])[:g.stocknum]
+        log.warn("多因子选股只在本地引擎上可用，按市值分位区间选股")
+    
+    # 修改点10: 同一查询日期的市值分位区间只算一次(参数扫描时每个空仓日都会选股)
+    cache_key = (query_date, 0.05, 0.10)
+    buylist = _quantile_band_cache.get(cache_key)
+    if buylist is None:
+        # 查询所有A股股票的市值
+        q_all = query(
+            valuation.code,
+            valuation.market_cap
+        )
+        df_all = get_fundamentals(q_all, date=query_date)  # 指定查询日期
+        
+        if df_all is None or len(df_all) == 0:
+            return []
+        
+        # 去除市值NaN值（如果有）
+        df_all = df_all.dropna(subset=['market_cap'])
+        
+        # 选择市值排名在5%到10%之间的股票(部分选择，不对全市场排序)
+        buylist = select_quantile_band(df_all['code'].values, df_all['market_cap'].values, 0.05, 0.10)
+        _quantile_band_cache[cache_key] = buylist
     
-    if len(selected_df) == 0:
+    if len(buylist) == 0:
         return []
     
-    buylist = list(selected_df['code'])
+    buylist = list(buylist)
     
     # 过滤停牌股票和ST股票
     buylist = filter_paused_stock(buylist)
@@ -101,6 +168,11 @@ def filter_paused_stock(stock_list):
     if not stock_list:
         return []
     
+    # 修改点12: 本地引擎上一次掩码过滤整个候选区间
+    if tradable_mask is not None:
+        mask = tradable_mask(stock_list)
+        return [stock for stock, ok in zip(stock_list, mask) if ok]
+    
     # 获取当前时间数据字典
     current_data = get_current_data()
     
@@ -126,6 +198,26 @@ def filter_paused_stock(stock_list):
     return result
     
     
+class DrawdownTracker(object):
+    """流式回撤: 每来一个组合价值O(1)更新最高点和当前回撤"""
+    __slots__ = ('high', 'drawdown')
+
+    def __init__(self, high=0):
+        self.reset(high)
+
+    def reset(self, high=0):
+        self.high = high
+        self.drawdown = 0
+
+    def update(self, value):
+        """更新并返回当前回撤"""
+        if value > self.high:
+            self.high = value
+            self.drawdown = 0
+        elif self.high > 0:
+            self.drawdown = (self.high - value) / self.high
+        return self.drawdown
+    
 ## 计算当前回撤
 def calculate_drawdown(context):
     """计算从最高点的回撤"""
@@ -172,10 +264,18 @@ def clear_all_positions(context):
     if len(context.portfolio.positions) == 0:
         return True
     
+    positions = list(context.portfolio.positions.keys())
+    
+    # 修改点14: 本地引擎上整篮卖出一次提交，科创板保护价按数组计算
+    if order_target_basket is not None:
+        closeable = np.array([context.portfolio.positions[s].closeable_amount > 0 for s in positions])
+        sellable = tradable_mask(positions, st=False) & closeable
+        order_target_basket([s for s, ok in zip(positions, sellable) if ok], 0, kc_buffer=g.kc_buffer)
+        return bool(sellable.all())
+    
     # 获取当前时间数据字典
     current_data = get_current_data()
     
-    positions = list(context.portfolio.positions.keys())
     all_orders_placed = True  # 表示"是否已下单"
     
     for stock in positions:
@@ -226,61 +326,262 @@ def buy_stocks(context):
     if not g.stock_list:
         return
     
-    # 获取当前时间数据字典，用于检查是否可以买入
-    current_data = get_current_data()
-    
     # 计算每只股票的投资金额
     available_cash = context.portfolio.available_cash
-    num_to_buy = 0
-    valid_stocks = []
     
-    # 检查每只股票是否可以交易
-    for stock in g.stock_list:
-        try:
-            stock_data = current_data[stock]
-            if not stock_data.paused and not stock_data.is_st:
-                valid_stocks.append(stock)
-                num_to_buy += 1
-                if num_to_buy >= g.stocknum:
-                    break
-        except Exception as e:
-            continue
-    
-    if num_to_buy == 0:
-        return
+    # 修改点12: check_stocks刚在同一时刻过滤过停牌和ST，不再逐只重复检查
+    valid_stocks = g.stock_list[:g.stocknum]
+    num_to_buy = len(valid_stocks)
     
     cash_per_stock = available_cash / num_to_buy
     
-    for stock in valid_stocks:
-        try:
-            # 修改点3: 为科创板股票添加保护限价
-            # 检查是否是科创板（代码以688开头）
-            if stock.startswith('688'):
-                # 获取开盘价
-                open_price = get_current_data()[stock].day_open
-                if open_price > 0:
-                    # 科创板买入保护价 = 开盘价 × (1 + 安全缓冲)
-                    limit_price = open_price * (1 + g.kc_buffer)
-                    # 计算买入数量
-                    amount = int(cash_per_stock / open_price / 100) * 100
-                    if amount > 0:
-                        # 使用限价单
-                        order(stock, amount, style=MarketOrderStyle(limit_price))
-                        log.info(f"科创板买入: {stock}, 数量: {amount}, 限价: {limit_price:.2f}")
+    # 修改点14: 本地引擎上整篮买入一次提交，数量取整和科创板保护价按数组计算
+    if order_target_basket is not None:
+        order_target_basket(valid_stocks, cash_per_stock, kc_buffer=g.kc_buffer)
+    else:
+        for stock in valid_stocks:
+            try:
+                # 修改点3: 为科创板股票添加保护限价
+                # 检查是否是科创板（代码以688开头）
+                if stock.startswith('688'):
+                    # 获取开盘价
+                    open_price = get_current_data()[stock].day_open
+                    if open_price > 0:
+                        # 科创板买入保护价 = 开盘价 × (1 + 安全缓冲)
+                        limit_price = open_price * (1 + g.kc_buffer)
+                        # 计算买入数量
+                        amount = int(cash_per_stock / open_price / 100) * 100
+                        if amount > 0:
+                            # 使用限价单
+                            order(stock, amount, style=MarketOrderStyle(limit_price))
+                            log.info(f"科创板买入: {stock}, 数量: {amount}, 限价: {limit_price:.2f}")
+                    else:
+                        # 如果开盘价为0，跳过
+                        continue
                 else:
-                    # 如果开盘价为0，跳过
-                    continue
-            else:
-                # 非科创板使用市价单
-                order_value(stock, cash_per_stock)
-        except Exception as e:
-            log.error(f"买入股票失败: {stock}, 错误: {e}")
-            pass
+                    # 非科创板使用市价单
+                    order_value(stock, cash_per_stock)
+            except Exception as e:
+                log.error(f"买入股票失败: {stock}, 错误: {e}")
+                pass
     
     # 在买入时记录买入日期和初始投资组合价值
     g.buy_date = context.current_dt
     g.initial_portfolio_value = context.portfolio.total_value
     log.info(f"【买入】日期: {g.buy_date.date()}, 买入金额: {g.initial_portfolio_value:.2f}")
+    # 修改点15: 决策同时写进结构化交易流水(本地引擎按列存成Parquet)，分析时不用解析日志文本
+    record_event('buy', orders=num_to_buy)
+    
+    # 修改点9: 买入成交后建立一篮子的增量布林带/成交量状态，之后每天收盘只追加一根bar
+    update_basket_indicator(context)
+
+def update_basket_indicator(context):
+    """持仓变化时重建增量状态，否则追加最新一根bar"""
+    positions = list(context.portfolio.positions.keys())
+    history = get_squeeze_detector().history
+    if not positions:
+        g.basket_indicator = None
+    elif (g.basket_indicator is None or set(g.basket_indicator.stocks) != set(positions)
+          or g.basket_indicator.history != history or g.basket_indicator.volume_days != g.volume_lookback + 1):
+        g.basket_indicator = BasketIndicator(positions, g.boll_window, g.boll_k, history, g.volume_lookback + 1)
+    else:
+        g.basket_indicator.update()
+
+def rolling_bollinger(prices, window=20, k=2):
+    """
+    滑动窗口布林带: 用累计和/累计平方和一次算出所有窗口的均线和带宽(上轨-下轨=2k×标准差)
+    prices: 最后一维是时间，可以是一条序列(n,)，也可以是多只股票(股票数, n)
+    返回 (均线, 带宽)，最后一维长度为 n-window+1，第i个对应窗口[i, i+window)
+    """
+    x = np.asarray(prices, dtype=float)
+    # 先减去整体均值，减小累计平方和的舍入误差
+    center = x.mean(axis=-1, keepdims=True)
+    x = x - center
+    zeros = np.zeros(x.shape[:-1] + (1,))
+    cum1 = np.concatenate((zeros, np.cumsum(x, axis=-1)), axis=-1)
+    cum2 = np.concatenate((zeros, np.cumsum(x * x, axis=-1)), axis=-1)
+    mean = (cum1[..., window:] - cum1[..., :-window]) / window
+    var = (cum2[..., window:] - cum2[..., :-window]) / window - mean * mean
+    bandwidth = 2 * k * np.sqrt(np.maximum(var, 0))
+    return mean + center, bandwidth
+
+def get_history_panel(stocks, count, fields):
+    """
+    一次取出多只股票的日线历史，返回(股票数 × 天数 × 字段数)数组
+    跳过停牌日、不包括当天(与attribute_history(skip_paused=True)一致)，不足count天的在前面补NaN
+    """
+    bars = get_bars(stocks, count, '1d', fields, include_now=False)
+    panel = np.full((len(stocks), count, len(fields)), np.nan)
+    for i, stock in enumerate(stocks):
+        data = bars.get(stock)
+        if data is None or len(data) == 0:
+            continue
+        for j, field in enumerate(fields):
+            panel[i, count - len(data):, j] = data[field]
+    return panel
+
+## 布林带收紧检测器
+class SqueezeDetector(object):
+    """
+    布林带收紧检测器接口，check_portfolio_sell_conditions只通过这个接口判断收紧
+    history: 需要多少天的平均价格历史；label: 卖出原因里的名称
+    """
+    label = ""
+    history = 20
+
+    def detect(self, current_bandwidth, avg_bandwidth):
+        """当前带宽、历史平均带宽 -> 是否收紧"""
+        raise NotImplementedError
+
+    def describe(self, current_bandwidth, avg_bandwidth):
+        """日志里的带宽说明"""
+        raise NotImplementedError
+
+class RelativeSqueeze(SqueezeDetector):
+    """相对收紧: 当前宽度 < 历史平均宽度 × ratio"""
+    label = "相对"
+
+    def __init__(self, ratio=0.7, history=40):
+        self.ratio = ratio
+        self.history = history
+
+    def detect(self, current_bandwidth, avg_bandwidth):
+        return avg_bandwidth > 0 and current_bandwidth < avg_bandwidth * self.ratio
+
+    def describe(self, current_bandwidth, avg_bandwidth):
+        bandwidth_ratio = current_bandwidth / avg_bandwidth if avg_bandwidth > 0 else 1
+        return f"带宽比例: {bandwidth_ratio:.2%}, 阈值: {self.ratio:.0%}"
+
+class AbsoluteSqueeze(SqueezeDetector):
+    """绝对收紧: 当前宽度 < 固定阈值，只需要当前窗口"""
+    label = "绝对"
+
+    def __init__(self, threshold=1.0, window=20):
+        self.threshold = threshold
+        self.history = window
+
+    def detect(self, current_bandwidth, avg_bandwidth):
+        return current_bandwidth < self.threshold
+
+    def describe(self, current_bandwidth, avg_bandwidth):
+        return f"当前布林带宽度: {current_bandwidth:.4f}, 阈值: {self.threshold}"
+
+# g.squeeze_detector -> 按当前g参数构造检测器，新增检测器只需在这里注册
+SQUEEZE_DETECTORS = {
+    "relative": lambda: RelativeSqueeze(g.relative_squeeze_ratio, g.boll_history),
+    "absolute": lambda: AbsoluteSqueeze(g.absolute_squeeze_threshold, g.boll_window),
+}
+
+def get_squeeze_detector():
+    return SQUEEZE_DETECTORS[g.squeeze_detector]()
+
+class BasketIndicator(object):
+    """
+    一篮子股票的增量布林带/成交量状态
+    买入成交时用一次批量历史数据初始化，之后每天收盘只追加一根bar:
+    平均价格、带宽、成交量都存在环形缓冲区里，并维护当前窗口的累计和/累计平方和，
+    所以当前带宽、历史平均带宽、成交量比例都是O(1)得到
+    """
+
+    def __init__(self, stocks, window=20, k=2, history=40, volume_days=5):
+        self.stocks = list(stocks)
+        self.window = window
+        self.k = k
+        self.history = history
+        self.volume_days = volume_days
+        self.ready = False
+        self.seed()
+
+    def _fetch(self, count):
+        bars = get_bars(self.stocks, count, '1d', ['date', 'close', 'volume'], include_now=False)
+        return [bars.get(stock, []) for stock in self.stocks]
+
+    def seed(self):
+        """用批量历史数据重建全部状态，有股票历史不足时ready=False"""
+        count = max(self.history, self.volume_days)
+        bars = self._fetch(count)
+        self.last_dates = [b['date'][-1] if len(b) else None for b in bars]
+        self.ready = all(len(b) == count for b in bars)
+        if not self.ready:
+            return
+        prices = np.array([b['close'] for b in bars]).mean(axis=0)[-self.history:]
+        volumes = np.array([b['volume'] for b in bars]).sum(axis=0)[-self.volume_days:]
+
+        # 价格减去初始化时的均值再累加，减小累计平方和的舍入误差
+        self._center = prices.mean()
+        self._prices = prices - self._center
+        self._head = 0
+        current = self._prices[-self.window:]
+        self._sum = current.sum()
+        self._sumsq = (current * current).sum()
+        self.last_price = prices[-1]
+
+        _, bandwidths = rolling_bollinger(prices, self.window, self.k)
+        self._bandwidths = bandwidths
+        self._bw_head = 0
+        self._bw_sum = bandwidths.sum()
+        self.current_bandwidth = bandwidths[-1]
+
+        self._volumes = volumes.astype(float)
+        self._vol_head = 0
+        self._vol_sum = self._volumes.sum()
+        self.last_volume = self._volumes[-1]
+
+    def update(self):
+        """收盘后调用: 每只股票都多了一根bar时O(1)追加，部分股票没有新bar(停牌)时重新初始化"""
+        if not self.ready:
+            self.seed()
+            return
+        bars = self._fetch(1)
+        dates = [b['date'][-1] if len(b) else None for b in bars]
+        advanced = [d != last for d, last in zip(dates, self.last_dates)]
+        if not any(advanced):
+            return
+        if not all(advanced):
+            self.seed()
+            return
+        self.last_dates = dates
+        self._push(np.mean([b['close'][-1] for b in bars]), np.sum([b['volume'][-1] for b in bars]))
+
+    def _push(self, price, volume):
+        history, window = self.history, self.window
+        # 环形缓冲区: _head指向最早的一天，当前窗口是最近window天
+        x = price - self._center
+        leaving = self._prices[(self._head + history - window) % history]
+        self._sum += x - leaving
+        self._sumsq += x * x - leaving * leaving
+        self._prices[self._head] = x
+        self._head = (self._head + 1) % history
+        self.last_price = price
+
+        mean = self._sum / window
+        bandwidth = 2 * self.k * np.sqrt(max(self._sumsq / window - mean * mean, 0))
+        self._bw_sum += bandwidth - self._bandwidths[self._bw_head]
+        self._bandwidths[self._bw_head] = bandwidth
+        self._bw_head = (self._bw_head + 1) % len(self._bandwidths)
+        self.current_bandwidth = bandwidth
+
+        self._vol_sum += volume - self._volumes[self._vol_head]
+        self._volumes[self._vol_head] = volume
+        self._vol_head = (self._vol_head + 1) % self.volume_days
+        self.last_volume = volume
+
+    @property
+    def ma(self):
+        """当前窗口均线"""
+        return self._sum / self.window + self._center
+
+    @property
+    def avg_bandwidth(self):
+        """历史平均带宽(当前窗口之前的所有窗口)"""
+        n = len(self._bandwidths)
+        return (self._bw_sum - self.current_bandwidth) / (n - 1) if n > 1 else 0
+
+    @property
+    def volume_ratio(self):
+        """最近一天成交量 / 之前几天平均成交量，之前几天没有成交量时为None"""
+        past_avg = (self._vol_sum - self.last_volume) / (self.volume_days - 1)
+        return self.last_volume / past_avg if past_avg > 0 else None
 
 def check_portfolio_sell_conditions(context):
     """
@@ -322,97 +623,82 @@ def check_portfolio_sell_conditions(context):
     today_avg_price = 0
     ma20 = 0
     volume_ratio = 0
-    bandwidth_ratio = 0
+    current_bandwidth = 0
+    avg_bandwidth = 0
     price_position_ratio = 0
-    
-    if hold_days >= 7:  # 只有持有天数≥7天时才计算布林带
-        # 修改点4: 修复原代码错误，获取更长时间的历史数据用于相对收紧比较
-        # 原代码错误: 只获取20天数据，无法计算历史平均带宽(滑动窗口需要>20天)
-        # 新代码: 获取40天数据，这样有足够的历史窗口计算平均带宽
-        portfolio_prices = []
-        
-        for stock in positions:
-            # 修改点5: 获取过去40天的收盘价(而不是20天)
-            hist = attribute_history(stock, 40, '1d', ['close'], skip_paused=True, df=True)
-            if hist is not None and len(hist) == 40:  # 确保有完整的40天数据
-                portfolio_prices.append(hist['close'].values)
-        
-        if len(portfolio_prices) == len(positions) and portfolio_prices:
-            # 计算投资组合每天的平均价格
-            import numpy as np
-            portfolio_prices_array = np.array(portfolio_prices)
-            avg_prices = portfolio_prices_array.mean(axis=0)  # 现在avg_prices长度为40
-            
-            # 计算当前20天窗口的布林带宽度(最近20天)
-            current_window = avg_prices[-20:]  # 索引20-39: 最后20天
-            if len(current_window) >= 2:  # 至少需要2个点计算标准差
-                # 计算当前20日均线
-                ma20_current = current_window.mean()
-                # 计算当前20日标准差
-                std20_current = current_window.std()
-            else:
-                ma20_current = 0
-                std20_current = 0
-            
-            # 计算当前布林带宽度
-            upper_band = ma20_current + 2 * std20_current
-            lower_band = ma20_current - 2 * std20_current
-            current_bandwidth = upper_band - lower_band
-            
-            
-            bandwidths = []
-            # 计算历史带宽(滑动20天窗口，从第0天开始)
-            # 我们有40天数据，可以计算21个20天窗口(索引0-19, 1-20, ..., 20-39)
-            # 但当前窗口是第20个窗口(索引20-39)，我们用它作为当前窗口
-            # 历史平均使用前20个窗口(索引0-19到19-38)
-            
-            for i in range(0, 20):  # i从0到19，共20个历史窗口
-                window = avg_prices[i:i+20]  # 窗口i: 第i天到i+19天
-                if len(window) >= 2:  # 至少需要2个点计算标准差
-                    ma20_i = window.mean()
-                    std20_i = window.std()
-                    upper_i = ma20_i + 2 * std20_i
-                    lower_i = ma20_i - 2 * std20_i
-                    bandwidth_i = upper_i - lower_i
-                    bandwidths.append(bandwidth_i)
+    detector = get_squeeze_detector()
+    
+    # 修改点9: 优先使用收盘后增量维护的布林带/成交量状态(O(1))，状态未就绪时才批量取历史数据计算
+    state = g.basket_indicator
+    use_state = (state is not None and state.ready and set(state.stocks) == set(positions)
+                 and state.history == detector.history and state.volume_days == g.volume_lookback + 1)
+    
+    # 修改点8: 收盘价和成交量用一次批量请求取完(股票数 × 天数 × 字段)，不再逐只调用attribute_history
+    close_days = detector.history
+    volume_days = g.volume_lookback + 1
+    # 修改点17: 本地引擎上成交量比例直接从行情库按数据版本算好的成交量窗口矩阵取，不需要为它取历史
+    need_volumes = portfolio_avg_return >= g.profit_target and basket_volume_ratio is None
+    panel = None
+    if not use_state and (hold_days >= g.min_hold_days or need_volumes):
+        panel = get_history_panel(positions, max(close_days, volume_days), ['close', 'volume'])
+    
+    if hold_days >= g.min_hold_days:  # 只有持有天数≥7天时才计算布林带
+        bands = None
+        if use_state:
+            bands = (state.ma, state.current_bandwidth, state.avg_bandwidth, state.last_price)
+        else:
+            # 修改点4: 修复原代码错误，获取更长时间的历史数据用于相对收紧比较
+            # 原代码错误: 只获取20天数据，无法计算历史平均带宽(滑动窗口需要>20天)
+            # 新代码: 获取检测器需要的天数(相对收紧默认40天)，这样有足够的历史窗口计算平均带宽
+            closes = panel[:, -close_days:, 0]
             
-            # 计算历史平均带宽
-            avg_bandwidth = np.mean(bandwidths) if bandwidths else 0
+            if not np.isnan(closes).any():  # 确保每只股票都有完整的历史数据
+                # 计算投资组合每天的平均价格
+                avg_prices = closes.mean(axis=0)  # 长度为detector.history
+                
+                # 修改点6: 一次算出所有滑动窗口的均线和带宽(累计和, O(n))，替代逐窗口循环
+                # 默认40天数据有21个20天窗口(索引0-19, 1-20, ..., 20-39)
+                # 最后一个窗口(最近20天)是当前窗口，前面的窗口用来算历史平均带宽
+                means, bandwidths = rolling_bollinger(avg_prices, g.boll_window, g.boll_k)
+                # 历史平均带宽
+                avg_bandwidth = bandwidths[:-1].mean() if len(bandwidths) > 1 else 0
+                bands = (means[-1], bandwidths[-1], avg_bandwidth, avg_prices[-1])
+        
+        if bands is not None:
+            ma20_current, current_bandwidth, avg_bandwidth, last_avg_price = bands
             
-            # 修改点7: 布林带相对收紧条件
-            # 当前宽度 < 历史平均宽度的70%
-            bandwidth_ratio = current_bandwidth / avg_bandwidth if avg_bandwidth > 0 else 1
-            if avg_bandwidth > 0 and current_bandwidth < avg_bandwidth * g.relative_squeeze_ratio:
+            # 修改点7: 布林带收紧条件由检测器判断
+            # 相对收紧: 当前宽度 < 历史平均宽度的70%；绝对收紧: 当前宽度 < 固定阈值
+            if detector.detect(current_bandwidth, avg_bandwidth):
                 # 获取今天的平均价格(最后一天)
-                today_avg_price = avg_prices[-1]
+                today_avg_price = last_avg_price
                 is_bollinger_squeeze = True
                 ma20 = ma20_current
-                log.debug(f"布林带收紧检测: 当前宽度={current_bandwidth:.4f}, 历史平均={avg_bandwidth:.4f}, 比例={bandwidth_ratio:.2%}")
+                log.debug("布林带收紧检测: 当前宽度=%.4f, 历史平均=%.4f, %s",
+                          current_bandwidth, avg_bandwidth, detector.describe(current_bandwidth, avg_bandwidth))
     
     ############################################################
     # 条件1: 收益率达标且(成交量萎缩或布林带收紧)
     ############################################################
     condition1 = False
     condition1_type = ""
-    if portfolio_avg_return >= 0.15:  # 收益率 >= 15%
-        # 计算投资组合的平均成交量
-        total_volume_today = 0
-        total_volume_5day_avg = 0
-        
-        for stock in positions:
-            # 获取过去5天的成交量数据
-            hist = attribute_history(stock, 5, '1d', ['volume'], skip_paused=True, df=True)
-            if hist is not None and len(hist) == 5:
-                today_volume = hist['volume'].iloc[-1]
-                past_4_avg_volume = hist['volume'].iloc[-5:-1].mean()  # 索引-5到-2，共4天
-                total_volume_today += today_volume
-                total_volume_5day_avg += past_4_avg_volume
+    if portfolio_avg_return >= g.profit_target:  # 收益率 >= 15%
+        # 计算投资组合的平均成交量(最近一天 / 之前4天平均)
+        if basket_volume_ratio is not None:
+            # 修改点17: 全市场的滚动成交量均值每个数据版本按回看天数算一次、存在磁盘上，这里只取持仓的几格
+            volume_ratio_today = basket_volume_ratio(positions, g.volume_lookback)
+        elif use_state:
+            volume_ratio_today = state.volume_ratio
+        else:
+            volumes = panel[:, -volume_days:, 1]
+            complete = ~np.isnan(volumes).any(axis=1)  # 有完整5天成交量数据的股票
+            total_volume_today = volumes[complete, -1].sum()
+            total_volume_5day_avg = volumes[complete, :-1].mean(axis=1).sum()  # 索引-5到-2，共4天
+            volume_ratio_today = total_volume_today / total_volume_5day_avg if total_volume_5day_avg > 0 else None
         
         volume_condition = False
-        if total_volume_5day_avg > 0:
-            avg_volume_today = total_volume_today / len(positions)
-            avg_volume_5day = total_volume_5day_avg / len(positions)
-            volume_ratio = avg_volume_today / avg_volume_5day
+        if volume_ratio_today is not None:
+            volume_ratio = volume_ratio_today
             
             if volume_ratio < 0.8:  # 今天平均成交量 < 过去5天平均成交量的80%
                 volume_condition = True
@@ -422,15 +708,15 @@ def check_portfolio_sell_conditions(context):
         condition1 = volume_condition or is_bollinger_squeeze
         
         if condition1 and is_bollinger_squeeze and condition1_type == "":
-            condition1_type = "布林带收紧(相对)"
+            condition1_type = f"布林带收紧({detector.label})"
         elif condition1 and volume_condition and is_bollinger_squeeze:
-            condition1_type = "成交量萎缩+布林带收紧(相对)"
+            condition1_type = f"成交量萎缩+布林带收紧({detector.label})"
     
     ############################################################
     # 条件2: 持有天数≥7天, 收益率未达标, 布林带收紧, 且股价在20日均线±5%范围内
     ############################################################
     condition2 = False
-    if hold_days >= 7 and portfolio_avg_return < 0.15:  # 持有天数>=7天且收益率未达标
+    if hold_days >= g.min_hold_days and portfolio_avg_return < g.profit_target:  # 持有天数>=7天且收益率未达标
         if is_bollinger_squeeze and today_avg_price > 0:
             # 条件2D: 股价位置在20日均线±5%范围内
             price_position_ratio = (today_avg_price - ma20) / ma20 if ma20 > 0 else 0
@@ -439,17 +725,25 @@ def check_portfolio_sell_conditions(context):
     
     # 如果满足任一条件，触发清仓
     if condition1 or condition2:
+        # 修改点15: 卖出信号写进交易流水
+        bandwidth_ratio = current_bandwidth / avg_bandwidth if avg_bandwidth > 0 else None
         # 记录详细的卖出原因
         if condition1:
             log.info(f"【卖出-条件1】日期: {context.current_dt.date()}, "
                      f"持有天数: {hold_days}, 平均收益率: {portfolio_avg_return:.2%}, "
                      f"原因: {condition1_type}, 成交量比例: {volume_ratio:.2%}, "
-                     f"带宽比例: {bandwidth_ratio:.2%}, 阈值: {g.relative_squeeze_ratio:.0%}")
+                     f"{detector.describe(current_bandwidth, avg_bandwidth)}")
+            record_event('sell_condition1', hold_days=hold_days, portfolio_avg_return=portfolio_avg_return,
+                         volume_ratio=volume_ratio, bandwidth_ratio=bandwidth_ratio, orders=len(positions),
+                         reason=condition1_type)
         elif condition2:
             log.info(f"【卖出-条件2】日期: {context.current_dt.date()}, "
                      f"持有天数: {hold_days}, 平均收益率: {portfolio_avg_return:.2%}, "
-                     f"原因: 布林带收紧(相对)+股价在20日均线附近, "
-                     f"带宽比例: {bandwidth_ratio:.2%}, 阈值: {g.relative_squeeze_ratio:.0%}, 价格位置: {price_position_ratio:.2%}")
+                     f"原因: 布林带收紧({detector.label})+股价在20日均线附近, "
+                     f"{detector.describe(current_bandwidth, avg_bandwidth)}, 价格位置: {price_position_ratio:.2%}")
+            record_event('sell_condition2', hold_days=hold_days, portfolio_avg_return=portfolio_avg_return,
+                         bandwidth_ratio=bandwidth_ratio, orders=len(positions),
+                         reason=f"布林带收紧({detector.label})+股价在20日均线附近")
         return True
     
     return False
@@ -458,6 +752,15 @@ def check_portfolio_sell_conditions(context):
 def trade(context):
     """主交易逻辑"""
     
+    # 修改点13: 盘中回撤监控(可选)，达到阈值立即切换到清仓，本根bar就开始卖出
+    if g.intraday_stop_loss and g.stop_loss_status == "normal" and len(context.portfolio.positions) > 0:
+        drawdown = g.drawdown_tracker.update(context.portfolio.total_value)
+        if drawdown >= g.max_drawdown_threshold:
+            log.info(f"【盘中止损】时间: {context.current_dt}, "
+                     f"回撤: {drawdown:.2%}, 阈值: {g.max_drawdown_threshold:.0%}")
+            record_event('intraday_stop_loss', drawdown=drawdown, orders=len(context.portfolio.positions))
+            g.stop_loss_status = "clearing"
+    
     # 状态1: 清仓中
     if g.stop_loss_status == "clearing":
         # 尝试清仓
@@ -490,10 +793,13 @@ def after_market_update(context):
     if g.stop_loss_status == "clearing":
         # 检查是否真的清仓完成
         if len(context.portfolio.positions) == 0:
+            record_event('cleared')
             g.stop_loss_status = "normal"
             g.portfolio_high = 0  # 重置最高价值
+            g.drawdown_tracker.reset()
             g.buy_date = None
             g.initial_portfolio_value = 0
+            g.basket_indicator = None
         return
     
     # 状态2: 正常状态
@@ -502,6 +808,13 @@ def after_market_update(context):
         if len(context.portfolio.positions) == 0:
             return
         
+        # 修改点9: 收盘后给增量布林带/成交量状态追加一根bar
+        update_basket_indicator(context)
+        
+        # 修改点13: 收盘价也计入盘中回撤监控的最高点
+        if g.intraday_stop_loss:
+            g.drawdown_tracker.update(current_value)
+        
         # 计算当前回撤
         current_drawdown = calculate_drawdown(context)
         
@@ -509,6 +822,7 @@ def after_market_update(context):
         if current_drawdown >= g.max_drawdown_threshold:
             log.info(f"【止损】日期: {context.current_dt.date()}, "
                      f"回撤: {current_drawdown:.2%}, 阈值: {g.max_drawdown_threshold:.0%}")
+            record_event('stop_loss', drawdown=current_drawdown, orders=len(context.portfolio.positions))
             g.stop_loss_status = "clearing"
             return
         
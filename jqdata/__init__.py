@@ -0,0 +1,10 @@
+"""
+聚宽 jqdata 的本地替身
+
+策略脚本不用改动，`from jqdata import *` 拿到的是本地实现的同名接口，
+行情来自本地列式行情库（见 jqdata.store），由日线事件循环驱动（见 jqdata.engine）。
+
+    python -m jqdata 251214-rel.py --data ./store --start 2020-01-01 --end 2023-12-31
+"""
+from .api import *
+from .api import __all__
@@ -0,0 +1,68 @@
+"""
+命令行运行本地回测
+
+    python -m jqdata 251214-rel.py --data ./store --start 2020-01-01 --end 2023-12-31
+"""
+import argparse
+
+from .api import setup_logging, stop_logging
+from .checkpoint import Checkpoint, Checkpointer
+from .engine import Engine, load_strategy
+from .factor_cache import FactorCache
+from .journal import Journal
+from .profiler import Profiler
+from .store import DataStore
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jqdata', description='本地运行聚宽策略脚本')
+    parser.add_argument('strategy', help='策略脚本路径')
+    parser.add_argument('--data', required=True, help='本地行情库目录')
+    parser.add_argument('--start', required=True, help='开始日期 YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYY-MM-DD')
+    parser.add_argument('--cash', type=float, default=1000000, help='初始资金')
+    parser.add_argument('--frequency', default='day', choices=['day', 'minute'],
+                        help='day=日线回测，minute=分钟回放（分钟线放在 <data>/minute）')
+    parser.add_argument('--log-level', default='info', choices=['debug', 'info', 'warning', 'error'])
+    parser.add_argument('--log-buffer', type=int, default=0, metavar='N',
+                        help='异步输出日志，回测线程只写容量为 N 的环形缓冲（满时丢弃最旧的），0 为同步输出')
+    parser.add_argument('--output', help='保存净值和成交记录的目录')
+    parser.add_argument('--profile', metavar='DIR', help='记录每个策略函数和数据接口的耗时，保存到该目录')
+    parser.add_argument('--journal', metavar='PATH', help='把策略用 record_event() 记录的事件写成 Parquet 交易流水')
+    parser.add_argument('--checkpoint-dir', metavar='DIR', help='定期把回测快照存到该目录，文件名为快照日期')
+    parser.add_argument('--checkpoint-every', type=int, default=250, metavar='N', help='每 N 个交易日存一次快照')
+    parser.add_argument('--resume', metavar='FILE', help='从快照的下一个交易日继续回测')
+    parser.add_argument('--factor-cache', metavar='DIR', help='多因子选股从该目录的因子缓存读取，缺少的日期算完追加进去')
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level, buffer_size=args.log_buffer)
+    store = DataStore.open(args.data)
+    engine = Engine(store, args.start, args.end, args.cash, frequency=args.frequency)
+    if args.profile:
+        engine.profiler = Profiler()
+    if args.journal:
+        engine.journal = Journal(args.journal)
+    if args.factor_cache:
+        engine.factor_cache = FactorCache(args.factor_cache, store)
+    if args.checkpoint_dir:
+        engine.checkpointer = Checkpointer(args.checkpoint_dir, args.checkpoint_every)
+    strategy = load_strategy(args.strategy)
+    checkpoint = Checkpoint.load(args.resume) if args.resume else None
+    try:
+        result = engine.run(strategy, checkpoint=checkpoint)
+    finally:
+        if engine.journal is not None:
+            engine.journal.close()
+        stop_logging()
+
+    for name, value in result.summary().items():
+        print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
+    if args.output:
+        result.save(args.output)
+    if args.profile:
+        print(engine.profiler.summary().to_string(index=False, float_format='{:.3f}'.format))
+        engine.profiler.save(args.profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+绩效指标：总收益、年化收益、最大回撤、最长回撤天数、夏普比率、换手率
+
+两种用法共用同一套定义：
+    - performance(equity, turnover, starting_cash)：回测结束后对整条净值数组一次算出
+      （BacktestResult.summary、参数扫描、滚动前推检验都用它）
+    - PerformanceTracker：逐日 update(收盘净值, 成交金额)，每个指标只保留几个累计量，
+      内存占用与天数无关，随时 summary() 得到与 performance 相同的结果（实盘监控、长回测中途查看）
+"""
+import numpy as np
+
+
+# 年化用的交易日数、无风险利率（与聚宽回测报告一致）
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.04
+
+
+def _summary(n, final, starting_cash, max_drawdown, drawdown_days, mean, std, traded, equity_sum):
+    total_return = final / starting_cash - 1
+    sharpe = (mean - RISK_FREE_RATE / TRADING_DAYS) / std * np.sqrt(TRADING_DAYS) if std > 0 else 0.0
+    return {
+        'total_return': float(total_return),
+        'annual_return': float((1 + total_return) ** (TRADING_DAYS / n) - 1),
+        'max_drawdown': float(max_drawdown),
+        'drawdown_days': int(drawdown_days),
+        'sharpe': float(sharpe),
+        # 年化换手率 = 成交金额 / 2 / 平均净值，按年折算
+        'turnover': float(traded / 2 / equity_sum * TRADING_DAYS),
+    }
+
+
+def performance(equity, turnover, starting_cash):
+    """
+    equity: 每日收盘净值；turnover: 每日成交金额
+    total_return: 总收益率；annual_return: 年化收益率
+    max_drawdown: 最大回撤；drawdown_days: 最长的回撤天数（净值低于此前最高点的连续交易日数）
+    sharpe: 夏普比率（无风险利率 4%）；turnover: 年化换手率
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    n = len(equity)
+    returns = equity / np.concatenate(([starting_cash], equity[:-1])) - 1
+    peak = np.maximum.accumulate(np.maximum(equity, starting_cash))
+    # 每段连续回撤的起止位置
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], (equity < peak).view(np.int8), [0]))))
+    lengths = edges[1::2] - edges[::2]
+    return _summary(n, equity[-1], starting_cash, (1 - equity / peak).max(), lengths.max() if len(lengths) else 0,
+                    returns.mean(), returns.std(ddof=1) if n > 1 else 0.0, np.sum(turnover), equity.sum())
+
+
+class PerformanceTracker(object):
+    """逐日更新的绩效指标，结果与 performance 相同"""
+
+    def __init__(self, starting_cash):
+        self.starting_cash = starting_cash
+        self.n = 0
+        self.last = float(starting_cash)
+        self.peak = float(starting_cash)
+        self.max_drawdown = 0.0
+        self.drawdown_days = 0      # 当前这段回撤已持续的天数
+        self.max_drawdown_days = 0
+        # 日收益率的均值和离差平方和（Welford 算法）
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.traded = 0.0
+        self.equity_sum = 0.0
+
+    def update(self, value, traded_value=0.0):
+        """记入一个交易日的收盘净值和成交金额"""
+        ret = value / self.last - 1
+        self.n += 1
+        delta = ret - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (ret - self.mean)
+        self.last = value
+
+        if value >= self.peak:
+            self.peak = value
+            self.drawdown_days = 0
+        else:
+            self.drawdown_days += 1
+            self.max_drawdown = max(self.max_drawdown, 1 - value / self.peak)
+            self.max_drawdown_days = max(self.max_drawdown_days, self.drawdown_days)
+        self.traded += traded_value
+        self.equity_sum += value
+
+    @property
+    def drawdown(self):
+        """当前回撤"""
+        return 1 - self.last / self.peak
+
+    def summary(self):
+        if self.n == 0:
+            raise ValueError("还没有任何交易日的数据")
+        std = np.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+        return _summary(self.n, self.last, self.starting_cash, self.max_drawdown, self.max_drawdown_days,
+                        self.mean, std, self.traded, self.equity_sum)
@@ -0,0 +1,456 @@
+"""
+策略脚本通过 `from jqdata import *` 拿到的函数和对象
+
+这些函数都转发给当前正在运行的回测引擎，接口与聚宽保持一致，
+只实现了本仓库策略用到的部分。
+"""
+import atexit
+import contextlib
+import functools
+import logging
+import logging.handlers
+import queue
+
+import numpy as np
+import pandas as pd
+
+from .portfolio import LimitOrderStyle, MarketOrderStyle, OrderCost
+from .store import STATUS_DELISTING, STATUS_NEW, STATUS_PAUSED, STATUS_ST, STATUS_UNLISTED
+
+
+__all__ = [
+    'g', 'log',
+    'run_daily', 'set_benchmark', 'set_option', 'set_order_cost',
+    'OrderCost', 'MarketOrderStyle', 'LimitOrderStyle',
+    'query', 'valuation', 'get_fundamentals',
+    'attribute_history', 'get_bars', 'get_current_data',
+    'order', 'order_value', 'order_target', 'order_target_value',
+    # 本地引擎特有，聚宽上没有
+    'tradable_mask', 'factor_rank', 'basket_volume_ratio', 'order_target_basket', 'record_event',
+]
+
+# 当前正在运行的回测引擎
+_current = None
+
+
+@contextlib.contextmanager
+def activate(engine):
+    """在 with 块内把 engine 设为当前引擎"""
+    global _current
+    previous, _current = _current, engine
+    try:
+        yield engine
+    finally:
+        _current = previous
+
+
+def _engine():
+    if _current is None:
+        raise RuntimeError("当前没有运行中的回测引擎，请通过 python -m jqdata 运行策略")
+    return _current
+
+
+def _profiled(func):
+    """引擎设置了 profiler 时按接口名计时"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _current.profiler if _current is not None else None
+        if profiler is None:
+            return func(*args, **kwargs)
+        return profiler.call(name, func, *args, **kwargs)
+    return wrapper
+
+
+## 日志
+_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'warn': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+
+class _SimTimeFilter(logging.Filter):
+    """给日志加上回测时间"""
+
+    def filter(self, record):
+        record.sim_time = _current.context.current_dt if _current is not None else '-'
+        return True
+
+
+class _RingQueue(queue.Queue):
+    """
+    容量固定的日志缓冲，满了时丢弃最旧的一条，写日志的一方永远不会阻塞
+    QueueListener.stop 放进来的结束标记（None）例外：它等后台线程腾出位置，不挤掉缓冲里的日志
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put(self, item, block=True, timeout=None):
+        if item is None:
+            return super().put(item)
+        with self.not_full:
+            if self._qsize() >= self.maxsize:
+                self._get()
+                self.unfinished_tasks -= 1
+                self.dropped += 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    原样放进队列的 QueueHandler：标准的 prepare 会在写日志的线程里先把 msg % args 和异常栈格式化好，
+    这里跳过，格式化全部留给后台线程。
+    代价是 args 里的可变对象在格式化之前被改动时，输出的是改动后的值
+    """
+
+    def prepare(self, record):
+        return record
+
+
+# 异步输出时的后台线程（logging.handlers.QueueListener）
+_listener = None
+
+
+def setup_logging(level='info', stream=None, buffer_size=0):
+    """
+    把 jqdata.* 的日志按聚宽的格式输出
+    buffer_size > 0 时异步输出：回测线程只把日志记录放进容量为 buffer_size 的环形缓冲，
+    由后台线程格式化写出；缓冲满时丢弃最旧的记录，stop_logging 时报告丢弃的条数
+    """
+    global _listener
+    stop_logging()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter('%(sim_time)s - %(levelname)s - %(message)s'))
+    front = handler
+    if buffer_size > 0:
+        front = _QueueHandler(_RingQueue(buffer_size))
+        _listener = logging.handlers.QueueListener(front.queue, handler)
+        _listener.start()
+    # 回测时间在回测线程里取
+    front.addFilter(_SimTimeFilter())
+    root = logging.getLogger('jqdata')
+    root.handlers[:] = [front]
+    root.setLevel(_LEVELS[level])
+    root.propagate = False
+
+
+def stop_logging():
+    """停止异步输出：写完缓冲里剩下的日志，之后改为同步输出"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    handler = listener.handlers[0]
+    handler.addFilter(_SimTimeFilter())
+    root = logging.getLogger('jqdata')
+    root.handlers[:] = [handler]
+    if listener.queue.dropped:
+        root.warning(f"日志缓冲已满，丢弃了 {listener.queue.dropped} 条日志")
+
+
+atexit.register(stop_logging)
+
+
+class _Log(object):
+    """
+    对应聚宽的 log
+    debug/info/warn/error 直接绑定 logging 的方法，级别不够的日志只做一次级别判断就返回；
+    用 log.info('股票 %s 被过滤', stock) 的写法时，只有真正输出的日志才会格式化
+    （f-string 在调用之前就已经拼好了，级别不够也省不掉）
+    """
+
+    def __init__(self):
+        logger = self._logger = logging.getLogger('jqdata.strategy')
+        self.debug = logger.debug
+        self.info = logger.info
+        self.warn = self.warning = logger.warning
+        self.error = logger.error
+
+    def set_level(self, name, level):
+        """设置某一类日志的级别，如 log.set_level('order', 'warning')"""
+        logging.getLogger(f'jqdata.{name}').setLevel(_LEVELS[level])
+
+
+log = _Log()
+
+# 策略的全局变量，运行时会被引擎换成每次回测独立的一份
+g = None
+
+
+## 策略设置
+def run_daily(func, time='every_bar', reference_security=None):
+    _engine().run_daily(func, time)
+
+
+def set_benchmark(security):
+    _engine().set_benchmark(security)
+
+
+def set_option(name, value):
+    _engine().set_option(name, value)
+
+
+def set_order_cost(cost, type='stock', ref=None):
+    _engine().set_order_cost(cost, type)
+
+
+## 基本面查询
+class _Column(object):
+    def __init__(self, table, name):
+        self.table = table
+        self.name = name
+
+
+class _Table(object):
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _Column(self._name, name)
+
+
+class Query(object):
+    def __init__(self, columns):
+        self.columns = columns
+        self._limit = None
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+
+def query(*columns):
+    return Query(columns)
+
+
+valuation = _Table('valuation')
+
+
+@_profiled
+def get_fundamentals(query_object, date=None, statDate=None):
+    """
+    按 query 查询基本面数据，date 默认为前一个交易日
+    本地只支持不带 filter 的 valuation 表查询
+    """
+    fields = [c.name for c in query_object.columns if c.name != 'code']
+    df = _engine().fundamentals(fields, date)
+    if query_object._limit is not None:
+        df = df.iloc[:query_object._limit]
+    return df
+
+
+## 行情
+@_profiled
+def attribute_history(security, count, unit='1d', fields=('open', 'close', 'high', 'low', 'volume', 'money'),
+                      skip_paused=True, df=True, fq='pre'):
+    """单个标的今天之前的 count 根日线（不包括当天）"""
+    if unit != '1d':
+        raise ValueError(f"本地引擎暂不支持 {unit} 级别的数据")
+    engine = _engine()
+    fields = [fields] if isinstance(fields, str) else list(fields)
+    rows, data = engine.history(security, count, fields, skip_paused)
+    if not df:
+        return data
+    return pd.DataFrame(data, index=pd.DatetimeIndex(engine.store.dates[rows]))
+
+
+@_profiled
+def get_bars(security, count, unit='1d', fields=('date', 'open', 'high', 'low', 'close'), include_now=False,
+             end_dt=None, fq_ref_date=None, df=False):
+    """
+    一个或多个标的最近 count 根日线（跳过停牌日），多个标的只取一次数
+    security 为列表时返回 {标的: 结构化数组}，df=True 时返回 DataFrame
+    """
+    if unit != '1d':
+        raise ValueError(f"本地引擎暂不支持 {unit} 级别的数据")
+    engine = _engine()
+    single = isinstance(security, str)
+    securities = [security] if single else list(security)
+    fields = [fields] if isinstance(fields, str) else list(fields)
+    value_fields = [f for f in fields if f != 'date']
+    rows, panel = engine.history_panel(securities, count, value_fields, include_now=include_now)
+
+    dtype = [(f, object if f == 'date' else np.float64) for f in fields]
+    result = {}
+    for i, sec in enumerate(securities):
+        valid = rows[i] >= 0
+        bars = np.empty(int(valid.sum()), dtype=dtype)
+        for f in fields:
+            if f == 'date':
+                bars[f] = engine.store.dates[rows[i][valid]].astype(object)
+            else:
+                bars[f] = panel[i, valid, value_fields.index(f)]
+        result[sec] = pd.DataFrame(bars) if df else bars
+    return result[security] if single else result
+
+
+class _SecurityUnitData(object):
+    """get_current_data()[security] 返回的对象"""
+
+    __slots__ = ('_engine', '_col', 'security')
+
+    def __init__(self, engine, security):
+        self._engine = engine
+        self._col = engine.store.col(security)
+        self.security = security
+
+    def _get(self, name):
+        store = self._engine.store
+        if not store.has_field(name):
+            return np.nan
+        return store.field(name)[self._engine.row, self._col]
+
+    @property
+    def name(self):
+        return self.security
+
+    @property
+    def paused(self):
+        return bool(self._get('paused'))
+
+    @property
+    def is_st(self):
+        return bool(self._get('is_st'))
+
+    @property
+    def day_open(self):
+        return float(self._get('open'))
+
+    @property
+    def high_limit(self):
+        return float(self._engine.price_limits()[0][self._col])
+
+    @property
+    def low_limit(self):
+        return float(self._engine.price_limits()[1][self._col])
+
+    @property
+    def last_price(self):
+        return float(self._engine._price_row[self._col])
+
+
+class _CurrentData(object):
+    """按需取数的当前行情字典"""
+
+    def __init__(self, engine):
+        self._engine = engine
+        self._cache = {}
+
+    def __getitem__(self, security):
+        unit = self._cache.get(security)
+        if unit is None:
+            unit = self._cache[security] = _SecurityUnitData(self._engine, security)
+        return unit
+
+    def __contains__(self, security):
+        return security in self._engine.store.code_index
+
+    def __len__(self):
+        return len(self._engine.store.codes)
+
+
+@_profiled
+def get_current_data():
+    return _CurrentData(_engine())
+
+
+@_profiled
+def tradable_mask(security_list, paused=True, st=True, delisting=False, new=False):
+    """
+    本地引擎特有：按预计算的状态矩阵一次判断一批证券当天是否可交易
+    返回与 security_list 对齐的布尔数组；未上市、已退市、不在行情库中的总是 False，
+    paused/st/delisting/new 为 True 时分别排除停牌、ST、退市整理期、次新股
+    """
+    excluded = STATUS_UNLISTED
+    if paused:
+        excluded |= STATUS_PAUSED
+    if st:
+        excluded |= STATUS_ST
+    if delisting:
+        excluded |= STATUS_DELISTING
+    if new:
+        excluded |= STATUS_NEW
+    return (_engine().status(list(security_list)) & excluded) == 0
+
+
+@_profiled
+def factor_rank(weights, method='rank', window=20, count=None):
+    """
+    本地引擎特有：用前一交易日为止的数据给全市场打多因子分，返回按分数从高到低排列的证券代码
+    weights: {因子名: 权重}，因子见 jqdata.factors.FACTORS，权重为负时偏好因子值小的证券
+    method: 'rank'（分位排名）或 'zscore'（标准分）；window: 回看交易日数；count: 只返回前 count 只
+    """
+    return _engine().factor_rank(weights, method, window, count)
+
+
+@_profiled
+def basket_volume_ratio(security_list, lookback=4):
+    """
+    本地引擎特有：一篮子证券最近一天的总成交量 / 之前 lookback 天的平均总成交量（跳过停牌日、不含当天）
+    从 DataStore.volume_window 的 (交易日 × 证券) 成交量窗口矩阵里直接取（每个数据版本和回看天数算一次，
+    存在行情库目录下按内存映射共用），没有成交量时返回 None
+    """
+    return _engine().basket_volume_ratio(list(security_list), lookback)
+
+
+## 下单
+@_profiled
+def order(security, amount, style=None, side='long', pindex=0, close_today=False):
+    return _engine().order(security, amount, style)
+
+
+@_profiled
+def order_value(security, value, style=None, side='long', pindex=0, close_today=False):
+    return _engine().order_value(security, value, style)
+
+
+@_profiled
+def order_target(security, amount, style=None, side='long', pindex=0, close_today=False):
+    return _engine().order_target(security, amount, style)
+
+
+@_profiled
+def order_target_value(security, value, style=None, side='long', pindex=0, close_today=False):
+    return _engine().order_target_value(security, value, style)
+
+
+@_profiled
+def order_target_basket(security_list, values=None, weights=None, kc_buffer=None, lot=100):
+    """
+    本地引擎特有：把一篮子证券一次调到目标市值，所有委托在当前 bar 上一次撮合（先卖后买）
+    values: 每只证券的目标市值，一个数时所有证券相同；weights: 目标权重，目标市值 = 权重 × 总资产
+    kc_buffer: 科创板市价单的保护价 = 当前价 × (1 ± kc_buffer)
+    lot: 目标数量取整的股数，默认 100（与平台上逐只买入的数量相同）
+    返回与 security_list 对齐的订单列表，废单为 None
+    """
+    engine = _engine()
+    if (values is None) == (weights is None):
+        raise ValueError("values 和 weights 必须且只能指定一个")
+    if weights is not None:
+        values = np.asarray(weights, dtype=np.float64) * engine.portfolio.total_value
+    return engine.order_target_basket(security_list, values, kc_buffer, lot)
+
+
+## 交易流水
+def record_event(event, **fields):
+    """
+    本地引擎特有：往交易流水里记一个事件（字段见 jqdata.journal.COLUMNS），时间取当前回测时间
+    引擎没有设置流水文件时什么也不做
+    """
+    engine = _engine()
+    if engine.journal is not None:
+        engine.journal.record(engine.context.current_dt, event, **fields)
@@ -0,0 +1,240 @@
+"""
+策略热点函数和端到端回测的基准测试
+
+用合成的全市场行情库（默认 5000 只证券、3 年日线）测量：
+    check_stocks / filter_paused_stock / check_portfolio_sell_conditions / clear_all_positions
+    每个函数单次调用的耗时（多次取最快的一次）和峰值内存（tracemalloc）
+    end_to_end: 最后一年 trade + after_market_update 的完整回测耗时和回测本身的峰值内存（tracemalloc）
+合成行情库按 (证券数, 天数, 随机种子) 缓存在临时目录，重复运行不会重新生成。
+
+    python -m jqdata.bench 251214-rel.py --save bench.json        # 记录基线
+    python -m jqdata.bench 251214-rel.py --baseline bench.json    # 与基线比较，变慢超过容忍度时退出码为 1
+只有超出比例容忍度、且绝对差值也超过 MIN_DELTA 的才算回退，亚毫秒级函数的计时抖动不会误报。
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from . import api
+from .api import setup_logging
+from .engine import Engine, load_strategy
+from .store import DataStore, write_store
+
+
+# 判定回退的最小绝对差值
+MIN_DELTA = {'ms': 1.0, 'mb': 1.0}
+# 端到端回测的重复次数
+END_TO_END_REPEAT = 5
+
+
+def make_synthetic_store(root, n_codes=5000, n_days=750, seed=0):
+    """
+    生成一个合成的全市场行情库：对数正态随机游走的价格、陆续上市的新股、
+    约 1% 的停牌、约 2% 的 ST，市值 = 收盘价 × 固定股本；约 1/10 是科创板
+    """
+    rng = np.random.default_rng(seed)
+    dates = np.busday_offset('2018-01-02', np.arange(n_days), roll='forward')
+    codes = [f"688{i:03d}.XSHG" if i < 1000 and i % 10 == 0 else
+             (f"{600000 + i:06d}.XSHG" if i % 2 else f"{i:06d}.XSHE") for i in range(n_codes)]
+
+    close = 10 * np.exp(np.cumsum(rng.normal(0.0003, 0.025, (n_days, n_codes)), axis=0))
+    open_ = close * np.exp(rng.normal(0, 0.008, (n_days, n_codes)))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, (n_days, n_codes)))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, (n_days, n_codes)))
+    volume = rng.lognormal(14, 0.6, (n_days, n_codes)).round(-2)
+    # 前 80% 的证券在开始前已上市，其余在区间内陆续上市
+    listed_from = np.where(rng.random(n_codes) < 0.8, 0, rng.integers(0, n_days, n_codes))
+    unlisted = np.arange(n_days)[:, None] < listed_from[None, :]
+    for arr in (close, open_, high, low, volume):
+        arr[unlisted] = np.nan
+    paused = (rng.random((n_days, n_codes)) < 0.01) & ~unlisted
+    is_st = np.broadcast_to(rng.random(n_codes) < 0.02, (n_days, n_codes))
+    market_cap = close * rng.lognormal(0, 1, n_codes) * 10  # 亿元
+
+    return write_store(root, dates, codes, {
+        'open': open_, 'close': close, 'high': high, 'low': low,
+        'volume': volume, 'money': volume * close,
+        'paused': paused, 'is_st': is_st, 'market_cap': market_cap,
+    })
+
+
+def synthetic_store(n_codes=5000, n_days=750, seed=0, directory=None):
+    """按参数缓存的合成行情库，不存在时生成"""
+    directory = directory or tempfile.gettempdir()
+    root = os.path.join(directory, f'jqdata-bench-{n_codes}x{n_days}-{seed}')
+    if not os.path.exists(os.path.join(root, 'meta.json')):
+        make_synthetic_store(root, n_codes, n_days, seed)
+    return DataStore.open(root)
+
+
+def _measure(func, setup=None, repeat=50):
+    """
+    返回 (耗时 ms, 峰值内存 MB)；setup 在每次调用前运行，不计时
+    耗时取 repeat 次里最快的一次：其他进程、CPU 降频等干扰只会让某次变慢，最快的一次最稳定
+    峰值内存是单独再调用一次时 tracemalloc 记录的分配峰值，不含行情库的内存映射和进程原有的内存
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times) * 1000, peak / 2 ** 20
+
+
+class _Harness(object):
+    """把引擎停在某一天的某个时刻，直接调用策略函数"""
+
+    def __init__(self, store, strategy, row):
+        self.strategy = strategy
+        self.engine = Engine(store, store.dates[0], store.dates[-1])
+        self.engine.start(strategy)
+        self.row = row
+        self.at('every_bar')
+
+    def at(self, time):
+        self.engine._enter(self.row, datetime.datetime.strptime(
+            {'every_bar': '09:30', 'after_close': '15:30'}[time], '%H:%M').time())
+        # 反复在同一天买卖，每次都当作新的一根 bar，不会用完成交量额度
+        self.engine._volume_used = {}
+
+    def call(self, name, *args):
+        self.strategy.g = self.engine.g
+        with api.activate(self.engine):
+            return getattr(self.strategy, name)(*args)
+
+    def clear_caches(self):
+        """清空策略的选股缓存和引擎的行情缓存，每次重复都从头计算"""
+        cache = getattr(self.strategy, '_quantile_band_cache', None)
+        if cache is not None:
+            cache.clear()
+        self.engine.bar_cache.clear()
+
+    def hold_basket(self):
+        """清空账户后按策略买入一篮子，并把买入日期提前，让卖出条件走完整的布林带计算"""
+        engine = self.engine
+        engine.portfolio.positions.clear()
+        engine.portfolio.cash = float(engine.portfolio.starting_cash)
+        self.at('every_bar')
+        self.call('buy_stocks', engine.context)
+        engine._settle()
+        engine.g.buy_date = engine.context.current_dt - datetime.timedelta(days=30)
+        self.at('after_close')
+
+
+def run_benchmarks(strategy_path, store, repeat=50):
+    """返回 {基准名: {'ms': 耗时, 'mb': 峰值内存}}"""
+    strategy = load_strategy(strategy_path)
+    results = {}
+    row = len(store.dates) - 1
+    h = _Harness(store, strategy, row)
+    context = h.engine.context
+
+    ms, mb = _measure(lambda: h.call('check_stocks', context), h.clear_caches, repeat)
+    results['check_stocks'] = {'ms': ms, 'mb': mb}
+
+    h.at('every_bar')
+    candidates = list(store.codes[:500])
+    ms, mb = _measure(lambda: h.call('filter_paused_stock', candidates), repeat=repeat)
+    results['filter_paused_stock'] = {'ms': ms, 'mb': mb}
+
+    h.hold_basket()
+
+    def drop_indicator():
+        # 去掉增量状态，测量从批量历史数据计算的完整路径
+        h.engine.g.basket_indicator = None
+        h.engine.bar_cache.clear()
+    ms, mb = _measure(lambda: h.call('check_portfolio_sell_conditions', context), drop_indicator, repeat)
+    results['check_portfolio_sell_conditions'] = {'ms': ms, 'mb': mb}
+
+    def rebuy():
+        h.hold_basket()
+        h.at('every_bar')
+    ms, mb = _measure(lambda: h.call('clear_all_positions', context), rebuy, repeat)
+    results['clear_all_positions'] = {'ms': ms, 'mb': mb}
+
+    # 端到端：最后一年（252 个交易日）的完整回测；内存只算回测本身的分配，不含生成合成行情库
+    start = store.dates[max(0, len(store.dates) - 252)]
+    gc.collect()
+    ms, mb = _measure(lambda: Engine(store, start, store.dates[-1]).run(strategy), h.clear_caches,
+                      END_TO_END_REPEAT)
+    results['end_to_end'] = {'ms': ms, 'mb': mb}
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta=None):
+    """
+    返回变慢（或内存增加）超过容忍度的 [(基准名, 指标, 当前值, 基线值)]
+    min_delta: {指标: 最小绝对差值}，默认 MIN_DELTA；差值不超过它的不算回退
+    """
+    min_delta = MIN_DELTA if min_delta is None else min_delta
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ('ms', 'mb'):
+            if (metric in base and current[metric] > base[metric] * (1 + tolerance)
+                    and current[metric] - base[metric] > min_delta.get(metric, 0)):
+                regressions.append((name, metric, current[metric], base[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jqdata.bench', description='策略热点函数和端到端回测的基准测试')
+    parser.add_argument('strategy', help='策略脚本路径')
+    parser.add_argument('--codes', type=int, default=5000, help='合成行情库的证券数')
+    parser.add_argument('--days', type=int, default=750, help='合成行情库的交易日数')
+    parser.add_argument('--seed', type=int, default=0, help='合成行情库的随机种子')
+    parser.add_argument('--data-dir', help='合成行情库的缓存目录，默认为系统临时目录')
+    parser.add_argument('--repeat', type=int, default=50, help='每个函数重复调用的次数，耗时取最快的一次')
+    parser.add_argument('--baseline', help='基线 JSON，与之比较，有回退时退出码为 1')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许比基线慢（或多占内存）的比例')
+    parser.add_argument('--min-ms', type=float, default=MIN_DELTA['ms'], help='判定耗时回退的最小绝对差值（ms）')
+    parser.add_argument('--min-mb', type=float, default=MIN_DELTA['mb'], help='判定内存回退的最小绝对差值（MB）')
+    parser.add_argument('--save', help='把本次结果保存为基线 JSON')
+    args = parser.parse_args(argv)
+
+    setup_logging('error')
+    store = synthetic_store(args.codes, args.days, args.seed, args.data_dir)
+    results = run_benchmarks(args.strategy, store, args.repeat)
+
+    print(f"{'benchmark':<34}{'time (ms)':>12}{'memory (MB)':>14}")
+    for name, r in results.items():
+        print(f"{name:<34}{r['ms']:>12.3f}{r['mb']:>14.2f}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance, {'ms': args.min_ms, 'mb': args.min_mb})
+        for name, metric, current, base in regressions:
+            print(f"回退: {name} {metric} {current:.3f} > 基线 {base:.3f} × {1 + args.tolerance:.2f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+回测快照：某个交易日收盘后的 g、账户、净值和成交记录，存成一个二进制文件
+
+    # 每 250 个交易日存一次快照，文件名为快照日期
+    python -m jqdata 251214-rel.py --data ./store --start 2014-01-01 --end 2023-12-31 \\
+        --checkpoint-dir ./ckpt --checkpoint-every 250
+    # 中断后从快照的下一个交易日继续，结果与一次跑完相同
+    python -m jqdata 251214-rel.py --data ./store --start 2014-01-01 --end 2023-12-31 --resume ./ckpt/2019-12-31.ckpt
+    # 参数扫描从同一个预热快照分叉，预热期只跑一次
+    python -m jqdata.sweep 251214-rel.py --data ./store --start 2014-01-01 --end 2023-12-31 \\
+        --resume ./ckpt/2019-12-31.ckpt --param max_drawdown_threshold=0.05,0.1
+
+恢复时引擎照常调用 initialize（run_daily、交易费用等设置照常生效），然后用快照覆盖 g 和账户，
+最后再覆盖扫描参数。g 里有策略脚本自己的对象（如增量指标状态），
+快照只能由同一个策略脚本恢复，所以 g 单独序列化，核对过策略之后才反序列化。
+"""
+import os
+import pickle
+
+import numpy as np
+
+
+class Checkpoint(object):
+    """
+    strategy: 策略模块名；start_date: 回测开始日期；date: 快照日期（当天收盘后）
+    g: vars(g)，序列化后保存；positions: [(代码, 总数, 可卖, 成本, 含费成本, 建仓时间, 最后价格)]
+    equity/turnover: 开始日期到快照日期的每日净值和成交金额；trades: 成交记录
+    """
+
+    def __init__(self, strategy, start_date, date, g, starting_cash, cash, positions,
+                 equity, turnover, trades):
+        self.strategy = strategy
+        self.start_date = np.datetime64(start_date, 'D')
+        self.date = np.datetime64(date, 'D')
+        self.g_state = pickle.dumps(g, protocol=pickle.HIGHEST_PROTOCOL)
+        self.starting_cash = starting_cash
+        self.cash = cash
+        self.positions = positions
+        self.equity = equity
+        self.turnover = turnover
+        self.trades = trades
+
+    def load_g(self):
+        """反序列化 g 的属性字典，每次调用得到一份独立的副本"""
+        return pickle.loads(self.g_state)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再改名，中途中断不会留下半个快照
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        if not isinstance(checkpoint, Checkpoint):
+            raise ValueError(f"不是回测快照文件: {path}")
+        return checkpoint
+
+    def __repr__(self):
+        return f"Checkpoint({self.strategy}, {self.start_date} ~ {self.date}, 持仓: {len(self.positions)})"
+
+
+class Checkpointer(object):
+    """设为引擎的 checkpointer 后，每 every 个交易日收盘后存一次快照到 directory/<日期>.ckpt"""
+
+    def __init__(self, directory, every):
+        if every <= 0:
+            raise ValueError(f"快照间隔必须为正数: {every}")
+        self.directory = directory
+        self.every = every
+        self.paths = []
+
+    def after_day(self, engine):
+        if (engine.row - engine.start_row + 1) % self.every:
+            return
+        checkpoint = engine.snapshot()
+        path = os.path.join(self.directory, f'{checkpoint.date}.ckpt')
+        checkpoint.save(path)
+        self.paths.append(path)
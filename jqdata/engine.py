@@ -0,0 +1,788 @@
+"""
+本地回测引擎
+
+每个交易日按 run_daily 注册的时间依次调用策略函数：
+    09:00 之前   当前价 = 前一日收盘价
+    09:30-15:00  当前价 = 当日开盘价（日线回测只能精确到开盘）
+    15:00 之后   当前价 = 当日收盘价
+收盘后用收盘价记录当天净值，然后把当日买入的持仓解锁为可卖（T+1）。
+下单按 jqdata.matching 的规则撮合：涨跌停、保护价、T+1 可卖数量，
+以及每只证券每根 bar 不超过成交量 × order_volume_ratio（日线回测时一天算一根 bar）。
+
+分钟回放（frequency='minute'）时，every_bar 的函数在每根分钟线上各调用一次（见 jqdata.minute），
+当前价 = 这根分钟线的收盘价；其他时刻的函数取不晚于该时刻的最后一根分钟线的收盘价，
+成交量额度按这根分钟线的成交量计算（分钟线没有 volume 字段时按当天日线的成交量）。
+分钟线按交易日用生成器逐日读取，一次只映射一天的数据。
+"""
+import bisect
+import datetime
+import importlib.util
+import logging
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from . import api, factors
+from .analytics import PerformanceTracker, performance
+from .checkpoint import Checkpoint
+from .matching import (LIMIT_DOWN, LIMIT_UP, NO_PRICE, PAUSED, PROTECTED, REJECTED, VOLUME_CAP, ZERO_AMOUNT,
+                       match_order, match_orders)
+from .minute import MINUTE_TIMES, MinuteBars
+from .portfolio import MarketOrderStyle, Order, OrderCost, Portfolio, Position
+from .store import STATUS_UNLISTED
+
+
+order_log = logging.getLogger('jqdata.order')
+
+# 一篮子委托至少有这么多笔时才用数组撮合，更少时逐笔撮合
+VECTOR_MATCH_MIN = 32
+
+# 撮合失败时的日志，{side} 为 买/卖
+REASON_MESSAGES = {
+    NO_PRICE: "当前没有有效价格，下单失败",
+    PAUSED: "停牌，下单失败",
+    LIMIT_UP: "涨停，无法买入",
+    LIMIT_DOWN: "跌停，无法卖出",
+    PROTECTED: "当前价超出保护价，未成交",
+    ZERO_AMOUNT: "可{side}数量为 0，下单失败",
+    VOLUME_CAP: "超出成交量限制，部分撤单",
+}
+
+# run_daily 的时间别名
+TIME_ALIASES = {
+    'before_open': '09:00',
+    'open': '09:30',
+    'every_bar': '09:30',
+    'close': '15:00',
+    'after_close': '15:30',
+}
+
+
+class G(object):
+    """全局变量容器，对应聚宽的 g"""
+
+    def __repr__(self):
+        return f"G({vars(self)})"
+
+
+class RunParams(object):
+    def __init__(self, start_date, end_date, frequency='day'):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.type = 'simple_backtest'
+        self.frequency = frequency
+
+
+class Context(object):
+    """策略函数收到的 context"""
+
+    def __init__(self, portfolio, run_params):
+        self.portfolio = portfolio
+        self.run_params = run_params
+        self.current_dt = None
+        self.previous_date = None
+        self.universe = []
+
+
+def load_strategy(path):
+    """把策略脚本加载成一个独立的模块（文件名可以带连字符）"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = '_strategy_' + re.sub(r'\W', '_', stem)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    # 注册到 sys.modules，策略里定义的类才能被 pickle
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _parse_time(time):
+    time = TIME_ALIASES.get(time, time)
+    try:
+        return datetime.datetime.strptime(time, '%H:%M').time()
+    except ValueError:
+        raise ValueError(f"不支持的运行时间: {time}") from None
+
+
+class BarCache(object):
+    """
+    按 bar 的行情缓存：同一根 bar 内的历史请求共用，换到下一根 bar 时清空
+    多个引擎按交易日同步推进时可以共用一个，持有相同标的的引擎只取一次数，
+    按日期算出的派生数据（如基本面表）也只算一次
+    """
+
+    def __init__(self):
+        self.end = None
+        self.panels = {}
+        self._memo_row = None
+        self._memo = {}
+
+    def memo(self, key, row, compute):
+        """row 这一天的派生数据，没有缓存时调用 compute()；换到另一天时清空"""
+        if self._memo_row != row:
+            self._memo = {}
+            self._memo_row = row
+        value = self._memo.get(key)
+        if value is None:
+            value = self._memo[key] = compute()
+        return value
+
+    def clear(self):
+        """清空所有缓存（基准测试每次重复前调用，避免第一次之后都是缓存命中）"""
+        self.end = None
+        self.panels = {}
+        self._memo_row = None
+        self._memo = {}
+
+    def at(self, end):
+        """截止行号为 end 的缓存字典"""
+        if self.end != end:
+            self.panels = {}
+            self.end = end
+        return self.panels
+
+
+class Engine(object):
+    """
+    单策略回测引擎
+    store: 本地行情库 DataStore；start_date/end_date: 回测区间（闭区间）
+    bar_cache: 按 bar 的行情缓存，多个引擎同步推进时传入同一个 BarCache 共用
+    frequency: 'day' 日线回测；'minute' 分钟回放，分钟线默认从 <store.root>/minute 读取
+    """
+
+    def __init__(self, store, start_date, end_date, starting_cash=1000000, bar_cache=None,
+                 frequency='day', minute_bars=None):
+        if frequency not in ('day', 'minute'):
+            raise ValueError(f"不支持的回测频率: {frequency}")
+        self.store = store
+        self.frequency = frequency
+        self.minute_bars = (minute_bars or MinuteBars(store.root)) if frequency == 'minute' else None
+        self.start_row = int(np.searchsorted(store.dates, np.datetime64(start_date, 'D'), side='left'))
+        self.end_row = store.row_of(end_date)
+        if self.end_row < self.start_row:
+            raise ValueError(f"回测区间 {start_date} ~ {end_date} 内没有交易日")
+
+        self.portfolio = Portfolio(starting_cash, self)
+        # 逐日更新的绩效指标，回测中途也能查看
+        self.performance = PerformanceTracker(starting_cash)
+        self.context = Context(self.portfolio, RunParams(
+            store.dates[self.start_row].astype(datetime.date),
+            store.dates[self.end_row].astype(datetime.date), frequency))
+        self.g = G()
+
+        # 聚宽的默认设置
+        self.order_cost = OrderCost()
+        self.options = {'use_real_price': False, 'order_volume_ratio': 0.25}
+        self.benchmark = '000300.XSHG'
+
+        self._jobs = []
+        self.row = self.start_row
+        # run 从这一行开始，从快照恢复时为快照的下一个交易日
+        self.next_row = self.start_row
+        self._price_row = store.field('open')[self.start_row]
+        # 当前 bar 的成交量和已用掉的成交量额度 {列号: 股数}
+        self._volume_row = store.field('volume')[self.start_row]
+        self._volume_used = {}
+        self._bar_key = None
+        self._limits = (None, None, None)
+        # history_panel 的按 bar 缓存
+        self.bar_cache = bar_cache if bar_cache is not None else BarCache()
+        self._strategy = None
+        # 耗时剖析（jqdata.profiler.Profiler），为 None 时不计时
+        self.profiler = None
+        # 交易流水（jqdata.journal.Journal），为 None 时策略的 record_event() 不记录
+        self.journal = None
+        # 定期存快照（jqdata.checkpoint.Checkpointer），为 None 时不存
+        self.checkpointer = None
+        # 因子缓存（jqdata.factor_cache.FactorCache），为 None 时 factor_rank 从行情计算因子
+        self.factor_cache = None
+
+        self.trades = []
+        self._traded_value = 0.0
+
+    ## 策略设置
+    def run_daily(self, func, time='every_bar'):
+        # 第三项标记 every_bar：分钟回放时在每根分钟线上调用
+        self._jobs.append((_parse_time(time), func, time == 'every_bar'))
+
+    def set_option(self, name, value):
+        self.options[name] = value
+
+    def set_order_cost(self, cost, type='stock'):
+        if type == 'stock':
+            self.order_cost = cost
+
+    def set_benchmark(self, security):
+        self.benchmark = security
+
+    ## 运行
+    def run(self, strategy, params=None, checkpoint=None):
+        """
+        运行策略模块，返回 BacktestResult
+        params: {名称: 值}，在 initialize 之后覆盖对应的 g.* 参数（参数扫描用）
+        checkpoint: jqdata.checkpoint.Checkpoint，从快照的下一个交易日继续
+        """
+        self.start(strategy, params, checkpoint)
+        rows = range(self.next_row, self.end_row + 1)
+        if self.frequency == 'minute':
+            days = self.minute_bars.iter_days(self.store.dates[self.next_row:self.end_row + 1])
+            for row, (_, minutes) in zip(rows, days):
+                self.run_day(row, minutes)
+        else:
+            for row in rows:
+                self.run_day(row)
+        return self.finish()
+
+    def start(self, strategy, params=None, checkpoint=None):
+        """
+        加载策略并调用 initialize，之后从 next_row 开始逐日调用 run_day
+        有 checkpoint 时在 initialize 之后用快照覆盖 g 和账户，params 再覆盖快照里的参数
+        """
+        self._strategy = strategy
+        strategy.g = self.g
+        n_days = self.end_row - self.start_row + 1
+        self._equity = np.empty(n_days)
+        self._turnover = np.empty(n_days)
+
+        with api.activate(self):
+            self._enter(self.start_row, _parse_time('before_open'))
+            strategy.initialize(self.context)
+            if checkpoint is not None:
+                self._restore(checkpoint)
+            for name, value in (params or {}).items():
+                if not hasattr(self.g, name):
+                    raise ValueError(f"策略的 initialize 里没有设置参数 g.{name}")
+                setattr(self.g, name, value)
+            if hasattr(strategy, 'before_trading_start'):
+                self.run_daily(strategy.before_trading_start, 'before_open')
+            if hasattr(strategy, 'after_trading_end'):
+                self.run_daily(strategy.after_trading_end, 'after_close')
+        # sorted 是稳定排序，同一时间的函数按注册顺序执行
+        self._jobs = sorted(self._jobs, key=lambda job: job[0])
+
+    def run_day(self, row, minutes=None):
+        """
+        运行 row 这一个交易日
+        minutes: 分钟回放时当天的分钟线（MinuteBars.load_day 的结果），不传时按需读取
+        """
+        # 多个引擎共用同一个策略模块时，每天切换到自己的 g
+        self._strategy.g = self.g
+        profiler = self.profiler
+        if self.frequency == 'minute':
+            if minutes is None:
+                minutes = self.minute_bars.load_day(self.store.dates[row])
+            close, volume = minutes['close'], minutes.get('volume')
+            events = self._minute_events()
+        else:
+            events = [(time, func, None) for time, func, _ in self._jobs]
+        with api.activate(self):
+            self._traded_value = 0.0
+            if profiler is not None:
+                profiler.start_bar(self.store.dates[row].astype(datetime.date))
+            for time, func, i in events:
+                if i is not None and volume is not None:
+                    # 同一根分钟线上的多个事件共用这根 bar 的成交量额度
+                    self._enter(row, time, (row, i), volume[:, i])
+                else:
+                    self._enter(row, time)
+                if i is not None:
+                    self._price_row = close[:, i]
+                if profiler is None:
+                    func(self.context)
+                else:
+                    profiler.call(f'job:{func.__name__}', func, self.context)
+            if profiler is not None:
+                profiler.end_bar()
+            # 收盘后按收盘价记录净值，并解锁 T+1
+            self._enter(row, _parse_time('after_close'))
+            self._equity[row - self.start_row] = self.portfolio.total_value
+            self._turnover[row - self.start_row] = self._traded_value
+            self.performance.update(self._equity[row - self.start_row], self._traded_value)
+            self._settle()
+        if self.checkpointer is not None:
+            self.checkpointer.after_day(self)
+
+    def _minute_events(self):
+        """
+        分钟回放一天的调用顺序 [(时刻, 函数, 分钟线序号)]
+        every_bar 的函数在每根分钟线上调用；其他函数在自己的时刻调用，
+        盘中取不晚于该时刻的最后一根分钟线，盘前盘后（序号为 None）按日线规则
+        """
+        events = []
+        for time, func, every_bar in self._jobs:
+            if every_bar:
+                continue
+            i = bisect.bisect_right(MINUTE_TIMES, time) - 1
+            in_session = i >= 0 and time <= MINUTE_TIMES[-1]
+            events.append((time, func, i if in_session else None))
+        bar_jobs = [func for _, func, every_bar in self._jobs if every_bar]
+        if bar_jobs:
+            for i, time in enumerate(MINUTE_TIMES):
+                events.extend((time, func, i) for func in bar_jobs)
+        # 稳定排序：同一时刻先调用定时函数，再调用 every_bar
+        events.sort(key=lambda event: event[0])
+        return events
+
+    def snapshot(self):
+        """当前交易日收盘后的快照，在 run_day 之后调用"""
+        k = self.row - self.start_row + 1
+        positions = [(p.security, p.total_amount, p.closeable_amount, p.avg_cost, p.acc_avg_cost,
+                      p.init_time, p._last_price) for p in self.portfolio.positions.values()]
+        return Checkpoint(self._strategy.__name__, self.store.dates[self.start_row], self.store.dates[self.row],
+                          vars(self.g), self.portfolio.starting_cash, self.portfolio.cash, positions,
+                          self._equity[:k].copy(), self._turnover[:k].copy(), list(self.trades))
+
+    def _restore(self, checkpoint):
+        """用快照覆盖 g、账户、净值和成交记录，run 从快照的下一个交易日开始"""
+        store = self.store
+        if checkpoint.strategy != self._strategy.__name__:
+            raise ValueError(f"快照来自策略 {checkpoint.strategy}，不能用于 {self._strategy.__name__}")
+        if checkpoint.start_date != store.dates[self.start_row]:
+            raise ValueError(f"快照的回测开始日期为 {checkpoint.start_date}，"
+                             f"与本次回测的 {store.dates[self.start_row]} 不同")
+        row = store.row_of(checkpoint.date)
+        if row < self.start_row or row > self.end_row or store.dates[row] != checkpoint.date:
+            raise ValueError(f"快照日期 {checkpoint.date} 不是本次回测区间内的交易日")
+
+        # g 是策略模块共用的同一个对象，只替换它的属性
+        vars(self.g).clear()
+        vars(self.g).update(checkpoint.load_g())
+        portfolio = self.portfolio
+        portfolio.starting_cash = checkpoint.starting_cash
+        portfolio.cash = checkpoint.cash
+        portfolio.positions.clear()
+        for security, total, closeable, avg_cost, acc_avg_cost, init_time, last_price in checkpoint.positions:
+            position = Position(security, portfolio)
+            position.total_amount = total
+            position.closeable_amount = closeable
+            position.avg_cost = avg_cost
+            position.acc_avg_cost = acc_avg_cost
+            position.init_time = init_time
+            position._last_price = last_price
+            portfolio.positions[security] = position
+        k = row - self.start_row + 1
+        self._equity[:k] = checkpoint.equity
+        self._turnover[:k] = checkpoint.turnover
+        self.performance = PerformanceTracker(checkpoint.starting_cash)
+        for value, traded_value in zip(checkpoint.equity, checkpoint.turnover):
+            self.performance.update(value, traded_value)
+        self.trades = list(checkpoint.trades)
+        self.next_row = row + 1
+
+    def finish(self):
+        """返回 BacktestResult"""
+        dates = self.store.dates[self.start_row:self.end_row + 1]
+        return BacktestResult(dates, self._equity, self._turnover, self.trades, self.portfolio.starting_cash)
+
+    def _enter(self, row, time, bar=None, volume_row=None):
+        """
+        切换到 row 这一天的 time 时刻
+        bar: 分钟回放时为 (行号, 分钟线序号)，volume_row 为这根分钟线的成交量；不传时这一天的日线是一根 bar
+        """
+        store = self.store
+        date = store.dates[row].astype(datetime.date)
+        self.row = row
+        self.context.current_dt = datetime.datetime.combine(date, time)
+        self.context.previous_date = (store.dates[row - 1].astype(datetime.date) if row > 0
+                                      else date - datetime.timedelta(days=1))
+        if time < datetime.time(9, 30):
+            self._price_row = store.field('close')[row - 1] if row > 0 else store.field('open')[row]
+        elif time < datetime.time(15, 0):
+            self._price_row = store.field('open')[row]
+        else:
+            self._price_row = store.field('close')[row]
+        if bar is None:
+            self._set_bar(row, store.field('volume')[row])
+        else:
+            self._set_bar(bar, volume_row)
+
+    def _set_bar(self, key, volume_row):
+        """切换到 key 这根 bar，同一根 bar 上的委托共用成交量额度"""
+        if key != self._bar_key:
+            self._bar_key = key
+            self._volume_used = {}
+        self._volume_row = volume_row
+
+    def price_limits(self):
+        """当天所有证券的 (涨停价, 跌停价)，按行号缓存"""
+        if self._limits[0] != self.row:
+            self._limits = (self.row,) + tuple(self.store.price_limits(self.row))
+        return self._limits[1], self._limits[2]
+
+    def _settle(self):
+        for position in self.portfolio.positions.values():
+            position.closeable_amount = position.total_amount
+
+    ## 行情
+    def current_price(self, security):
+        return float(self._price_row[self.store.col(security)])
+
+    def current_prices(self, securities):
+        return self._price_row[self.store.cols(securities)].astype(np.float64)
+
+    def factor_rank(self, weights, method='rank', window=20, count=None):
+        """用今天之前的数据给全市场打多因子分，返回按分数从高到低的证券代码（见 jqdata.factors）"""
+        return factors.rank_codes(self.store, self.row, weights, method, window, count, self.factor_cache)
+
+    def basket_volume_ratio(self, securities, lookback=4):
+        """
+        一篮子证券最近一天的总成交量 / 之前 lookback 天平均成交量之和，跳过停牌日、不含当天，
+        只统计历史完整的证券，从 DataStore.volume_window 的矩阵里直接取；没有成交量时返回 None
+        """
+        last, means = self.store.volume_window(lookback)
+        cols = self.store.cols(securities)
+        last, means = last[self.row, cols].astype(np.float64), means[self.row, cols].astype(np.float64)
+        complete = ~np.isnan(last) & ~np.isnan(means)
+        total = means[complete].sum()
+        return float(last[complete].sum() / total) if total > 0 else None
+
+    def status(self, securities):
+        """当天一批证券的状态位（见 DataStore.status），不在行情库中的为 STATUS_UNLISTED"""
+        index = self.store.code_index
+        cols = np.fromiter((index.get(c, -1) for c in securities), dtype=np.intp, count=len(securities))
+        row = self.store.status[self.row]
+        return np.where(cols >= 0, row[cols], STATUS_UNLISTED)
+
+    def history(self, security, count, fields, skip_paused=True):
+        """单个标的今天之前的 count 根日线，返回 (行号数组, {字段: 数组})"""
+        rows, panel = self.history_panel([security], count, fields, skip_paused)
+        valid = rows[0] >= 0
+        return rows[0][valid], {f: panel[0, valid, i] for i, f in enumerate(fields)}
+
+    def history_panel(self, securities, count, fields, skip_paused=True, include_now=False):
+        """
+        多个标的的 count 根日线，一次取完
+        返回 (行号矩阵, 数据)：行号矩阵为 (标的数 × count)，数据为 (标的数 × count × 字段数)，
+        历史不足 count 根的在前面补齐，行号为 -1、数据为 NaN。
+        不包括当天；include_now=True 且已收盘时包括当天。
+        同一根 bar 内的请求共用缓存：天数更少、字段是子集的请求直接从缓存里切片。
+        """
+        end = self.row + 1 if include_now and self.context.current_dt.time() >= datetime.time(15, 0) else self.row
+        cache = self.bar_cache.at(end)
+
+        key = (tuple(securities), skip_paused)
+        cached = cache.get(key)
+        if cached is not None:
+            cached_count, cached_fields, rows, panel = cached
+            if cached_count >= count and set(fields) <= set(cached_fields):
+                index = [cached_fields.index(f) for f in fields]
+                return rows[:, cached_count - count:], panel[:, cached_count - count:, index]
+            # 缓存不够用时按并集重新取，后续请求都能命中
+            count_to_fetch = max(count, cached_count)
+            fields_to_fetch = list(cached_fields) + [f for f in fields if f not in cached_fields]
+        else:
+            count_to_fetch, fields_to_fetch = count, list(fields)
+
+        rows = self._history_rows(self.store.cols(securities), count_to_fetch, end, skip_paused)
+        panel = self._gather(rows, securities, fields_to_fetch)
+        cache[key] = (count_to_fetch, fields_to_fetch, rows, panel)
+        if count_to_fetch == count and fields_to_fetch == list(fields):
+            return rows, panel
+        index = [fields_to_fetch.index(f) for f in fields]
+        return rows[:, count_to_fetch - count:], panel[:, count_to_fetch - count:, index]
+
+    def _history_rows(self, cols, count, end, skip_paused):
+        """每个标的在 end 之前最近 count 根 bar 的行号，(标的数 × count)，不足的在前面补 -1"""
+        n = len(cols)
+        if not skip_paused:
+            rows = np.arange(end - count, end)
+            return np.broadcast_to(np.where(rows >= 0, rows, -1), (n, count)).copy()
+
+        paused = self.store.field('paused')
+        close = self.store.field('close')
+        # 从 count 天开始往前找，有标的可交易天数不够时窗口翻倍
+        span = count
+        while True:
+            lo = max(0, end - span)
+            tradable = ~paused[lo:end][:, cols] & ~np.isnan(close[lo:end][:, cols])
+            if lo == 0 or (tradable.sum(axis=0) >= count).all():
+                break
+            span *= 2
+        # 从后往前数第几个可交易日，只保留最近的 count 个
+        rank = np.cumsum(tradable[::-1], axis=0)[::-1]
+        selected = tradable & (rank <= count)
+        k = selected.sum(axis=0)
+        col_idx, row_idx = np.nonzero(selected.T)
+        starts = np.concatenate(([0], np.cumsum(k)[:-1]))
+        position = count - k[col_idx] + np.arange(len(col_idx)) - starts[col_idx]
+        rows = np.full((n, count), -1, dtype=np.intp)
+        rows[col_idx, position] = lo + row_idx
+        return rows
+
+    def _gather(self, rows, securities, fields):
+        """按行号矩阵取数，行号为 -1 的位置为 NaN"""
+        cols = self.store.cols(securities)[:, None]
+        missing = rows < 0
+        panel = np.empty(rows.shape + (len(fields),))
+        for i, f in enumerate(fields):
+            panel[..., i] = self.store.field(f)[rows, cols]
+        panel[missing] = np.nan
+        return panel
+
+    def fundamentals(self, fields, date=None):
+        """date 当天（默认为前一交易日）所有上市证券的基本面字段"""
+        store = self.store
+        row = store.row_of(date) if date is not None else self.row - 1
+        if row < 0:
+            return pd.DataFrame(columns=['code'] + list(fields))
+
+        def build():
+            # 按日期取的整行都是内存映射上的零拷贝视图，只在挑出上市证券时复制一次
+            listed = np.flatnonzero(store.listed(row))
+            data = {'code': store.code_array[listed]}
+            for f in fields:
+                data[f] = store.field(f)[row].take(listed).astype(np.float64)
+            return pd.DataFrame(data)
+        # 同一天的表在共用 bar_cache 的引擎之间只建一次，返回副本以免策略改动缓存
+        return self.bar_cache.memo(('fundamentals', tuple(fields)), row, build).copy()
+
+    ## 下单
+    def order(self, security, amount, style=None):
+        return self._execute(security, int(amount), style)
+
+    def order_value(self, security, value, style=None):
+        price = self._order_price(security)
+        if price is None:
+            return None
+        return self._execute(security, int(value / price), style)
+
+    def order_target(self, security, amount, style=None):
+        position = self.portfolio.positions.get(security)
+        held = position.total_amount if position else 0
+        return self._execute(security, int(amount) - held, style)
+
+    def order_target_value(self, security, value, style=None):
+        position = self.portfolio.positions.get(security)
+        held = position.total_amount if position else 0
+        if value <= 0:
+            return self._execute(security, -held, style)
+        price = self._order_price(security)
+        if price is None:
+            return None
+        return self._execute(security, int(value / price) - held, style)
+
+    def order_target_basket(self, securities, values, kc_buffer=None, lot=100):
+        """
+        把一篮子证券调到目标市值 values（一个数时所有证券相同），
+        委托数量和保护价按数组一次算出，所有委托一次撮合（见 submit_orders）
+        委托数量 = int(目标市值 / 当前价 / lot) × lot - 持仓数量
+        kc_buffer: 科创板市价单的保护价 = 当前价 × (1 ± kc_buffer)，买入加、卖出减
+        lot: 目标数量取整的股数，默认 100，与策略在平台上逐只买入的 int(金额 / 开盘价 / 100) * 100 相同
+             （科创板也是 100 股整数倍）；为 1 时与 order_target_value 相同，只在撮合时取整
+        """
+        securities = list(securities)
+        n = len(securities)
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), (n,))
+        cols = self._basket_cols(securities)
+        prices = np.where(cols >= 0, self._price_row[cols], np.nan)
+        positions = self.portfolio.positions
+        held = np.fromiter((positions[s].total_amount if s in positions else 0 for s in securities),
+                           dtype=np.int64, count=n)
+        priced = prices > 0
+        for i in np.flatnonzero(~priced & (values > 0) & (cols >= 0)):
+            order_log.warning(f"{securities[i]} 当前没有有效价格，下单失败")
+        target = np.zeros(n, dtype=np.int64)
+        target[priced] = values[priced] / prices[priced] / lot
+        target *= lot
+        amounts = np.where(priced | (values <= 0), np.maximum(target, 0) - held, 0)
+
+        limit_prices = np.full(n, np.nan)
+        if kc_buffer is not None:
+            kcb = np.fromiter((s.startswith('688') for s in securities), dtype=bool, count=n)
+            limits = prices * np.where(amounts > 0, 1 + kc_buffer, 1 - kc_buffer)
+            limit_prices[kcb] = limits[kcb]
+        return self._match_basket(securities, cols, amounts, limit_prices)
+
+    def _order_price(self, security):
+        try:
+            price = self.current_price(security)
+        except KeyError:
+            order_log.warning(f"{security} 不在本地行情库中，下单失败")
+            return None
+        if np.isnan(price) or price <= 0:
+            order_log.warning(f"{security} 当前没有有效价格，下单失败")
+            return None
+        return price
+
+    def _execute(self, security, amount, style):
+        if amount == 0:
+            return None
+        col = self.store.code_index.get(security)
+        if col is None:
+            order_log.warning(f"{security} 不在本地行情库中，下单失败")
+            return None
+        position = self.portfolio.positions.get(security)
+        high_limit, low_limit = self.price_limits()
+        price = float(self._price_row[col])
+        filled, reason = match_order(
+            amount, price, style.limit_price if style is not None else None,
+            self.store.field('paused')[self.row, col], high_limit[col], low_limit[col],
+            self._volume_left(col), position.closeable_amount if position else 0,
+            security.startswith('688'), self.portfolio.available_cash, self.order_cost)
+        return self._apply_match(security, col, amount, style, price, filled, reason)
+
+    def submit_orders(self, securities, amounts, styles=None):
+        """
+        一批委托在当前 bar 上用一次数组运算撮合（见 jqdata.matching）
+        amounts: 委托数量，正数买入、负数卖出；styles: 每笔的下单方式，None 为不限价的市价单
+        返回与 securities 一一对应的 Order 列表，废单为 None；卖出先成交，释放的资金可以用于买入
+        """
+        securities = list(securities)
+        n = len(securities)
+        styles = styles if styles is not None else [None] * n
+        limit_prices = np.fromiter(
+            (np.nan if style is None or style.limit_price is None else style.limit_price for style in styles),
+            dtype=np.float64, count=n)
+        return self._match_basket(securities, self._basket_cols(securities), amounts, limit_prices, styles)
+
+    def _basket_cols(self, securities):
+        """一篮子证券的列号，不在行情库中的为 -1 并记录日志"""
+        index = self.store.code_index
+        cols = np.fromiter((index.get(s, -1) for s in securities), dtype=np.intp, count=len(securities))
+        for i in np.flatnonzero(cols < 0):
+            order_log.warning(f"{securities[i]} 不在本地行情库中，下单失败")
+        return cols
+
+    def _match_basket(self, securities, cols, amounts, limit_prices, styles=None):
+        """
+        撮合一篮子委托并成交，limit_prices 为每笔的保护价/限价（NaN 为不限价）
+        styles 为 None 时按 limit_prices 生成市价单的下单方式
+        """
+        n = len(securities)
+        amounts = np.asarray(amounts, dtype=np.int64)
+        active = np.flatnonzero((cols >= 0) & (amounts != 0))
+        orders = [None] * n
+        if len(active) == 0:
+            return orders
+
+        if len(active) < VECTOR_MATCH_MIN:
+            # 小篮子逐笔撮合更快（数组运算有固定开销），规则相同：先卖后买，逐笔占用资金和成交量额度
+            for i in sorted(active, key=lambda i: amounts[i] > 0):
+                style = styles[i] if styles is not None else (
+                    None if np.isnan(limit_prices[i]) else MarketOrderStyle(float(limit_prices[i])))
+                orders[i] = self._execute(securities[i], int(amounts[i]), style)
+            return orders
+
+        c = cols[active]
+        secs = [securities[i] for i in active]
+        positions = self.portfolio.positions
+        closeable = np.fromiter((positions[s].closeable_amount if s in positions else 0 for s in secs),
+                                dtype=np.int64, count=len(secs))
+        used = self._volume_used
+        volume = np.floor(self._volume_row[c] * self.options['order_volume_ratio'])
+        volume_left = np.where(np.isnan(volume), 0, volume) - np.fromiter(
+            (used.get(j, 0) for j in c), dtype=np.float64, count=len(c))
+        high_limit, low_limit = self.price_limits()
+        kcb = np.fromiter((s.startswith('688') for s in secs), dtype=bool, count=len(secs))
+        prices = self._price_row[c].astype(np.float64)
+        limits = limit_prices[active]
+
+        filled, reasons = match_orders(
+            amounts[active], prices, limits, self.store.field('paused')[self.row, c],
+            high_limit[c], low_limit[c], volume_left, closeable, kcb,
+            self.portfolio.available_cash, self.order_cost, keys=c)
+        # 先卖后买
+        for k in sorted(range(len(active)), key=lambda k: amounts[active[k]] > 0):
+            i = active[k]
+            if styles is not None:
+                style = styles[i]
+            else:
+                style = None if np.isnan(limits[k]) else MarketOrderStyle(float(limits[k]))
+            orders[i] = self._apply_match(secs[k], int(c[k]), int(amounts[i]), style, float(prices[k]),
+                                          int(filled[k]), int(reasons[k]))
+        return orders
+
+    def _volume_left(self, col):
+        """col 这只证券在当前 bar 上还能成交的数量"""
+        volume = self._volume_row[col]
+        if np.isnan(volume):
+            return 0
+        return int(volume * self.options['order_volume_ratio']) - self._volume_used.get(col, 0)
+
+    def _apply_match(self, security, col, amount, style, price, filled, reason):
+        """按撮合结果生成订单并成交，废单返回 None"""
+        is_buy = amount > 0
+        if reason:
+            message = REASON_MESSAGES[reason].format(side='买' if is_buy else '卖')
+            log = order_log.info if reason == VOLUME_CAP and filled else order_log.warning
+            log(f"{security} {message}")
+            if filled == 0 and reason in REJECTED:
+                return None
+        order = Order(security, abs(amount), is_buy, self.context.current_dt, style)
+        if filled == 0:
+            order.status = 'canceled'
+            return order
+        self._volume_used[col] = self._volume_used.get(col, 0) + filled
+        self._fill(order, filled, price)
+        return order
+
+    def _fill(self, order, amount, price):
+        portfolio = self.portfolio
+        value = amount * price
+        commission = self.order_cost.cost(value, order.is_buy)
+        security = order.security
+
+        if order.is_buy:
+            portfolio.cash -= value + commission
+            position = portfolio.positions.get(security)
+            if position is None:
+                position = Position(security, portfolio)
+                position.init_time = self.context.current_dt
+                portfolio.positions[security] = position
+            total = position.total_amount + amount
+            position.avg_cost = (position.total_amount * position.avg_cost + value) / total
+            position.acc_avg_cost = (position.total_amount * position.acc_avg_cost + value + commission) / total
+            position.total_amount = total
+        else:
+            portfolio.cash += value - commission
+            position = portfolio.positions[security]
+            position.total_amount -= amount
+            position.closeable_amount -= amount
+            if position.total_amount == 0:
+                del portfolio.positions[security]
+        position._last_price = price
+
+        order.filled = amount
+        order.price = price
+        order.commission = commission
+        order.status = 'filled' if amount == order.amount else 'canceled'
+        self.trades.append((self.context.current_dt, security, amount if order.is_buy else -amount,
+                            price, commission))
+        self._traded_value += value
+        order_log.info(f"{'买入' if order.is_buy else '卖出'} {security} {amount} 股，价格 {price:.2f}")
+
+
+class BacktestResult(object):
+    """回测结果：每日收盘净值、每日成交金额和成交记录"""
+
+    def __init__(self, dates, equity, turnover, trades, starting_cash):
+        self.dates = dates
+        self.equity = equity
+        self.turnover = turnover
+        self.trades = trades
+        self.starting_cash = starting_cash
+
+    @property
+    def returns(self):
+        prev = np.concatenate(([self.starting_cash], self.equity[:-1]))
+        return self.equity / prev - 1
+
+    def summary(self):
+        """绩效指标，见 jqdata.analytics.performance"""
+        return performance(self.equity, self.turnover, self.starting_cash)
+
+    def to_frame(self):
+        return pd.DataFrame({'total_value': self.equity, 'returns': self.returns,
+                             'traded_value': self.turnover},
+                            index=pd.DatetimeIndex(self.dates, name='date'))
+
+    def trades_frame(self):
+        return pd.DataFrame(self.trades, columns=['time', 'security', 'amount', 'price', 'commission'])
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.to_frame().to_csv(os.path.join(directory, 'equity.csv'))
+        self.trades_frame().to_csv(os.path.join(directory, 'trades.csv'), index=False)
@@ -0,0 +1,228 @@
+"""
+按 (因子, 日期, 证券) 存放的因子缓存：算过的因子值存在磁盘上，回测和参数扫描按日期直接读，不再从行情重算
+
+目录结构（每个因子和回看天数一个子目录）：
+    <cache>/<因子>_<回看天数>/meta.json     因子定义版本、证券数量
+    <cache>/<因子>_<回看天数>/values.bin    (日期 × 证券) 的 float64 矩阵，按行追加
+    <cache>/<因子>_<回看天数>/digests.bin   每一行对应的行情库数据摘要（uint64），按行追加
+    <cache>/<因子>_<回看天数>.lock          写缓存时加的文件锁（fcntl.flock）
+第 r 行是第 r 个交易日选股时看到的因子值（用第 r 天之前的数据计算，见 jqdata.factors）。
+缓存行总是从第 0 行起连续的：查询的日期超出已缓存的行时，中间缺的行全部补算后再返回，
+空缓存上第一次查询第 r 天要算 r + 1 行（之后的交易日每天只追加一行），所以应先用下面的命令补齐。
+多个进程可以同时写同一个缓存目录：核对、截断和追加都在独占的文件锁里进行，
+拿到锁后先重新核对磁盘上的行数，别的进程已经补过的行不会重复追加。
+
+只追加不改写：每天收盘后运行一次，只计算新增的交易日
+    python -m jqdata.factor_cache --data ./store --factor cap,turnover,momentum,volatility,liquidity --window 20
+回测时加 --factor-cache 使用（默认目录为 <data>/factor_cache）
+    python -m jqdata 251214-rel.py --data ./store --start 2020-01-01 --end 2023-12-31 --factor-cache ./store/factor_cache
+
+自动失效：
+    - 因子的计算代码（jqdata.factors.compute_factors）有改动时，定义版本变化，整个因子重建
+    - 行情库重写后证券数量变化时整个因子重建
+    - 行情库某一天的数据摘要（DataStore.row_digests）与缓存记录的不同时，从这一天起的缓存行截掉重算
+"""
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+
+from . import factors
+from .store import DataStore
+
+
+log = logging.getLogger('jqdata.factor_cache')
+
+# 因子计算代码的版本，代码有任何改动时缓存自动失效
+DEFINITION = hashlib.sha1(inspect.getsource(factors.compute_factors).encode()).hexdigest()[:16]
+
+
+class _Column(object):
+    """一个 (因子, 回看天数) 的缓存文件，valid 为与当前行情库一致的行数"""
+
+    def __init__(self, directory, factor, window, n_codes):
+        self.directory = directory
+        self.factor = factor
+        self.window = window
+        self.meta = {'factor': factor, 'window': window, 'definition': DEFINITION, 'codes': n_codes}
+        self.n_codes = n_codes
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.values_path = os.path.join(directory, 'values.bin')
+        self.digests_path = os.path.join(directory, 'digests.bin')
+        # 锁文件放在因子目录外面，重建时删掉整个目录也不会删掉正被别的进程锁着的文件
+        self.lock_path = directory + '.lock'
+        self.valid = 0
+        self._values = None
+
+    @property
+    def rows(self):
+        if not os.path.exists(self.digests_path):
+            return 0
+        return os.path.getsize(self.digests_path) // 8
+
+    def check(self, digests):
+        """返回 (定义版本和证券数量是否一致, 与行情库数据摘要一致的行数)"""
+        if not os.path.exists(self.meta_path):
+            return False, 0
+        with open(self.meta_path, encoding='utf-8') as f:
+            if json.load(f) != self.meta:
+                return False, 0
+        rows = self.rows
+        cached = np.fromfile(self.digests_path, dtype=np.uint64) if rows else np.empty(0, dtype=np.uint64)
+        n = min(rows, len(digests))
+        changed = np.flatnonzero(cached[:n] != digests[:n])
+        return True, int(changed[0]) if len(changed) else n
+
+    @contextlib.contextmanager
+    def locked(self):
+        """独占这个因子的缓存文件，直到退出 with"""
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def open(self, digests):
+        """加锁后 sync"""
+        with self.locked():
+            self.sync(digests)
+
+    def sync(self, digests):
+        """核对定义版本和数据摘要，失效的部分删掉，设置 valid；调用方需持有锁"""
+        same, valid = self.check(digests)
+        if not same:
+            if os.path.exists(self.directory):
+                log.info(f"因子 {self.factor}({self.window}) 的定义或证券数量有变化，重建缓存")
+                shutil.rmtree(self.directory)
+            os.makedirs(self.directory)
+            with open(self.meta_path, 'w', encoding='utf-8') as f:
+                json.dump(self.meta, f)
+        elif valid < self.rows:
+            log.info(f"因子 {self.factor}({self.window}) 从第 {valid} 个交易日起行情有变化，"
+                     f"截掉 {self.rows - valid} 行缓存")
+        # 同时把上次中断时多写的数据行截掉，两个文件的行数保持一致
+        self.truncate(valid)
+
+    def truncate(self, rows):
+        with open(self.values_path, 'ab') as f:
+            f.truncate(rows * self.n_codes * 8)
+        with open(self.digests_path, 'ab') as f:
+            f.truncate(rows * 8)
+        self.valid = rows
+        self._values = None
+
+    def append(self, values, digests):
+        """追加若干行：values 为 (行数 × 证券数)，digests 为对应行情行的摘要"""
+        # 先写数据再写摘要，中途中断时摘要行数不会多于数据行数
+        with open(self.values_path, 'ab') as f:
+            np.ascontiguousarray(values, dtype=np.float64).tofile(f)
+        with open(self.digests_path, 'ab') as f:
+            np.ascontiguousarray(digests, dtype=np.uint64).tofile(f)
+        self.valid += len(digests)
+        self._values = None
+
+    def read(self, row):
+        if self._values is None:
+            self._values = np.memmap(self.values_path, dtype=np.float64, mode='r', shape=(self.valid, self.n_codes))
+        return self._values[row]
+
+
+class FactorCache(object):
+    """
+    root: 缓存目录；store: 行情库
+    readonly: 只读（参数扫描的多个工作进程共用时），缺少的日期当场计算、不写回磁盘
+    """
+
+    def __init__(self, root, store, readonly=False):
+        self.root = root
+        self.store = store
+        self.readonly = readonly
+        self._columns = {}
+
+    def _column(self, factor, window):
+        key = (factor, window)
+        column = self._columns.get(key)
+        if column is None:
+            if factor not in factors.FACTORS:
+                raise ValueError(f"不支持的因子: {factor}，可选 {factors.FACTORS}")
+            column = _Column(os.path.join(self.root, f'{factor}_{window}'), factor, window, len(self.store.codes))
+            if self.readonly:
+                # 只读时不动文件，只用第一处数据变化之前的行
+                same, valid = column.check(self.store.row_digests())
+                column.valid = valid if same else 0
+            else:
+                column.open(self.store.row_digests())
+            self._columns[key] = column
+        return column
+
+    def get(self, factor, window, end):
+        """
+        第 end 个交易日选股时看到的因子值，(证券数,) 数组
+        end 超出已缓存的行时，把缓存从已有的最后一行连续补到 end（含）再返回
+        """
+        column = self._column(factor, window)
+        if end >= column.valid:
+            if self.readonly:
+                return _compute(self.store, factor, window, end)
+            self._extend(column, end + 1)
+        return column.read(end)
+
+    def update(self, names, window, end=None):
+        """把若干因子的缓存补到 end 行（默认为行情库最后一个交易日），返回新计算的行数"""
+        end = len(self.store.dates) if end is None else end
+        return sum(self._extend(self._column(name, window), end) for name in names)
+
+    def _extend(self, column, end):
+        """把缓存连续补到 end 行（不含），返回新计算的行数"""
+        if self.readonly:
+            raise ValueError("只读的因子缓存不能追加")
+        if end <= column.valid:
+            return 0
+        digests = self.store.row_digests()
+        with column.locked():
+            # 别的进程可能已经追加过，按磁盘上的现状重新核对
+            column.sync(digests)
+            start = column.valid
+            if end <= start:
+                return 0
+            if end - start > 1:
+                log.info(f"因子 {column.factor}({column.window}) 补算第 {start} 到 {end - 1} 个交易日，共 {end - start} 行")
+            values = np.stack([_compute(self.store, column.factor, column.window, row) for row in range(start, end)])
+            column.append(values, digests[start:end])
+        return end - start
+
+
+def _compute(store, factor, window, end):
+    if end < 1:
+        return np.full(len(store.codes), np.nan)
+    return factors.compute_factors(store, end, [factor], window)[factor]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jqdata.factor_cache', description='把因子缓存补到行情库的最后一个交易日')
+    parser.add_argument('--data', required=True, help='本地行情库目录')
+    parser.add_argument('--cache', help='因子缓存目录，默认为 <data>/factor_cache')
+    parser.add_argument('--factor', default=','.join(factors.FACTORS), help='逗号分隔的因子名')
+    parser.add_argument('--window', type=int, action='append', help='回看天数，可以重复，默认 20')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    store = DataStore.open(args.data)
+    cache = FactorCache(args.cache or os.path.join(args.data, 'factor_cache'), store)
+    names = [name.strip() for name in args.factor.split(',') if name.strip()]
+    for window in args.window or [20]:
+        added = cache.update(names, window)
+        print(f"window={window}: 新计算 {added} 行，缓存到 {store.dates[-1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+截面多因子打分：全市场每只证券的几个因子值按 (证券,) 数组对齐，一次标准化、加权合成、排序
+
+因子（window 为回看的交易日数，只用查询日之前的数据）：
+    cap: 市值（亿元，前一交易日）
+    turnover: 换手率，窗口内日均成交额 / 市值
+    momentum: 短期动量，窗口内的涨跌幅
+    volatility: 波动率，窗口内日对数收益率的标准差
+    liquidity: 流动性，窗口内日均成交额的对数
+标准化：rank 为截面分位排名（0~1），zscore 为截面标准分（截断到 ±3）。
+合成分数 = Σ 权重 × 标准化后的因子值；权重为正偏好因子值大的证券，为负偏好因子值小的。
+任何一个用到的因子没有值（未上市、窗口内数据不足）的证券不参与打分。
+
+    ranked = rank_codes(store, row, {'cap': -1.0, 'momentum': -0.3, 'volatility': -0.3})
+"""
+import numpy as np
+
+
+FACTORS = ('cap', 'turnover', 'momentum', 'volatility', 'liquidity')
+METHODS = ('rank', 'zscore')
+
+# zscore 标准化的截断值，避免极端值主导合成分数
+ZSCORE_CLIP = 3.0
+
+
+def compute_factors(store, end, names, window=20):
+    """用 end 行之前（不含）的数据计算因子，返回 {因子名: (证券数,) 数组}，没有值的为 NaN"""
+    unknown = set(names) - set(FACTORS)
+    if unknown:
+        raise ValueError(f"不支持的因子: {sorted(unknown)}，可选 {FACTORS}")
+    if end < 1:
+        raise ValueError("第一个交易日之前没有数据，无法计算因子")
+    lo = max(0, end - window - 1)
+    result = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cap = store.field('market_cap')[end - 1].astype(np.float64)
+        if 'cap' in names:
+            result['cap'] = cap
+        if 'momentum' in names or 'volatility' in names:
+            close = store.field('close')[lo:end]
+            if 'momentum' in names:
+                result['momentum'] = (close[-1] / close[0] - 1 if end - lo > window
+                                      else np.full(len(store.codes), np.nan))
+            if 'volatility' in names:
+                returns = np.diff(np.log(close), axis=0)
+                valid = np.isfinite(returns)
+                n = valid.sum(axis=0)
+                returns = np.where(valid, returns, 0.0)
+                mean = returns.sum(axis=0) / n
+                var = (np.where(valid, returns - mean, 0.0) ** 2).sum(axis=0) / (n - 1)
+                # 窗口内有效收益率不到一半的不算
+                result['volatility'] = np.where(n * 2 >= window, np.sqrt(var), np.nan)
+        if 'turnover' in names or 'liquidity' in names:
+            money = store.field('money')[max(0, end - window):end]
+            valid = np.isfinite(money) & (money > 0)
+            n = valid.sum(axis=0)
+            avg_money = np.where(n * 2 >= window, np.where(valid, money, 0.0).sum(axis=0) / n, np.nan)
+            if 'turnover' in names:
+                result['turnover'] = avg_money / (cap * 1e8)
+            if 'liquidity' in names:
+                result['liquidity'] = np.log(avg_money)
+    return result
+
+
+def rank_normalize(values):
+    """截面分位排名，最小的为 0、最大的为 1"""
+    n = len(values)
+    ranks = np.empty(n)
+    ranks[np.argsort(values, kind='stable')] = np.arange(n)
+    return ranks / (n - 1) if n > 1 else np.zeros(n)
+
+
+def zscore_normalize(values):
+    """截面标准分，截断到 ±ZSCORE_CLIP"""
+    std = values.std()
+    if not std > 0:
+        return np.zeros(len(values))
+    return np.clip((values - values.mean()) / std, -ZSCORE_CLIP, ZSCORE_CLIP)
+
+
+def composite_score(factors, weights, method='rank'):
+    """
+    factors: {因子名: (证券数,) 数组}；weights: {因子名: 权重}
+    返回 (证券数,) 的合成分数，有因子没有值的证券为 NaN
+    """
+    if method not in METHODS:
+        raise ValueError(f"不支持的标准化方法: {method}，可选 {METHODS}")
+    normalize = rank_normalize if method == 'rank' else zscore_normalize
+    n = len(next(iter(factors.values())))
+    valid = np.ones(n, dtype=bool)
+    for name in weights:
+        valid &= np.isfinite(factors[name])
+    score = np.full(n, np.nan)
+    score[valid] = 0.0
+    for name, weight in weights.items():
+        if weight:
+            score[valid] += weight * normalize(factors[name][valid])
+    return score
+
+
+def rank_codes(store, end, weights, method='rank', window=20, count=None, cache=None):
+    """
+    按合成分数从高到低排列的证券代码，count 为 None 时返回所有有分数的证券
+    cache: jqdata.factor_cache.FactorCache，有时从缓存读因子值，不再从行情计算
+    """
+    if not weights:
+        raise ValueError("至少需要一个因子权重")
+    if cache is not None:
+        values = {name: cache.get(name, window, end) for name in weights}
+    else:
+        values = compute_factors(store, end, list(weights), window)
+    score = composite_score(values, weights, method)
+    cols = np.flatnonzero(~np.isnan(score))
+    if count is not None and count < len(cols):
+        # 先部分选择出前 count 个，只对这些排序
+        cols = cols[np.argpartition(-score[cols], count - 1)[:count]]
+    cols = cols[np.argsort(-score[cols], kind='stable')]
+    return store.code_array[cols].tolist()
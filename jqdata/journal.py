@@ -0,0 +1,122 @@
+"""
+结构化的交易/信号流水：策略的每个决策（买入、卖出信号、止损、清仓完成）记一行，按列写进 Parquet
+
+    python -m jqdata 251214-rel.py --data ./store --start 2020-01-01 --end 2023-12-31 --journal ./journal.parquet
+
+策略里用 record_event(event, **字段) 记录（本地引擎特有，没有设置流水文件时什么也不做），
+引擎自动加上回测时间。字段固定为 COLUMNS，没有给出的为空值。
+记录先按列放在内存缓冲里，攒够 buffer_size 行写成一个 row group，多年的回测也不会一次占很多内存。
+分析时用 read_journal 读成 DataFrame，直接按列筛选聚合，不用再用正则解析日志文本。
+Parquet 需要 pyarrow，没有安装时退回 CSV（同一路径，扩展名换成 .csv）。
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+
+log = logging.getLogger('jqdata.journal')
+
+# 字段名 -> 空值，time 和 event 由 Journal.record 填入
+COLUMNS = {
+    'time': None,
+    'event': '',
+    'hold_days': np.nan,
+    'portfolio_avg_return': np.nan,
+    'volume_ratio': np.nan,
+    'bandwidth_ratio': np.nan,
+    'drawdown': np.nan,
+    'orders': 0,
+    'reason': '',
+}
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ('time', pa.timestamp('s')),
+        ('event', pa.string()),
+        ('hold_days', pa.float64()),
+        ('portfolio_avg_return', pa.float64()),
+        ('volume_ratio', pa.float64()),
+        ('bandwidth_ratio', pa.float64()),
+        ('drawdown', pa.float64()),
+        ('orders', pa.int64()),
+        ('reason', pa.string()),
+    ])
+
+
+class Journal(object):
+    """
+    按列缓冲、分批写出的事件流水
+    path: 输出文件（.parquet）；buffer_size: 每攒够多少行写一次
+    """
+
+    def __init__(self, path, buffer_size=4096):
+        if pq is None:
+            csv_path = os.path.splitext(path)[0] + '.csv'
+            log.warning(f"没有安装 pyarrow，交易流水改写为 CSV: {csv_path}")
+            path = csv_path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.buffer_size = buffer_size
+        self.rows = 0
+        self._buffer = {name: [] for name in COLUMNS}
+        self._writer = None
+
+    def record(self, time, event, **fields):
+        """记录一个事件，fields 的键必须是 COLUMNS 里的字段"""
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"交易流水没有这些字段: {sorted(unknown)}")
+        buffer = self._buffer
+        buffer['time'].append(time)
+        buffer['event'].append(event)
+        for name, empty in COLUMNS.items():
+            if name not in ('time', 'event'):
+                value = fields.get(name)
+                buffer[name].append(empty if value is None else value)
+        if len(buffer['time']) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """把缓冲里的记录写出"""
+        n = len(self._buffer['time'])
+        if n == 0:
+            return
+        if pq is not None:
+            table = pa.table(self._buffer, schema=SCHEMA)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, SCHEMA)
+            self._writer.write_table(table)
+        else:
+            pd.DataFrame(self._buffer).to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+        self.rows += n
+        self._buffer = {name: [] for name in COLUMNS}
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_journal(path):
+    """读取交易流水（Parquet 或退回的 CSV），返回 DataFrame"""
+    if path.endswith('.csv'):
+        return pd.read_csv(path, parse_dates=['time']).fillna({'event': '', 'reason': ''})
+    return pd.read_parquet(path)
@@ -0,0 +1,194 @@
+"""
+批量撮合：一根 bar 上的一篮子委托用一次数组运算撮合
+
+撮合规则：
+    - 没有有效价格、停牌的委托为废单
+    - 涨停时买入、跌停时卖出的委托不能成交
+    - 市价单的保护价 / 限价单的限价：买入时当前价高于、卖出时当前价低于该价格不成交
+    - 买入数量取整：科创板最少 200 股、1 股递增，其余 100 股整数倍
+    - 卖出不超过可卖数量（T+1），零股只能一次性卖出
+    - 每只证券在一根 bar 上的成交量不超过 bar 成交量 × order_volume_ratio，超出的部分撤单（部分成交），
+      同一根 bar 上的多笔委托共用这个额度（同一批里同一证券的多笔委托也共用），所以大仓位的清仓要分几天才能卖完
+    - 买入按委托顺序占用可用资金（含佣金），同一批委托里卖出的资金可以用于买入
+match_orders 用于一篮子委托；单笔下单（order/order_value 等）用同样规则的 match_order，
+免去小数组运算的固定开销。
+"""
+import numpy as np
+
+
+# 撮合结果的原因码
+OK = 0
+NO_PRICE = 1        # 没有有效价格
+PAUSED = 2          # 停牌
+LIMIT_UP = 3        # 涨停无法买入
+LIMIT_DOWN = 4      # 跌停无法卖出
+PROTECTED = 5       # 超出保护价/限价
+ZERO_AMOUNT = 6     # 可买/可卖数量为 0
+VOLUME_CAP = 7      # 超出成交量限制，部分成交或未成交
+
+# 这几种情况是废单，下单接口返回 None；其余未成交的返回已撤单的订单
+REJECTED = (NO_PRICE, PAUSED, ZERO_AMOUNT)
+
+# 价格最小变动单位，判断是否到达涨跌停价时留半个价位的余量
+TICK = 0.01
+
+
+def round_lot(amount, kcb):
+    """买入数量取整：科创板最少 200 股、1 股递增，其余 100 股整数倍"""
+    if kcb:
+        return amount if amount >= 200 else 0
+    return amount // 100 * 100
+
+
+def round_lots(amounts, kcb):
+    """round_lot 的数组版本"""
+    return np.where(kcb, np.where(amounts >= 200, amounts, 0), amounts // 100 * 100)
+
+
+def order_costs(values, is_buy, cost):
+    """一批成交金额的佣金和印花税，与 OrderCost.cost 逐笔计算的结果相同"""
+    commission = values * np.where(is_buy, cost.open_commission, cost.close_commission)
+    tax = values * np.where(is_buy, cost.open_tax, cost.close_tax)
+    return np.where(values > 0, np.maximum(commission, cost.min_commission) + tax, 0.0)
+
+
+def affordable(amount, price, kcb, cash, cost):
+    """
+    按可用资金 cash（含佣金）把一笔买入的数量减到买得起，买得起时原样返回
+    match_order 和 match_orders 都用它定买入数量：match_orders 里累计金额没有超出资金的委托不调用，结果相同
+    """
+    value = amount * price
+    if value + cost.cost(value, True) <= cash:
+        return amount
+    rate = cost.open_commission + cost.open_tax
+    max_amount = max(int(cash / (price * (1 + rate))), 0)
+    amount = min(amount, round_lot(max_amount, kcb))
+    step = 1 if kcb else 100
+    while amount > 0 and amount * price + cost.cost(amount * price, True) > cash:
+        amount = round_lot(amount - step, kcb)
+    return amount
+
+
+def match_order(amount, price, limit_price, paused, high_limit, low_limit,
+                volume_left, closeable, kcb, cash, cost):
+    """单笔委托的 match_orders，参数为标量，返回 (成交数量, 原因码)"""
+    is_buy = amount > 0
+    if not price > 0:
+        return 0, NO_PRICE
+    if paused:
+        return 0, PAUSED
+    if is_buy and price > high_limit - TICK / 2:
+        return 0, LIMIT_UP
+    if not is_buy and price < low_limit + TICK / 2:
+        return 0, LIMIT_DOWN
+    if limit_price is not None and ((is_buy and price > limit_price) or (not is_buy and price < limit_price)):
+        return 0, PROTECTED
+
+    wanted = round_lot(amount, kcb) if is_buy else min(-amount, closeable)
+    if wanted == 0:
+        return 0, ZERO_AMOUNT
+
+    reason = OK
+    filled = min(wanted, max(int(volume_left), 0))
+    # 部分成交时非科创板按 100 股取整；卖出全部可卖数量时才可以有零股
+    if not (kcb or (not is_buy and filled == closeable)):
+        filled = filled // 100 * 100
+    if filled < wanted:
+        reason = VOLUME_CAP
+    if is_buy and filled > 0:
+        filled = affordable(filled, price, kcb, cash, cost)
+        if filled == 0 and reason == OK:
+            reason = ZERO_AMOUNT
+    return filled, reason
+
+
+def match_orders(amounts, prices, limit_prices, paused, high_limit, low_limit,
+                 volume_left, closeable, kcb, cash, cost, keys=None):
+    """
+    撮合一批委托，参数都是与委托一一对应的数组：
+        amounts: 委托数量，正数买入、负数卖出
+        prices: 当前价；limit_prices: 保护价/限价，NaN 表示不限价
+        paused: 是否停牌；high_limit/low_limit: 涨跌停价，NaN 表示不限制
+        volume_left: 这根 bar 上还能成交的数量；closeable: 可卖数量
+        kcb: 是否科创板
+        keys: 证券标识（如列号），None 表示每笔委托的证券都不同
+    cash: 可用资金；cost: OrderCost
+    同一证券有多笔委托时它们共用成交量额度和可卖数量，这时改为逐笔撮合（见 _match_sequential）
+    返回 (成交数量, 原因码)，成交数量为非负整数
+    """
+    if keys is not None and len(np.unique(keys)) < len(keys):
+        return _match_sequential(amounts, prices, limit_prices, paused, high_limit, low_limit,
+                                 volume_left, closeable, kcb, cash, cost, keys)
+    amounts = np.asarray(amounts, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    is_buy = amounts > 0
+    wanted = np.abs(amounts)
+
+    reason = np.full(len(amounts), OK, dtype=np.int8)
+    reason[~(prices > 0)] = NO_PRICE
+    reason[(reason == OK) & paused] = PAUSED
+    # NaN 参与比较的结果为 False，没有涨跌停价/保护价的委托不受限制
+    reason[(reason == OK) & is_buy & (prices > high_limit - TICK / 2)] = LIMIT_UP
+    reason[(reason == OK) & ~is_buy & (prices < low_limit + TICK / 2)] = LIMIT_DOWN
+    beyond = np.where(is_buy, prices > limit_prices, prices < limit_prices)
+    reason[(reason == OK) & beyond] = PROTECTED
+    valid = reason == OK
+
+    closeable = np.asarray(closeable, dtype=np.int64)
+    amount = np.where(is_buy, round_lots(wanted, kcb), np.minimum(wanted, closeable))
+    amount = np.where(valid, amount, 0)
+    reason[valid & (amount == 0)] = ZERO_AMOUNT
+
+    capped = np.minimum(amount, np.maximum(volume_left, 0).astype(np.int64))
+    # 部分成交时非科创板按 100 股取整；卖出全部可卖数量时才可以有零股
+    odd_ok = kcb | (~is_buy & (capped == closeable))
+    capped = np.where(odd_ok, capped, capped // 100 * 100)
+    reason[(amount > 0) & (capped < amount)] = VOLUME_CAP
+    amount = capped
+
+    values = amount * prices
+    fees = order_costs(values, is_buy, cost)
+    available = cash + (values - fees)[~is_buy & (amount > 0)].sum()
+    buys = np.flatnonzero(is_buy & (amount > 0))
+    spend = np.cumsum(values[buys] + fees[buys])
+    short = np.flatnonzero(spend > available)
+    if len(short):
+        # 从第一笔买不起的委托开始按剩余资金逐笔减量
+        k = short[0]
+        left = available - (spend[k - 1] if k > 0 else 0.0)
+        for i in buys[k:]:
+            amount[i] = affordable(int(amount[i]), prices[i], bool(kcb[i]), left, cost)
+            value = amount[i] * prices[i]
+            left -= value + cost.cost(value, True)
+            if amount[i] == 0 and reason[i] == OK:
+                reason[i] = ZERO_AMOUNT
+    return amount, reason
+
+
+def _match_sequential(amounts, prices, limit_prices, paused, high_limit, low_limit,
+                      volume_left, closeable, kcb, cash, cost, keys):
+    """
+    按 match_order 逐笔撮合一批委托（先卖后买），每笔成交后扣减这只证券的成交量额度、可卖数量和可用资金，
+    与逐笔下单的结果相同；同一证券的各笔委托的 volume_left、closeable 应该相同
+    """
+    n = len(amounts)
+    filled = np.zeros(n, dtype=np.int64)
+    reason = np.full(n, OK, dtype=np.int8)
+    volume = dict(zip(keys, volume_left))
+    sellable = dict(zip(keys, closeable))
+    for i in sorted(range(n), key=lambda i: amounts[i] > 0):
+        key = keys[i]
+        limit = None if np.isnan(limit_prices[i]) else float(limit_prices[i])
+        filled[i], reason[i] = match_order(
+            int(amounts[i]), float(prices[i]), limit, paused[i], high_limit[i], low_limit[i],
+            volume[key], sellable[key], bool(kcb[i]), cash, cost)
+        if filled[i] == 0:
+            continue
+        value = filled[i] * prices[i]
+        volume[key] -= filled[i]
+        if amounts[i] > 0:
+            cash -= value + cost.cost(value, True)
+        else:
+            sellable[key] -= filled[i]
+            cash += value - cost.cost(value, False)
+    return filled, reason
@@ -0,0 +1,83 @@
+"""
+分钟线行情库
+
+目录结构（放在日线行情库下的 minute/ 目录）：
+    <root>/minute/<YYYY-MM-DD>/<field>.npy    每个交易日每个字段一个 (证券 × 分钟) 矩阵
+
+证券的行顺序与日线行情库的 codes 一致；每个交易日固定 MINUTE_BARS 根分钟线，
+时间标签为 bar 的结束时刻（聚宽的习惯）：
+    09:31 - 11:30   上午连续竞价，120 根
+    13:01 - 14:57   下午连续竞价，117 根
+    15:00           收盘集合竞价，1 根
+回放的范围是每个交易日的这 MINUTE_BARS 根 bar，即 09:31 到 15:00 收盘集合竞价为止，各交易日各自独立：
+不会从 15:00 接着回放到下一个交易日的 09:31，隔夜没有 bar；15:00 之后（after_close）和
+09:31 之前（before_open 等）的函数不落在分钟线上，按日线规则运行。
+按 (证券 × 分钟) 存放，同一只证券一天的分钟线是连续的，只取一篮子股票时只会读到这些行。
+回放时按交易日用生成器逐日打开（内存映射），任何时候只有当天的数据被映射，
+一年的分钟线不会同时放在内存里。
+"""
+import datetime
+import os
+
+import numpy as np
+
+from .store import BAR_FIELDS
+
+
+def _session(start, end):
+    start = datetime.datetime.combine(datetime.date.min, start)
+    end = datetime.datetime.combine(datetime.date.min, end)
+    minutes = int((end - start).total_seconds() // 60)
+    return [(start + datetime.timedelta(minutes=i)).time() for i in range(1, minutes + 1)]
+
+
+# 每根分钟线的时间标签（bar 结束时刻）
+MINUTE_TIMES = tuple(
+    _session(datetime.time(9, 30), datetime.time(11, 30))
+    + _session(datetime.time(13, 0), datetime.time(14, 57))
+    + [datetime.time(15, 0)]
+)
+MINUTE_BARS = len(MINUTE_TIMES)
+
+
+def _day_dir(root, date):
+    return os.path.join(root, 'minute', str(np.datetime64(date, 'D')))
+
+
+def write_minute_bars(store, date, fields):
+    """
+    把一个交易日的分钟线写进行情库 store 的 minute/ 目录
+    fields: {字段名: (证券 × MINUTE_BARS) 矩阵}，行顺序与 store.codes 一致，没有数据的证券为 NaN
+    """
+    if 'close' not in fields:
+        raise ValueError("分钟线必须包含 close 字段")
+    directory = _day_dir(store.root, date)
+    os.makedirs(directory, exist_ok=True)
+    for name, values in fields.items():
+        arr = np.asarray(values, dtype=np.float64)
+        if arr.shape != (len(store.codes), MINUTE_BARS):
+            raise ValueError(f"分钟线字段 {name} 的形状 {arr.shape} 应为 ({len(store.codes)}, {MINUTE_BARS})")
+        np.save(os.path.join(directory, f'{name}.npy'), arr)
+
+
+class MinuteBars(object):
+    """按交易日读取分钟线"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def has_day(self, date):
+        return os.path.exists(os.path.join(_day_dir(self.root, date), 'close.npy'))
+
+    def load_day(self, date):
+        """一个交易日的 {字段名: (证券 × 分钟) 内存映射矩阵}，只包含存在的字段"""
+        directory = _day_dir(self.root, date)
+        if not self.has_day(date):
+            raise FileNotFoundError(f"没有 {np.datetime64(date, 'D')} 的分钟线: {directory}")
+        return {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+                for name in BAR_FIELDS if os.path.exists(os.path.join(directory, f'{name}.npy'))}
+
+    def iter_days(self, dates):
+        """逐日产出 (日期, 当天分钟线)，上一天的映射在取下一天时释放"""
+        for date in dates:
+            yield date, self.load_day(date)
@@ -0,0 +1,184 @@
+"""
+回撤止损阈值的稳健性检验：对持仓日收益率做块自助抽样（block bootstrap），
+在几千条模拟路径上重放 after_market_update 的回撤止损/清仓状态机，比较不同阈值下的
+最大回撤、回撤持续天数和最终收益的分布，而不是只看一条历史路径。
+
+    python -m jqdata.montecarlo 251214-rel.py --data ./store --start 2014-01-01 --end 2023-12-31 \\
+        --threshold 0.05,0.08,0.1,0.15,1 --profit-target none,0.15 --paths 5000 --block 10
+
+步骤：
+    1. 跑一次回测，取前一天收盘时有持仓的交易日的日收益率（basket_returns）
+    2. 按长度为 block 的连续块循环抽样拼成 (路径数, 天数) 的收益率矩阵，保留块内的自相关
+       （小市值股票在熊市里连续下跌的特征）
+    3. 所有路径、所有 (阈值, 收益门槛) 组合放在一个 (路径数, 组合数) 数组里逐日推进状态机（replay）
+
+状态机与策略脚本一致：收盘后回撤（相对建仓后的最高价值）达到阈值就清仓，
+清仓后空仓 flat_days 天再买入新的一篮子，最高价值从买入后重新计算。
+收益门槛在这里简化为止盈：建仓以来收益率达到门槛就清仓。策略里条件1还要求成交量萎缩或布林带收紧，
+单凭收益率序列无法重现，所以这是条件1触发频率的上限；None 表示不止盈。
+阈值为 1 时相当于不止损。
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from .api import setup_logging
+from .engine import Engine, load_strategy
+from .portfolio import OrderCost
+from .store import DataStore
+from .sweep import _literal
+
+
+# 报告里各指标的分位数
+QUANTILES = (0.05, 0.5, 0.95)
+
+
+def basket_returns(result):
+    """回测结果里持仓日的日收益率：前一天收盘时有持仓的交易日"""
+    n = len(result.dates)
+    trades = result.trades_frame()
+    if trades.empty:
+        return np.empty(0)
+    days = np.searchsorted(result.dates, trades['time'].values.astype('datetime64[D]'))
+    amounts = trades.pivot_table(index=days, columns='security', values='amount', aggfunc='sum')
+    holdings = amounts.reindex(np.arange(n), fill_value=0).fillna(0).cumsum()
+    held = (holdings.values != 0).any(axis=1)
+    invested = np.concatenate(([False], held[:-1]))
+    return result.returns[invested]
+
+
+def block_bootstrap(returns, n_paths, length, block=10, seed=None):
+    """循环块自助抽样，返回 (n_paths, length) 的收益率矩阵"""
+    returns = np.asarray(returns, dtype=np.float64)
+    if len(returns) == 0:
+        raise ValueError("没有可抽样的收益率")
+    block = min(block, len(returns))
+    rng = np.random.default_rng(seed)
+    n_blocks = -(-length // block)
+    starts = rng.integers(0, len(returns), (n_paths, n_blocks))
+    index = (starts[:, :, None] + np.arange(block)) % len(returns)
+    return returns[index.reshape(n_paths, -1)[:, :length]]
+
+
+def replay(paths, thresholds, profit_targets=(None,), flat_days=1, cost=None):
+    """
+    在每条路径上重放回撤止损状态机
+    paths: (路径数, 天数) 的持仓日收益率；thresholds: 回撤阈值列表；profit_targets: 收益门槛列表
+    flat_days: 清仓后空仓的天数；cost: OrderCost，清仓和买入按费率扣费（不计最低佣金）
+    返回 (组合列表 [(阈值, 收益门槛)], {指标: (路径数, 组合数) 数组})，指标：
+        max_drawdown: 最大回撤；drawdown_days: 最长的回撤持续天数（净值低于前高的连续天数）
+        final_return: 最终收益率；stops: 止损次数；takes: 止盈次数
+    """
+    cost = cost or OrderCost()
+    buy_rate = cost.open_commission + cost.open_tax
+    sell_rate = cost.close_commission + cost.close_tax
+    combos = [(t, p) for t in thresholds for p in profit_targets]
+    threshold = np.array([t for t, _ in combos])
+    target = np.array([np.inf if p is None else p for _, p in combos])
+    n_paths, n_days = paths.shape
+    shape = (n_paths, len(combos))
+
+    value = np.ones(shape)
+    high = np.ones(shape)       # 建仓后的最高价值（策略的 g.portfolio_high）
+    entry = np.ones(shape)      # 建仓时的价值（g.initial_portfolio_value）
+    invested = np.ones(shape, dtype=bool)
+    wait = np.zeros(shape, dtype=np.int64)  # 清仓后还要空仓的天数
+    peak = np.ones(shape)       # 整条净值的最高点
+    max_drawdown = np.zeros(shape)
+    under = np.zeros(shape, dtype=np.int64)
+    drawdown_days = np.zeros(shape, dtype=np.int64)
+    stops = np.zeros(shape, dtype=np.int64)
+    takes = np.zeros(shape, dtype=np.int64)
+
+    for t in range(n_days):
+        # 开盘：空仓期满的路径买入新的一篮子
+        buy = ~invested & (wait == 0)
+        value[buy] *= 1 - buy_rate
+        entry[buy] = value[buy]
+        high[buy] = 0
+        invested |= buy
+        wait[~invested] -= 1
+
+        value *= np.where(invested, 1 + paths[:, t, None], 1.0)
+
+        # 收盘后：更新最高价值，回撤达到阈值止损，收益率达到门槛止盈
+        np.maximum(high, np.where(invested, value, 0), out=high)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stop = invested & (1 - value / high >= threshold)
+        take = invested & ~stop & (value / entry - 1 >= target)
+        out = stop | take
+        value[out] *= 1 - sell_rate
+        invested &= ~out
+        wait[out] = flat_days
+        stops += stop
+        takes += take
+
+        np.maximum(peak, value, out=peak)
+        np.maximum(max_drawdown, 1 - value / peak, out=max_drawdown)
+        under = np.where(value < peak, under + 1, 0)
+        np.maximum(drawdown_days, under, out=drawdown_days)
+
+    return combos, {
+        'max_drawdown': max_drawdown,
+        'drawdown_days': drawdown_days,
+        'final_return': value - 1,
+        'stops': stops,
+        'takes': takes,
+    }
+
+
+def report(combos, metrics, quantiles=QUANTILES):
+    """每个 (阈值, 收益门槛) 一行：各指标的均值和分位数"""
+    columns = {}
+    for name, values in metrics.items():
+        columns[f'{name}_mean'] = values.mean(axis=0)
+        if name in ('stops', 'takes'):
+            continue
+        for q, row in zip(quantiles, np.quantile(values, quantiles, axis=0)):
+            columns[f'{name}_p{round(q * 100)}'] = row
+    index = pd.MultiIndex.from_tuples(combos, names=['threshold', 'profit_target'])
+    return pd.DataFrame(columns, index=index)
+
+
+def _floats(text):
+    """0.05,0.1 -> [0.05, 0.1]，none 表示不设门槛"""
+    values = [_literal(v) for v in text.split(',')]
+    return [None if v in (None, 'none', 'None') else float(v) for v in values]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jqdata.montecarlo', description='回撤止损阈值的块自助抽样检验')
+    parser.add_argument('strategy', help='策略脚本路径')
+    parser.add_argument('--data', required=True, help='本地行情库目录')
+    parser.add_argument('--start', required=True, help='开始日期 YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYY-MM-DD')
+    parser.add_argument('--cash', type=float, default=1000000, help='初始资金')
+    parser.add_argument('--threshold', type=_floats, default=[0.05, 0.08, 0.1, 0.15, 0.2, 1.0],
+                        help='回撤阈值列表，1 为不止损')
+    parser.add_argument('--profit-target', type=_floats, default=[None], help='收益门槛列表，none 为不止盈')
+    parser.add_argument('--paths', type=int, default=5000, help='模拟路径数')
+    parser.add_argument('--block', type=int, default=10, help='抽样块长度（交易日）')
+    parser.add_argument('--length', type=int, help='每条路径的交易日数，默认与回测区间相同')
+    parser.add_argument('--flat-days', type=int, default=1, help='清仓后空仓的交易日数')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    parser.add_argument('--log-level', default='warning', choices=['debug', 'info', 'warning', 'error'])
+    parser.add_argument('--output', help='保存报告的 CSV 路径')
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level)
+    engine = Engine(DataStore.open(args.data), args.start, args.end, args.cash)
+    result = engine.run(load_strategy(args.strategy))
+    returns = basket_returns(result)
+    paths = block_bootstrap(returns, args.paths, args.length or len(result.dates), args.block, args.seed)
+    combos, metrics = replay(paths, args.threshold, args.profit_target, args.flat_days, engine.order_cost)
+    table = report(combos, metrics)
+    print(f"持仓日: {len(returns)} / {len(result.dates)}, 路径: {paths.shape[0]} × {paths.shape[1]} 天")
+    with pd.option_context('display.max_columns', None, 'display.width', None):
+        print(table.to_string(float_format='{:.4f}'.format))
+    if args.output:
+        table.to_csv(args.output)
+
+
+if __name__ == '__main__':
+    main()
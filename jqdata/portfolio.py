@@ -0,0 +1,174 @@
+"""
+持仓、账户、订单对象，字段名与聚宽保持一致
+"""
+import itertools
+
+import numpy as np
+
+
+class OrderCost(object):
+    """交易费用设置，对应聚宽的 OrderCost"""
+
+    def __init__(self, open_tax=0, close_tax=0.001, open_commission=0.0003,
+                 close_commission=0.0003, close_today_commission=0, min_commission=5):
+        self.open_tax = open_tax
+        self.close_tax = close_tax
+        self.open_commission = open_commission
+        self.close_commission = close_commission
+        self.close_today_commission = close_today_commission
+        self.min_commission = min_commission
+
+    def cost(self, value, is_buy):
+        """成交金额 value 对应的佣金和印花税"""
+        if value <= 0:
+            return 0.0
+        if is_buy:
+            commission = value * self.open_commission
+            tax = value * self.open_tax
+        else:
+            commission = value * self.close_commission
+            tax = value * self.close_tax
+        return max(commission, self.min_commission) + tax
+
+
+class OrderStyle(object):
+    """下单方式基类，limit_price 为 None 表示不限价"""
+
+    def __init__(self, limit_price=None):
+        self.limit_price = limit_price
+
+
+class MarketOrderStyle(OrderStyle):
+    """市价单，limit_price 为保护价（买入不高于、卖出不低于该价格）"""
+
+
+class LimitOrderStyle(OrderStyle):
+    """限价单"""
+
+    def __init__(self, limit_price):
+        super().__init__(limit_price)
+
+
+class Order(object):
+    """订单"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, security, amount, is_buy, add_time, style):
+        self.order_id = next(Order._ids)
+        self.security = security
+        self.amount = amount
+        self.is_buy = is_buy
+        self.add_time = add_time
+        self.style = style
+        self.filled = 0
+        self.price = 0.0
+        self.commission = 0.0
+        # open=未成交, filled=全部成交, canceled=撤单, rejected=废单
+        self.status = 'open'
+
+    @property
+    def limit_price(self):
+        return self.style.limit_price if self.style is not None else None
+
+    def __repr__(self):
+        side = '买入' if self.is_buy else '卖出'
+        return (f"Order({self.security}, {side}, 委托: {self.amount}, 成交: {self.filled}, "
+                f"价格: {self.price:.2f}, 状态: {self.status})")
+
+
+class Position(object):
+    """单个标的的持仓"""
+
+    def __init__(self, security, portfolio):
+        self.security = security
+        self.total_amount = 0
+        self.closeable_amount = 0
+        self.avg_cost = 0.0
+        self.acc_avg_cost = 0.0
+        self.init_time = None
+        self._portfolio = portfolio
+        self._last_price = np.nan
+
+    @property
+    def today_amount(self):
+        """今天买入、T+1 前不能卖出的数量"""
+        return self.total_amount - self.closeable_amount
+
+    @property
+    def locked_amount(self):
+        return 0
+
+    @property
+    def price(self):
+        return self._portfolio._price_of(self)
+
+    last_sale_price = price
+
+    @property
+    def value(self):
+        return self.total_amount * self.price
+
+    def __repr__(self):
+        return (f"Position({self.security}, 总数: {self.total_amount}, 可卖: {self.closeable_amount}, "
+                f"成本: {self.avg_cost:.2f})")
+
+
+class Positions(dict):
+    """持仓字典，与聚宽一样访问不存在的标的时返回一个空持仓（不会加入字典）"""
+
+    def __init__(self, portfolio):
+        super().__init__()
+        self._portfolio = portfolio
+
+    def __missing__(self, security):
+        return Position(security, self._portfolio)
+
+
+class Portfolio(object):
+    """账户，positions 里只保留 total_amount > 0 的持仓"""
+
+    def __init__(self, starting_cash, engine):
+        self.starting_cash = starting_cash
+        self.cash = float(starting_cash)
+        self.positions = Positions(self)
+        self._engine = engine
+
+    @property
+    def available_cash(self):
+        return self.cash
+
+    @property
+    def locked_cash(self):
+        return 0.0
+
+    def _price_of(self, position):
+        """当前价，停牌或缺数据时沿用最后一次有效价格"""
+        price = self._engine.current_price(position.security)
+        if np.isnan(price):
+            return position._last_price
+        position._last_price = price
+        return price
+
+    @property
+    def positions_value(self):
+        if not self.positions:
+            return 0.0
+        # 一次取出所有持仓的当前价，向量化计算市值
+        positions = list(self.positions.values())
+        amounts = np.fromiter((p.total_amount for p in positions), dtype=np.float64, count=len(positions))
+        prices = self._engine.current_prices([p.security for p in positions])
+        missing = np.isnan(prices)
+        if missing.any():
+            prices[missing] = [p._last_price for p, m in zip(positions, missing) if m]
+        for p, price in zip(positions, prices):
+            p._last_price = price
+        return float(np.nansum(amounts * prices))
+
+    @property
+    def total_value(self):
+        return self.cash + self.positions_value
+
+    @property
+    def returns(self):
+        return self.total_value / self.starting_cash - 1
@@ -0,0 +1,131 @@
+"""
+回测耗时剖析：run_daily 注册的每个策略函数和每个数据/下单接口的调用次数、耗时和延迟分布
+
+把 Profiler 设为引擎的 profiler 后：
+    - 引擎每天调用策略函数时按函数名计时（名称为 job:<函数名>）
+    - get_fundamentals / attribute_history / get_bars / get_current_data / order* 按接口名计时
+耗时都是包含内部调用的墙钟时间（策略函数的耗时包括它调用的接口）。
+每个名称记录单次调用的延迟直方图，以及每个交易日的调用次数和总耗时（可以得到每根 bar 的延迟分布）。
+未设置 profiler 时接口只多一次属性判断。
+
+    python -m jqdata 251214-rel.py --data ./store --start 2020-01-01 --end 2023-12-31 --profile ./profile
+"""
+import bisect
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+
+# 延迟直方图的桶上界（秒）：1µs 起每档翻倍，约到 1s，超出的计入最后一档
+BUCKETS = tuple(2.0 ** k * 1e-6 for k in range(21))
+
+
+class _Stat(object):
+    __slots__ = ('calls', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+class Profiler(object):
+    """按名称累计调用次数、耗时、延迟直方图，并按交易日记录"""
+
+    def __init__(self):
+        self.stats = {}
+        # 每个交易日每个名称一行：(日期, 名称, 调用次数, 总耗时)
+        self.bars = []
+        self._bar = {}
+        self._date = None
+
+    def start_bar(self, date):
+        self._date = date
+        self._bar = {}
+
+    def end_bar(self):
+        for name, (calls, seconds) in self._bar.items():
+            self.bars.append((self._date, name, calls, seconds))
+        self._bar = {}
+
+    def record(self, name, seconds):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = _Stat()
+        stat.add(seconds)
+        bar = self._bar.get(name)
+        if bar is None:
+            self._bar[name] = [1, seconds]
+        else:
+            bar[0] += 1
+            bar[1] += seconds
+
+    def call(self, name, func, *args, **kwargs):
+        """调用 func 并按 name 计时"""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self):
+        """每个名称一行：调用次数、总耗时、平均/最大单次耗时，以及每根 bar 总耗时的中位数和 p99（毫秒）"""
+        bars = self.bars_frame()
+        rows = []
+        for name, stat in self.stats.items():
+            per_bar = bars.loc[bars['name'] == name, 'seconds'].to_numpy()
+            rows.append({
+                'name': name,
+                'calls': stat.calls,
+                'total_ms': stat.total * 1000,
+                'mean_ms': stat.total / stat.calls * 1000,
+                'max_ms': stat.max * 1000,
+                'bars': len(per_bar),
+                'bar_p50_ms': float(np.percentile(per_bar, 50)) * 1000 if len(per_bar) else np.nan,
+                'bar_p99_ms': float(np.percentile(per_bar, 99)) * 1000 if len(per_bar) else np.nan,
+            })
+        columns = ['name', 'calls', 'total_ms', 'mean_ms', 'max_ms', 'bars', 'bar_p50_ms', 'bar_p99_ms']
+        return pd.DataFrame(rows, columns=columns).sort_values('total_ms', ascending=False).reset_index(drop=True)
+
+    def bars_frame(self):
+        return pd.DataFrame(self.bars, columns=['date', 'name', 'calls', 'seconds'])
+
+    def histograms(self):
+        """
+        {名称: {'call': 单次调用延迟直方图, 'bar': 每根 bar 总耗时直方图}}
+        直方图为 [(桶上界秒数, 次数)]，最后一档的上界为 None
+        """
+        bars = self.bars_frame()
+        edges = list(BUCKETS) + [None]
+        result = {}
+        for name, stat in self.stats.items():
+            per_bar = bars.loc[bars['name'] == name, 'seconds'].to_numpy()
+            bar_counts = np.bincount(np.searchsorted(BUCKETS, per_bar, side='left'), minlength=len(edges))
+            result[name] = {
+                'call': [(e, c) for e, c in zip(edges, stat.histogram) if c],
+                'bar': [(e, int(c)) for e, c in zip(edges, bar_counts) if c],
+            }
+        return result
+
+    def save(self, directory):
+        """写出 profile.csv（汇总）、profile_bars.csv（逐日）、profile.json（汇总 + 直方图）"""
+        os.makedirs(directory, exist_ok=True)
+        summary = self.summary()
+        summary.to_csv(os.path.join(directory, 'profile.csv'), index=False)
+        self.bars_frame().to_csv(os.path.join(directory, 'profile_bars.csv'), index=False)
+        histograms = self.histograms()
+        report = {row['name']: dict(row, histogram=histograms[row['name']])
+                  for row in summary.to_dict('records')}
+        with open(os.path.join(directory, 'profile.json'), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=float)
@@ -0,0 +1,131 @@
+"""
+多实例运行：一个进程里托管多个策略实例，共用一份行情
+
+每个实例有自己的 g、账户和 run_daily 注册的函数，可以是不同的策略脚本，也可以是同一脚本的不同参数。
+所有实例按交易日同步推进，共用：
+    - 同一个内存映射的行情库
+    - 同一份 BarCache：同一根 bar 内的历史数据和按日期的基本面表只取一次
+    - 分钟回放时同一份分钟线：每天只打开一次，逐个实例回放
+    - 同一个策略脚本只加载一次，脚本里的模块级缓存（如选股缓存）在实例之间共用
+加载行情只发生一次，几十个实例一起逐 bar 推进。
+
+    python -m jqdata.runner --data ./store --start 2020-01-01 --end 2023-12-31 \\
+        --instance 'top10=251214-rel.py' --instance 'top20=251214-rel.py:stocknum=20' \\
+        --instance 'dd5=251214-ab.py:max_drawdown_threshold=0.05'
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from .api import setup_logging
+from .engine import BarCache, Engine, load_strategy
+from .minute import MinuteBars
+from .store import DataStore
+from .sweep import _literal
+
+
+class MultiRunner(object):
+    """
+    store: 本地行情库；start_date/end_date: 回测区间；frequency: 'day' 或 'minute'
+    先用 add 加入实例，再调用 run
+    """
+
+    def __init__(self, store, start_date, end_date, frequency='day'):
+        self.store = store
+        self.start_date = start_date
+        self.end_date = end_date
+        self.frequency = frequency
+        self.bar_cache = BarCache()
+        self.minute_bars = MinuteBars(store.root) if frequency == 'minute' else None
+        self.engines = {}
+        self._instances = {}
+        self._modules = {}
+
+    def add(self, name, strategy, params=None, starting_cash=1000000):
+        """
+        加入一个实例，strategy 为策略模块或脚本路径（同一路径只加载一次）
+        返回该实例的 Engine
+        """
+        if name in self.engines:
+            raise ValueError(f"实例名重复: {name}")
+        if isinstance(strategy, str):
+            path = os.path.abspath(strategy)
+            if path not in self._modules:
+                self._modules[path] = load_strategy(path)
+            strategy = self._modules[path]
+        engine = Engine(self.store, self.start_date, self.end_date, starting_cash,
+                        bar_cache=self.bar_cache, frequency=self.frequency, minute_bars=self.minute_bars)
+        self.engines[name] = engine
+        self._instances[name] = (strategy, params)
+        return engine
+
+    def run(self):
+        """运行所有实例，返回 {实例名: BacktestResult}"""
+        if not self.engines:
+            raise ValueError("没有加入任何策略实例")
+        for name, engine in self.engines.items():
+            engine.start(*self._instances[name])
+        first = next(iter(self.engines.values()))
+        rows = range(first.start_row, first.end_row + 1)
+        if self.minute_bars is not None:
+            days = self.minute_bars.iter_days(self.store.dates[first.start_row:first.end_row + 1])
+            for row, (_, minutes) in zip(rows, days):
+                for engine in self.engines.values():
+                    engine.run_day(row, minutes)
+        else:
+            for row in rows:
+                for engine in self.engines.values():
+                    engine.run_day(row)
+        return {name: engine.finish() for name, engine in self.engines.items()}
+
+
+def _parse_params(body):
+    """k1=v1,k2=v2 -> {k1: v1, k2: v2}，格式不对时返回 None"""
+    params = {}
+    for item in filter(None, body.split(',')):
+        key, sep, value = item.partition('=')
+        if not sep:
+            return None
+        params[key.strip()] = _literal(value)
+    return params
+
+
+def _parse_instance(text):
+    """name=path[:k1=v1,k2=v2]"""
+    name, sep, spec = text.partition('=')
+    path, _, body = spec.partition(':')
+    params = _parse_params(body)
+    if not sep or not name or not path or params is None:
+        raise argparse.ArgumentTypeError(f"实例格式应为 name=path[:k1=v1,k2=v2]: {text}")
+    return name, path, params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jqdata.runner', description='一个进程里同步运行多个策略实例')
+    parser.add_argument('--data', required=True, help='本地行情库目录')
+    parser.add_argument('--start', required=True, help='开始日期 YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYY-MM-DD')
+    parser.add_argument('--cash', type=float, default=1000000, help='每个实例的初始资金')
+    parser.add_argument('--frequency', default='day', choices=['day', 'minute'])
+    parser.add_argument('--instance', action='append', required=True, type=_parse_instance,
+                        metavar='NAME=PATH[:K=V,...]', help='一个策略实例，可以重复')
+    parser.add_argument('--log-level', default='warning', choices=['debug', 'info', 'warning', 'error'])
+    parser.add_argument('--output', help='保存每个实例的净值、成交记录和汇总的目录')
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_level)
+    runner = MultiRunner(DataStore.open(args.data), args.start, args.end, args.frequency)
+    for name, path, params in args.instance:
+        runner.add(name, path, params, args.cash)
+    results = runner.run()
+    summary = pd.DataFrame({name: result.summary() for name, result in results.items()}).T
+    print(summary.to_string(float_format='{:.4f}'.format))
+    if args.output:
+        for name, result in results.items():
+            result.save(os.path.join(args.output, name))
+        summary.to_csv(os.path.join(args.output, 'summary.csv'), index_label='instance')
+
+
+if __name__ == '__main__':
+    main()
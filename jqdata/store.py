@@ -0,0 +1,307 @@
+"""
+本地列式行情库
+
+目录结构：
+    <root>/meta.json      交易日列表、证券代码列表、字段列表
+    <root>/<field>.npy    每个字段一个 (交易日 × 证券) 矩阵
+    <root>/digests.npy    每个交易日所有字段数据的摘要（数据版本，见 DataStore.row_digests）
+    <root>/volume_window/ 按数据版本缓存的成交量窗口矩阵（见 DataStore.volume_window）
+
+价格类字段为 float64，未上市/已退市的格子为 NaN；paused、is_st 为 bool；
+市值矩阵为 float32（选股只用来排序，精度足够，体积减半）。
+可选的 high_limit/low_limit 字段为涨跌停价，没有时按前收盘价和涨跌幅限制推算（见 DataStore.price_limits）。
+
+打开时默认按内存映射读取：按日期取一行是零拷贝视图，
+多个回测进程打开同一个行情库时通过操作系统页缓存共用同一份内存。
+证券代码的列号是稳定的：重写行情库时已有代码保持原来的列，新代码追加在后面。
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+# 行情字段（attribute_history 可以取到的字段）
+BAR_FIELDS = ('open', 'close', 'high', 'low', 'volume', 'money')
+# 状态字段
+STATUS_FIELDS = ('paused', 'is_st')
+# 用 float32 存放的字段
+FLOAT32_FIELDS = ('market_cap',)
+# 必须存在的字段
+REQUIRED_FIELDS = BAR_FIELDS + STATUS_FIELDS + ('market_cap',)
+
+# 状态矩阵（DataStore.status）的状态位
+STATUS_PAUSED = 1
+STATUS_ST = 2
+STATUS_DELISTING = 4    # 退市整理期：最后一个上市交易日及之前 DELISTING_DAYS-1 个交易日
+STATUS_NEW = 8          # 上市不满 NEW_LISTING_DAYS 个交易日（行情库第一天就已上市的不算）
+STATUS_UNLISTED = 16    # 未上市或已退市
+DELISTING_DAYS = 15
+NEW_LISTING_DAYS = 60
+
+# DataStore.volume_window 的缓存子目录，以及构建时每块的证券数
+VOLUME_WINDOW_DIR = 'volume_window'
+VOLUME_WINDOW_BLOCK = 256
+
+# 涨跌幅限制：主板 10%、主板 ST 5%；科创板 20%；创业板注册制改革（CYB_REFORM_DATE）起 20%
+LIMIT_RATIO = 0.1
+ST_LIMIT_RATIO = 0.05
+WIDE_LIMIT_RATIO = 0.2
+CYB_REFORM_DATE = np.datetime64('2020-08-24')
+
+
+class DataStore(object):
+    """按字段存放的 (交易日 × 证券) 行情矩阵"""
+
+    def __init__(self, dates, codes, fields, root=None):
+        self.root = root
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.codes = list(codes)
+        self.code_array = np.asarray(self.codes, dtype=object)
+        # 证券代码 -> 列号
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        self._fields = dict(fields)
+        for name, arr in self._fields.items():
+            if arr.shape != (len(self.dates), len(self.codes)):
+                raise ValueError(f"字段 {name} 的形状 {arr.shape} 与交易日/证券数量不一致")
+        self._status = None
+        self._boards = None
+        self._digests = None
+        self._volume_windows = {}
+
+    @classmethod
+    def open(cls, root, mmap=True):
+        """打开一个本地行情库，mmap=False 时把所有字段读进内存"""
+        meta = _read_meta(root)
+        fields = {}
+        for name in meta['fields']:
+            fields[name] = np.load(os.path.join(root, f'{name}.npy'), mmap_mode='r' if mmap else None)
+        return cls(meta['dates'], meta['codes'], fields, root=root)
+
+    @property
+    def fields(self):
+        return list(self._fields)
+
+    def has_field(self, name):
+        return name in self._fields
+
+    def field(self, name):
+        """取整个字段矩阵"""
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise KeyError(f"本地行情库中没有字段: {name}") from None
+
+    def col(self, code):
+        """证券代码 -> 列号，不存在时抛出 KeyError"""
+        return self.code_index[code]
+
+    def cols(self, codes):
+        """一组证券代码 -> 列号数组"""
+        return np.fromiter((self.code_index[c] for c in codes), dtype=np.intp, count=len(codes))
+
+    def row_of(self, date):
+        """不晚于 date 的最后一个交易日的行号，date 早于第一个交易日时返回 -1"""
+        return int(np.searchsorted(self.dates, np.datetime64(date, 'D'), side='right')) - 1
+
+    def row_digests(self):
+        """
+        每个交易日一个 uint64 摘要，覆盖这一天所有字段的整行数据，用作按日期的数据版本：
+        重写行情库后某一天的数据有变化时这一天的摘要随之变化，追加新的交易日不影响已有日期的摘要
+        （新增证券时列数变化，所有日期的摘要都会变化）
+        """
+        if self._digests is None:
+            path = os.path.join(self.root, 'digests.npy') if self.root else None
+            if path and os.path.exists(path):
+                self._digests = np.load(path)
+            if self._digests is None or len(self._digests) != len(self.dates):
+                self._digests = _row_digests(self._fields, len(self.dates))
+        return self._digests
+
+    def listed(self, row):
+        """row 这一天处于上市状态的证券（收盘价不为 NaN）"""
+        return ~np.isnan(self._fields['close'][row])
+
+    @property
+    def status(self):
+        """
+        (交易日 × 证券) 的 uint8 状态矩阵，每格是 STATUS_* 状态位的组合，0 表示正常交易
+        第一次访问时由 paused、is_st 和上市区间一次算出，之后按行号取一行即可一次过滤一批证券
+        """
+        if self._status is None:
+            self._status = _status_matrix(self._fields['close'], self._fields['paused'], self._fields['is_st'])
+        return self._status
+
+    def volume_window(self, lookback):
+        """
+        成交量的 (最近一天, 之前 lookback 天均值) 两个 (交易日 × 证券) float32 矩阵，与停牌跳过的历史一致：
+        第 r 行是第 r 天（不含）之前最近一个可交易日的成交量，和再往前 lookback 个可交易日的平均成交量，
+        可交易日不够的为 NaN。一批证券的成交量比例只是取几格。
+        每个数据版本（row_digests）和 lookback 只算一次，存为 <root>/volume_window/<数据版本>-<lookback>.npy
+        并按内存映射读取，多个回测进程共用同一份文件和页缓存；行情库重写后数据版本变化，旧文件删掉重算
+        """
+        if lookback < 1:
+            raise ValueError(f"回看天数必须为正数: {lookback}")
+        matrix = self._volume_windows.get(lookback)
+        if matrix is None:
+            matrix = self._volume_windows[lookback] = self._load_volume_window(lookback)
+        return matrix[0], matrix[1]
+
+    def _load_volume_window(self, lookback):
+        shape = (2, len(self.dates), len(self.codes))
+        if self.root is None:
+            matrix = np.empty(shape, dtype=np.float32)
+            self._build_volume_window(matrix, lookback)
+            return matrix
+        directory = os.path.join(self.root, VOLUME_WINDOW_DIR)
+        version = hashlib.blake2b(self.row_digests().tobytes(), digest_size=8).hexdigest()
+        path = os.path.join(directory, f'{version}-{lookback}.npy')
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            # 先写临时文件再改名：同时构建的进程各写各的，读到的总是完整的文件
+            tmp = f'{path}.{os.getpid()}.tmp'
+            matrix = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float32, shape=shape)
+            self._build_volume_window(matrix, lookback)
+            matrix.flush()
+            del matrix
+            os.replace(tmp, path)
+            for name in os.listdir(directory):
+                if name.endswith(f'-{lookback}.npy') and name != os.path.basename(path):
+                    os.remove(os.path.join(directory, name))
+        return np.load(path, mmap_mode='r')
+
+    def _build_volume_window(self, out, lookback):
+        """按列分块填充 volume_window 的矩阵，峰值内存与证券数无关"""
+        fields = self._fields
+        for lo in range(0, len(self.codes), VOLUME_WINDOW_BLOCK):
+            block = slice(lo, lo + VOLUME_WINDOW_BLOCK)
+            out[0, :, block], out[1, :, block] = _volume_window(
+                fields['volume'][:, block], fields['close'][:, block], fields['paused'][:, block], lookback)
+
+    def price_limits(self, row):
+        """
+        row 这一天所有证券的 (涨停价, 跌停价)，列顺序与 codes 一致，没有前收盘价的为 NaN（不限制）
+        行情库有 high_limit/low_limit 字段时直接取，否则按前收盘价和板块、ST 的涨跌幅限制推算
+        """
+        fields = self._fields
+        if 'high_limit' in fields and 'low_limit' in fields:
+            return fields['high_limit'][row], fields['low_limit'][row]
+        if row <= 0:
+            empty = np.full(len(self.codes), np.nan)
+            return empty, empty
+        if self._boards is None:
+            prefix = np.array([code[:3] for code in self.codes])
+            self._boards = (prefix == '688', np.isin(prefix, ('300', '301')))
+        kcb, cyb = self._boards
+        wide = kcb | cyb if self.dates[row] >= CYB_REFORM_DATE else kcb
+        ratio = np.where(wide, WIDE_LIMIT_RATIO, np.where(fields['is_st'][row], ST_LIMIT_RATIO, LIMIT_RATIO))
+        prev_close = fields['close'][row - 1]
+        return np.round(prev_close * (1 + ratio), 2), np.round(prev_close * (1 - ratio), 2)
+
+
+def _status_matrix(close, paused, is_st):
+    n_days = close.shape[0]
+    listed = ~np.isnan(close)
+    ever = listed.any(axis=0)
+    first = np.where(ever, listed.argmax(axis=0), n_days)
+    last = np.where(ever, n_days - 1 - listed[::-1].argmax(axis=0), -1)
+    rows = np.arange(n_days)[:, None]
+
+    status = np.where(listed, 0, STATUS_UNLISTED).astype(np.uint8)
+    status |= np.asarray(paused, dtype=np.uint8) * np.uint8(STATUS_PAUSED)
+    status |= np.asarray(is_st, dtype=np.uint8) * np.uint8(STATUS_ST)
+    # 最后一个上市日早于行情库最后一天的才是退市
+    delisting = (rows > last - DELISTING_DAYS) & (rows <= last) & (last < n_days - 1)
+    status[delisting] |= STATUS_DELISTING
+    new = (rows >= first) & (rows < first + NEW_LISTING_DAYS) & (first > 0)
+    status[new] |= STATUS_NEW
+    return status
+
+
+def _volume_window(volume, close, paused, lookback):
+    """
+    一块证券的 (最近一天成交量, 之前 lookback 天均值)：把每只证券可交易日的成交量首尾相接成一维数组，
+    任意窗口的和是两个累计和之差
+    """
+    tradable = ~np.asarray(paused, dtype=bool) & ~np.isnan(close)
+    # 按证券优先展开，同一只证券的可交易日连续排列；末尾加一个 NaN，没有可交易日的格子取到它
+    flat = np.append(np.asarray(volume, dtype=np.float64).T[tradable.T], np.nan)
+    counts = tradable.sum(axis=0)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    # 每格之前（不含当天）的可交易日数，以及之前最近一个可交易日在一维数组里的位置
+    before = np.cumsum(tradable, axis=0) - tradable
+    index = np.maximum(starts + before - 1, 0)
+    last = np.where(before >= 1, flat[index], np.nan)
+
+    # 前面补 lookback 个 0：csum[i + lookback] 是位置 i 之前所有成交量的和，窗口和 = csum[i + lookback] - csum[i]
+    missing = np.isnan(flat)
+    pad = np.zeros(lookback)
+    csum = np.concatenate((pad, [0.0], np.cumsum(np.where(missing, 0.0, flat))))
+    nans = np.concatenate((pad, [0], np.cumsum(missing)))
+    valid = (before > lookback) & (nans[index + lookback] == nans[index])
+    means = np.where(valid, (csum[index + lookback] - csum[index]) / lookback, np.nan)
+    return last, means
+
+
+def _row_digests(fields, n_days):
+    digests = np.empty(n_days, dtype=np.uint64)
+    for row in range(n_days):
+        h = hashlib.blake2b(digest_size=8)
+        for name in sorted(fields):
+            h.update(name.encode())
+            h.update(np.ascontiguousarray(fields[name][row]))
+        digests[row] = int.from_bytes(h.digest(), 'little')
+    return digests
+
+
+def _read_meta(root):
+    with open(os.path.join(root, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_store(root, dates, codes, fields):
+    """
+    把行情写成本地列式行情库
+    fields: {字段名: (交易日 × 证券) 矩阵}，也可以是以交易日为行、证券为列的 DataFrame
+    root 下已有行情库时沿用其中的列号，codes 里的新代码追加在后面，已不存在的代码整列为 NaN
+    """
+    missing = [name for name in REQUIRED_FIELDS if name not in fields]
+    if missing:
+        raise ValueError(f"缺少必要字段: {missing}")
+
+    os.makedirs(root, exist_ok=True)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    codes = [str(c) for c in codes]
+
+    # 稳定的列号：已有代码保持原列，新代码追加
+    layout = codes
+    if os.path.exists(os.path.join(root, 'meta.json')):
+        known = _read_meta(root)['codes']
+        known_set = set(known)
+        layout = known + [c for c in codes if c not in known_set]
+    position = {code: i for i, code in enumerate(layout)}
+    target = np.fromiter((position[c] for c in codes), dtype=np.intp, count=len(codes))
+
+    for name, values in fields.items():
+        arr = np.asarray(values)
+        if arr.shape != (len(dates), len(codes)):
+            raise ValueError(f"字段 {name} 的形状 {arr.shape} 与交易日/证券数量不一致")
+        if name in STATUS_FIELDS:
+            out = np.zeros((len(dates), len(layout)), dtype=bool)
+        else:
+            dtype = np.float32 if name in FLOAT32_FIELDS else np.float64
+            out = np.full((len(dates), len(layout)), np.nan, dtype=dtype)
+        out[:, target] = arr
+        np.save(os.path.join(root, f'{name}.npy'), out)
+    written = {name: np.load(os.path.join(root, f'{name}.npy'), mmap_mode='r') for name in fields}
+    np.save(os.path.join(root, 'digests.npy'), _row_digests(written, len(dates)))
+
+    meta = {
+        'dates': [str(d) for d in dates],
+        'codes': layout,
+        'fields': list(fields),
+    }
+    with open(os.path.join(root, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return DataStore.open(root)
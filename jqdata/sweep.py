@@ -0,0 +1,194 @@
+"""
+参数扫描：同一个策略脚本在一组 g.* 参数组合上各跑一次回测，多进程并行
+
+每个工作进程只加载一次策略脚本、打开一次行情库；行情库按内存映射打开，
+所有进程通过操作系统页缓存共用同一份行情数据，不会各自复制一份。
+每次回测输出一行汇总（参数 + 总收益、年化收益、最大回撤、最长回撤天数、夏普、换手率），
+指定 output 时每跑完一次就追加写入 CSV，中途中断也能保留已完成的结果。
+
+    python -m jqdata.sweep 251214-rel.py --data ./store --start 2020-01-01 --end 2023-12-31 \\
+        --param max_drawdown_threshold=0.05,0.1,0.15 --param stocknum=10,20 --output sweep.csv
+
+    # 随机扫描：a:b 表示在 [a, b] 内均匀抽样（两端都是整数时抽整数）
+    python -m jqdata.sweep 251214-rel.py --data ./store --start 2020-01-01 --end 2023-12-31 \\
+        --param relative_squeeze_ratio=0.5:0.9 --param min_hold_days=3:15 --random 200
+
+    # 从同一个预热快照分叉：每组参数都从快照的下一个交易日开始跑，预热期只跑一次
+    python -m jqdata.sweep 251214-rel.py --data ./store --start 2014-01-01 --end 2023-12-31 \\
+        --resume ./ckpt/2019-12-31.ckpt --param max_drawdown_threshold=0.05,0.1
+"""
+import argparse
+import ast
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from .api import setup_logging
+from .checkpoint import Checkpoint
+from .engine import Engine, load_strategy
+from .factor_cache import FactorCache
+from .store import DataStore
+
+
+# 汇总指标（与 BacktestResult.summary 一致）
+METRICS = ('total_return', 'annual_return', 'max_drawdown', 'drawdown_days', 'sharpe', 'turnover')
+
+
+def grid(space):
+    """网格扫描：space 为 {参数名: 取值列表}，返回所有组合"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+
+
+def random_samples(space, n, seed=None):
+    """
+    随机扫描：space 为 {参数名: 取值列表 或 (下限, 上限)}，返回 n 个组合
+    列表表示从中等概率抽取；元组表示在区间内均匀抽样，两端都是整数时抽整数
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, values in space.items():
+        if isinstance(values, tuple):
+            low, high = values
+            if isinstance(low, int) and isinstance(high, int):
+                columns[name] = rng.integers(low, high + 1, n).tolist()
+            else:
+                columns[name] = rng.uniform(low, high, n).tolist()
+        else:
+            values = list(values)
+            columns[name] = [values[i] for i in rng.integers(0, len(values), n)]
+    return [{name: columns[name][i] for name in space} for i in range(n)]
+
+
+# 工作进程里的策略模块、行情库、预热快照和因子缓存，每个进程只加载一次
+_worker = {}
+
+
+def _init_worker(strategy_path, data_root, log_level, checkpoint_path=None, factor_cache=None):
+    setup_logging(log_level)
+    _worker['strategy'] = load_strategy(strategy_path)
+    _worker['store'] = DataStore.open(data_root)
+    _worker['checkpoint'] = Checkpoint.load(checkpoint_path) if checkpoint_path else None
+    # 多个进程共用同一个缓存目录，只读，缺少的日期各自当场计算
+    _worker['factor_cache'] = FactorCache(factor_cache, _worker['store'], readonly=True) if factor_cache else None
+
+
+def _backtest(params, start, end, cash):
+    """在工作进程里跑一次回测，返回 BacktestResult"""
+    engine = Engine(_worker['store'], start, end, cash)
+    engine.factor_cache = _worker['factor_cache']
+    return engine.run(_worker['strategy'], params, _worker['checkpoint'])
+
+
+def _run_one(run_id, params, start, end, cash):
+    summary = _backtest(params, start, end, cash).summary()
+    return dict({'run': run_id}, **params, **summary)
+
+
+def run_sweep(strategy_path, data_root, start, end, combos, cash=1000000, processes=None,
+              output=None, log_level='warning', checkpoint=None, factor_cache=None):
+    """
+    对 combos（参数组合列表）中的每一组参数各跑一次回测
+    processes: 进程数，默认为 CPU 核数，为 1 时在当前进程内依次运行
+    output: CSV 路径，每跑完一次追加一行
+    checkpoint: 预热快照路径，每组参数都从快照的下一个交易日开始跑
+    factor_cache: 因子缓存目录（只读，先用 python -m jqdata.factor_cache 补齐）
+    返回按 run 排序的汇总 DataFrame
+    """
+    names = list(dict.fromkeys(name for params in combos for name in params))
+    columns = ['run'] + names + list(METRICS)
+    rows = []
+    writer = None
+    f = None
+    if output:
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = open(output, 'w', newline='', encoding='utf-8')
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+
+    def collect(row):
+        rows.append(row)
+        if writer is not None:
+            writer.writerow(row)
+            f.flush()
+
+    try:
+        if processes == 1:
+            _init_worker(strategy_path, data_root, log_level, checkpoint, factor_cache)
+            for i, params in enumerate(combos):
+                collect(_run_one(i, params, start, end, cash))
+        else:
+            with ProcessPoolExecutor(processes, initializer=_init_worker,
+                                     initargs=(strategy_path, data_root, log_level, checkpoint, factor_cache)) as pool:
+                futures = [pool.submit(_run_one, i, params, start, end, cash)
+                           for i, params in enumerate(combos)]
+                for future in as_completed(futures):
+                    collect(future.result())
+    finally:
+        if f is not None:
+            f.close()
+
+    return pd.DataFrame(rows, columns=columns).sort_values('run').reset_index(drop=True)
+
+
+def _parse_param(text, allow_range):
+    """name=v1,v2,...、name=[v1, v2, ...] 或 name=a:b（随机扫描的区间）"""
+    name, sep, values = text.partition('=')
+    if not sep or not name or not values:
+        raise argparse.ArgumentTypeError(f"参数格式应为 name=v1,v2 或 name=a:b: {text}")
+    if values.lstrip().startswith('['):
+        # 取值本身含逗号或冒号（如字典）时，整体写成 Python 列表
+        parsed = _literal(values)
+        if not isinstance(parsed, list):
+            raise argparse.ArgumentTypeError(f"参数取值列表格式不对: {text}")
+        return name, parsed
+    if ':' in values:
+        if not allow_range:
+            raise argparse.ArgumentTypeError(f"区间 {text} 只能用于 --random 随机扫描")
+        low, high = values.split(':', 1)
+        return name, (_literal(low), _literal(high))
+    return name, [_literal(v) for v in values.split(',')]
+
+
+def _literal(text):
+    try:
+        return ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError):
+        return text.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jqdata.sweep', description='多进程参数扫描')
+    parser.add_argument('strategy', help='策略脚本路径')
+    parser.add_argument('--data', required=True, help='本地行情库目录')
+    parser.add_argument('--start', required=True, help='开始日期 YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYY-MM-DD')
+    parser.add_argument('--cash', type=float, default=1000000, help='初始资金')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                        help="要扫描的 g.* 参数，可以重复，如 --param stocknum=10,20；"
+                             "取值含逗号时写成列表，如 --param \"factor_weights=[{'cap': -1}, None]\"")
+    parser.add_argument('--random', type=int, metavar='N', help='随机抽取 N 组参数（默认网格扫描）')
+    parser.add_argument('--seed', type=int, help='随机扫描的随机种子')
+    parser.add_argument('--processes', type=int, help='进程数，默认为 CPU 核数')
+    parser.add_argument('--log-level', default='warning', choices=['debug', 'info', 'warning', 'error'])
+    parser.add_argument('--output', help='汇总 CSV 路径')
+    parser.add_argument('--resume', metavar='FILE', help='从这个预热快照的下一个交易日开始跑每组参数')
+    parser.add_argument('--factor-cache', metavar='DIR', help='多因子选股从该目录的因子缓存读取（只读）')
+    args = parser.parse_args(argv)
+
+    space = dict(_parse_param(p, args.random is not None) for p in args.param)
+    combos = random_samples(space, args.random, args.seed) if args.random is not None else grid(space)
+    result = run_sweep(args.strategy, args.data, args.start, args.end, combos, args.cash,
+                       args.processes, args.output, args.log_level, args.resume, args.factor_cache)
+    with pd.option_context('display.max_rows', None, 'display.width', None):
+        print(result.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+滚动前推（walk-forward）检验：在样本内调参、在紧接着的样本外检验，避免按结果调参过拟合
+
+把回测区间按交易日切成滚动的 (样本内, 样本外) 区间：
+    |---- 样本内 train 天 ----|-- 样本外 test 天 --|
+                 |---- 样本内 ----|-- 样本外 --|          每次向后滚动 test 天
+每一折在样本内对所有参数组合各跑一次回测，按目标指标选出最好的一组，再用这组参数跑样本外区间。
+所有折的回测任务放进同一个进程池并行执行；工作进程只加载一次策略脚本和行情库，
+策略脚本里的模块级缓存（如按日期的选股缓存）在同一个进程的各折之间复用。
+最后把各折的样本外净值首尾相接，得到只由样本外结果组成的净值曲线。
+
+    python -m jqdata.walkforward 251214-rel.py --data ./store --start 2014-01-01 --end 2023-12-31 \\
+        --train 504 --test 126 --param max_drawdown_threshold=0.05,0.1,0.15 \\
+        --param relative_squeeze_ratio=0.6,0.7,0.8 --objective sharpe --output ./walkforward
+"""
+import argparse
+import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .engine import BacktestResult
+from .store import DataStore
+from .sweep import METRICS, _backtest, _init_worker, _parse_param, grid, random_samples
+
+
+# 越小越好的指标，其余越大越好
+MINIMIZE = ('max_drawdown', 'drawdown_days')
+
+
+def make_folds(dates, start, end, train, test):
+    """
+    按交易日切分滚动区间，返回 [(样本内开始, 样本内结束, 样本外开始, 样本外结束)]
+    train/test: 样本内/样本外的交易日数，最后一折的样本外不足 test 天时截到 end
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    dates = dates[(dates >= np.datetime64(start, 'D')) & (dates <= np.datetime64(end, 'D'))]
+    folds = []
+    i = 0
+    while i + train < len(dates):
+        oos_end = min(i + train + test, len(dates)) - 1
+        folds.append(tuple(d.astype(datetime.date) for d in
+                           (dates[i], dates[i + train - 1], dates[i + train], dates[oos_end])))
+        i += test
+    return folds
+
+
+def _best(rows, objective):
+    """rows: [(参数, summary)]，按目标指标选最好的一组，并列时取靠前的"""
+    sign = -1 if objective in MINIMIZE else 1
+    scores = np.array([sign * summary[objective] for _, summary in rows])
+    return rows[int(np.argmax(np.nan_to_num(scores, nan=-np.inf)))]
+
+
+def _stitch(results, starting_cash):
+    """把各折样本外的回测结果首尾相接成一条净值曲线，后一折按前一折的期末净值缩放"""
+    dates, equity, turnover, trades = [], [], [], []
+    capital = starting_cash
+    for result in results:
+        scale = capital / result.starting_cash
+        dates.append(result.dates)
+        equity.append(result.equity * scale)
+        turnover.append(result.turnover * scale)
+        trades.extend(result.trades)
+        capital = equity[-1][-1]
+    return BacktestResult(np.concatenate(dates), np.concatenate(equity), np.concatenate(turnover),
+                          trades, starting_cash)
+
+
+def walk_forward(strategy_path, data_root, start, end, combos, train=504, test=126, objective='sharpe',
+                 cash=1000000, processes=None, log_level='warning'):
+    """
+    返回 (每折一行的 DataFrame, 拼接后的样本外 BacktestResult)
+    每折一行：区间、选中的参数、样本内目标指标、样本外各项指标
+    """
+    if objective not in METRICS:
+        raise ValueError(f"不支持的目标指标: {objective}，可选 {METRICS}")
+    folds = make_folds(DataStore.open(data_root).dates, start, end, train, test)
+    if not folds:
+        raise ValueError(f"{start} ~ {end} 内的交易日不足 {train + 1} 天，无法切分样本内/样本外")
+    combos = list(combos) or [{}]
+
+    with ProcessPoolExecutor(processes, initializer=_init_worker,
+                             initargs=(strategy_path, data_root, log_level)) as pool:
+        # 所有折的样本内回测一起提交，各折并行
+        in_sample = [[pool.submit(_backtest, params, is_start, is_end, cash) for params in combos]
+                     for is_start, is_end, _, _ in folds]
+        chosen = []
+        for futures in in_sample:
+            chosen.append(_best([(params, f.result().summary()) for params, f in zip(combos, futures)],
+                                objective))
+        out_of_sample = [pool.submit(_backtest, params, oos_start, oos_end, cash)
+                         for (params, _), (_, _, oos_start, oos_end) in zip(chosen, folds)]
+        oos_results = [f.result() for f in out_of_sample]
+
+    rows = []
+    for i, (fold, (params, is_summary), result) in enumerate(zip(folds, chosen, oos_results)):
+        row = dict(zip(('is_start', 'is_end', 'oos_start', 'oos_end'), fold), fold=i, **params)
+        row[f'is_{objective}'] = is_summary[objective]
+        row.update({f'oos_{name}': value for name, value in result.summary().items()})
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('fold'), _stitch(oos_results, cash)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m jqdata.walkforward', description='滚动前推调参检验')
+    parser.add_argument('strategy', help='策略脚本路径')
+    parser.add_argument('--data', required=True, help='本地行情库目录')
+    parser.add_argument('--start', required=True, help='开始日期 YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='结束日期 YYYY-MM-DD')
+    parser.add_argument('--cash', type=float, default=1000000, help='初始资金')
+    parser.add_argument('--train', type=int, default=504, help='样本内交易日数')
+    parser.add_argument('--test', type=int, default=126, help='样本外交易日数（也是滚动步长）')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                        help='要调的 g.* 参数，可以重复，如 --param stocknum=10,20')
+    parser.add_argument('--random', type=int, metavar='N', help='随机抽取 N 组参数（默认网格扫描）')
+    parser.add_argument('--seed', type=int, help='随机抽样的随机种子')
+    parser.add_argument('--objective', default='sharpe', choices=METRICS, help='样本内选参数的目标指标')
+    parser.add_argument('--processes', type=int, help='进程数，默认为 CPU 核数')
+    parser.add_argument('--log-level', default='warning', choices=['debug', 'info', 'warning', 'error'])
+    parser.add_argument('--output', help='保存每折结果和样本外净值的目录')
+    args = parser.parse_args(argv)
+
+    space = dict(_parse_param(p, args.random is not None) for p in args.param)
+    combos = random_samples(space, args.random, args.seed) if args.random is not None else grid(space)
+    folds, oos = walk_forward(args.strategy, args.data, args.start, args.end, combos, args.train, args.test,
+                              args.objective, args.cash, args.processes, args.log_level)
+    with pd.option_context('display.max_rows', None, 'display.width', None):
+        print(folds.to_string())
+    print('样本外拼接:')
+    for name, value in oos.summary().items():
+        print(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
+    if args.output:
+        oos.save(args.output)
+        folds.to_csv(os.path.join(args.output, 'folds.csv'))
+
+
+if __name__ == '__main__':
+    main()
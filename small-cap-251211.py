@@ -113,15 +113,16 @@ def filter_paused_stock(stock_list):
                 result.append(stock)
 #                log.info(f"股票 {stock} 通过检查: 不停牌且非ST")
             else:
+                # 逐只输出的日志用 %s 传参，日志级别不够时不拼接字符串
                 if is_paused:
-                    log.info(f"股票 {stock} 被过滤: 停牌")
+                    log.info("股票 %s 被过滤: 停牌", stock)
                 if is_st:
-                    log.info(f"股票 {stock} 被过滤: ST或*ST股票")
+                    log.info("股票 %s 被过滤: ST或*ST股票", stock)
         except Exception as e:
             # 如果获取股票数据失败，记录日志并过滤该股票
-            log.warn(f"获取股票 {stock} 的当前数据失败: {e}，过滤该股票")
+            log.warn("获取股票 %s 的当前数据失败: %s，过滤该股票", stock, e)
     
-    log.info(f"过滤后剩余股票数量: {len(result)}")
+    log.info("过滤后剩余股票数量: %d", len(result))
     return result
     
     
@@ -264,8 +265,8 @@ def buy_stocks(context):
 ## 交易函数
 def trade(context):
     """主交易逻辑"""
-    # 记录状态
-    log.info(f"状态: {g.stop_loss_status}, 持仓: {len(context.portfolio.positions)}")
+    # 记录状态(每根bar都会输出，用 %s 传参，日志级别不够时不拼接字符串)
+    log.info("状态: %s, 持仓: %d", g.stop_loss_status, len(context.portfolio.positions))
     
     # 状态1: 清仓中
     if g.stop_loss_status == "clearing":
@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+from jqdata.api import setup_logging
+from jqdata.bench import make_synthetic_store
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def quiet_logging():
+    setup_logging('error')
+
+
+@pytest.fixture(scope='session')
+def store(tmp_path_factory):
+    """300 只证券、200 个交易日的合成行情库（有停牌、陆续上市的新股和科创板）"""
+    return make_synthetic_store(str(tmp_path_factory.mktemp('store')), n_codes=300, n_days=200, seed=1)
@@ -0,0 +1,53 @@
+"""逐日更新的 PerformanceTracker 与对整条净值一次算出的 performance 结果相同"""
+import numpy as np
+import pytest
+
+from jqdata.analytics import PerformanceTracker, performance
+
+
+STARTING_CASH = 1e6
+
+
+def _curves():
+    rng = np.random.default_rng(3)
+    for n in (1, 2, 30, 500):
+        yield STARTING_CASH * np.cumprod(1 + rng.normal(0.0005, 0.02, n)), rng.uniform(0, 2e5, n)
+    # 一路上涨（没有回撤）、一直低于初始资金、结尾仍在回撤中
+    yield STARTING_CASH * np.cumprod(1 + rng.uniform(0.001, 0.02, 50)), np.zeros(50)
+    yield STARTING_CASH * np.cumprod(1 - rng.uniform(0.001, 0.02, 50)), np.full(50, 1e4)
+    yield STARTING_CASH * np.concatenate((np.linspace(1, 1.5, 20), np.linspace(1.4, 1.2, 20))), np.zeros(40)
+
+
+def _drawdown(equity):
+    """逐日循环算最大回撤和最长回撤天数"""
+    peak, days, max_days, max_dd = STARTING_CASH, 0, 0, 0.0
+    for value in equity:
+        if value >= peak:
+            peak, days = value, 0
+        else:
+            days += 1
+            max_days = max(max_days, days)
+            max_dd = max(max_dd, 1 - value / peak)
+    return max_dd, max_days
+
+
+@pytest.mark.parametrize('equity,turnover', list(_curves()))
+def test_tracker_matches_performance(equity, turnover):
+    tracker = PerformanceTracker(STARTING_CASH)
+    for value, traded in zip(equity, turnover):
+        tracker.update(value, traded)
+    expected = performance(equity, turnover, STARTING_CASH)
+    actual = tracker.summary()
+    assert actual.keys() == expected.keys()
+    assert actual['drawdown_days'] == expected['drawdown_days']
+    for key in expected:
+        assert actual[key] == pytest.approx(expected[key], rel=1e-9, abs=1e-12), key
+    max_dd, max_days = _drawdown(equity)
+    assert expected['max_drawdown'] == pytest.approx(max_dd)
+    assert expected['drawdown_days'] == max_days
+    assert tracker.drawdown == pytest.approx(1 - equity[-1] / max(STARTING_CASH, equity.max()))
+
+
+def test_empty_tracker():
+    with pytest.raises(ValueError):
+        PerformanceTracker(STARTING_CASH).summary()
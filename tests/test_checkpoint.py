@@ -0,0 +1,48 @@
+"""回测快照：从快照恢复后的结果与一次跑完相同"""
+import os
+
+import numpy as np
+import pytest
+
+from jqdata.checkpoint import Checkpoint, Checkpointer
+from jqdata.engine import Engine, load_strategy
+
+from conftest import REPO
+
+
+def test_resume_from_checkpoint_matches_full_run(store, tmp_path):
+    strategy = load_strategy(os.path.join(REPO, '251214-rel.py'))
+    start, end = store.dates[60], store.dates[-1]
+    engine = Engine(store, start, end)
+    engine.checkpointer = Checkpointer(str(tmp_path), 50)
+    full = engine.run(strategy)
+    assert len(engine.checkpointer.paths) == 2 and len(full.trades)
+
+    for path in engine.checkpointer.paths:
+        resumed = Engine(store, start, end).run(strategy, checkpoint=Checkpoint.load(path))
+        np.testing.assert_array_equal(resumed.equity, full.equity)
+        np.testing.assert_array_equal(resumed.turnover, full.turnover)
+        assert resumed.trades_frame().equals(full.trades_frame())
+        assert resumed.summary() == full.summary()
+
+
+def test_checkpoint_rejects_other_start_date(store, tmp_path):
+    strategy = load_strategy(os.path.join(REPO, '251214-rel.py'))
+    engine = Engine(store, store.dates[60], store.dates[120])
+    engine.checkpointer = Checkpointer(str(tmp_path), 30)
+    engine.run(strategy)
+    checkpoint = Checkpoint.load(engine.checkpointer.paths[0])
+    with pytest.raises(ValueError):
+        Engine(store, store.dates[61], store.dates[120]).run(strategy, checkpoint=checkpoint)
+
+
+def test_load_g_returns_independent_copies(tmp_path):
+    checkpoint = Checkpoint('s', '2020-01-02', '2020-03-02', {'positions': ['000001.XSHE']}, 1e6, 1e6, [],
+                            np.ones(3), np.zeros(3), [])
+    path = str(tmp_path / 'a' / 'x.ckpt')
+    checkpoint.save(path)
+    loaded = Checkpoint.load(path)
+    first = loaded.load_g()
+    first['positions'].append('000002.XSHE')
+    assert loaded.load_g() == {'positions': ['000001.XSHE']}
+    assert not os.path.exists(path + '.tmp')
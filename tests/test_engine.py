@@ -0,0 +1,73 @@
+"""引擎：历史行号的补齐规则、整篮下单的数量取整"""
+import datetime
+
+import numpy as np
+import pytest
+
+from jqdata.engine import Engine
+
+
+def _naive_rows(store, col, count, end, skip_paused):
+    if skip_paused:
+        close = store.field('close')[:end, col]
+        rows = np.flatnonzero(~store.field('paused')[:end, col] & ~np.isnan(close))[-count:]
+    else:
+        rows = np.arange(max(0, end - count), end)
+    return np.concatenate((np.full(count - len(rows), -1), rows))
+
+
+@pytest.mark.parametrize('skip_paused', [True, False])
+@pytest.mark.parametrize('count', [1, 5, 40])
+def test_history_rows_pad_in_front(store, skip_paused, count):
+    engine = Engine(store, store.dates[0], store.dates[-1])
+    cols = np.arange(len(store.codes))
+    for end in (0, 1, 3, 30, 120, len(store.dates) - 1):
+        rows = engine._history_rows(cols, count, end, skip_paused)
+        assert rows.shape == (len(cols), count)
+        for col in cols:
+            assert rows[col].tolist() == _naive_rows(store, col, count, end, skip_paused).tolist(), (end, col)
+
+
+class _NoopStrategy(object):
+    __name__ = 'noop'
+
+    @staticmethod
+    def initialize(context):
+        pass
+
+
+def _basket_engine(store, row):
+    """停在 row 这一天开盘时、资金充足的引擎，和当天正常交易的科创板、非科创板证券各 3 只"""
+    engine = Engine(store, store.dates[row], store.dates[row], starting_cash=1e10)
+    engine.start(_NoopStrategy)
+    engine._enter(row, datetime.time(9, 30))
+    engine.options['order_volume_ratio'] = 1e6
+    ok = np.asarray(store.codes)[store.status[row] == 0]
+    kcb = [c for c in ok if c.startswith('688')][:3]
+    main = [c for c in ok if not c.startswith('688')][:3]
+    return engine, kcb, main
+
+
+def _bought(engine):
+    return {security: amount for _, security, amount, _, _ in engine.trades}
+
+
+def test_order_target_basket_rounds_to_lots(store):
+    engine, kcb, main = _basket_engine(store, 150)
+    codes = kcb + main
+    prices = engine.current_prices(codes)
+    values = np.array([2345.0, 150.5, 123456.0, 2345.0, 150.5, 123456.0]) * prices
+    engine.order_target_basket(codes, values)
+    # 与策略在平台上逐只买入的 int(金额 / 开盘价 / 100) * 100 相同，科创板不足 200 股的不买
+    expected = {code: int(value / price / 100) * 100 for code, value, price in zip(codes, values, prices)}
+    expected = {code: amount for code, amount in expected.items() if amount >= (200 if code in kcb else 100)}
+    assert _bought(engine) == expected
+
+
+def test_order_target_basket_lot_one_rounds_in_matching(store):
+    engine, kcb, main = _basket_engine(store, 150)
+    codes = kcb[:1] + main[:1]
+    prices = engine.current_prices(codes)
+    engine.order_target_basket(codes, np.array([250.5, 250.5]) * prices, lot=1)
+    # 科创板 1 股递增，其余 100 股整数倍
+    assert _bought(engine) == {kcb[0]: 250, main[0]: 200}
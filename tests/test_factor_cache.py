@@ -0,0 +1,106 @@
+"""因子缓存：按行追加、行情有变化时从变化的那天起截掉重算、定义版本变化时整个重建、多个写入方加锁"""
+import fcntl
+import threading
+
+import numpy as np
+
+from jqdata import factor_cache, factors
+from jqdata.bench import make_synthetic_store
+from jqdata.factor_cache import FactorCache
+from jqdata.store import write_store
+
+
+def _expected(store, factor, window, end):
+    return factors.compute_factors(store, end, [factor], window)[factor]
+
+
+def test_get_appends_only_missing_rows(store, tmp_path):
+    cache = FactorCache(str(tmp_path), store)
+    np.testing.assert_array_equal(cache.get('momentum', 20, 50), _expected(store, 'momentum', 20, 50))
+    column = cache._column('momentum', 20)
+    assert column.valid == column.rows == 51
+    # 更早的日期直接读，不再追加
+    np.testing.assert_array_equal(cache.get('momentum', 20, 30), _expected(store, 'momentum', 20, 30))
+    assert column.rows == 51
+    assert cache.update(['momentum'], 20) == len(store.dates) - 51
+    assert column.rows == len(store.dates)
+
+    # 重新打开时沿用磁盘上的缓存
+    reopened = FactorCache(str(tmp_path), store)
+    assert reopened.update(['momentum'], 20) == 0
+    np.testing.assert_array_equal(reopened.get('momentum', 20, 120), _expected(store, 'momentum', 20, 120))
+
+
+def test_changed_day_truncates_from_that_row(tmp_path):
+    root = str(tmp_path / 'store')
+    store = make_synthetic_store(root, n_codes=50, n_days=80, seed=2)
+    cache_dir = str(tmp_path / 'cache')
+    FactorCache(cache_dir, store).update(['cap', 'volatility'], 10)
+
+    # 改写第 60 天的收盘价后重写行情库
+    fields = {name: np.array(store.field(name)) for name in store.fields}
+    fields['close'][60] *= 1.01
+    store = write_store(root, store.dates, store.codes, fields)
+    cache = FactorCache(cache_dir, store)
+    column = cache._column('volatility', 10)
+    assert column.valid == column.rows == 60
+    assert cache.update(['cap', 'volatility'], 10) == 2 * (80 - 60)
+    for end in (59, 61, 79):
+        np.testing.assert_array_equal(cache.get('volatility', 10, end), _expected(store, 'volatility', 10, end))
+
+
+def test_definition_change_rebuilds(store, tmp_path, monkeypatch):
+    FactorCache(str(tmp_path), store).update(['cap'], 20, end=40)
+    monkeypatch.setattr(factor_cache, 'DEFINITION', 'changed')
+    cache = FactorCache(str(tmp_path), store)
+    assert cache._column('cap', 20).rows == 0
+    np.testing.assert_array_equal(cache.get('cap', 20, 10), _expected(store, 'cap', 20, 10))
+
+
+def test_readonly_computes_without_writing(store, tmp_path):
+    FactorCache(str(tmp_path), store).update(['liquidity'], 20, end=30)
+    readonly = FactorCache(str(tmp_path), store, readonly=True)
+    np.testing.assert_array_equal(readonly.get('liquidity', 20, 100), _expected(store, 'liquidity', 20, 100))
+    assert readonly._column('liquidity', 20).rows == 30
+
+
+def test_get_backfills_contiguously_up_to_end(store, tmp_path):
+    cache = FactorCache(str(tmp_path), store)
+    cache.get('cap', 20, 40)
+    column = cache._column('cap', 20)
+    # 只补到查询的那一天，之后每天追加一行
+    assert column.valid == column.rows == 41
+    cache.get('cap', 20, 41)
+    assert column.rows == 42
+    assert np.isnan(column.read(0)).all()
+    for end in (1, 20, 41):
+        np.testing.assert_array_equal(column.read(end), _expected(store, 'cap', 20, end))
+
+
+def test_writers_do_not_duplicate_rows(store, tmp_path):
+    first = FactorCache(str(tmp_path), store)
+    second = FactorCache(str(tmp_path), store)
+    first.get('turnover', 20, 10)
+    # second 打开时只看到 11 行，first 之后又补到了 101 行
+    second._column('turnover', 20)
+    first.get('turnover', 20, 100)
+    np.testing.assert_array_equal(second.get('turnover', 20, 60), _expected(store, 'turnover', 20, 60))
+    assert second.update(['turnover'], 20, end=120) == 120 - 101
+    column = second._column('turnover', 20)
+    assert column.valid == column.rows == 120
+    for end in (10, 100, 119):
+        np.testing.assert_array_equal(column.read(end), _expected(store, 'turnover', 20, end))
+
+
+def test_extend_waits_for_lock(store, tmp_path):
+    cache = FactorCache(str(tmp_path), store)
+    column = cache._column('liquidity', 20)
+    with open(column.lock_path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        worker = threading.Thread(target=cache.update, args=(['liquidity'], 20, 30))
+        worker.start()
+        worker.join(0.2)
+        assert worker.is_alive() and column.rows == 0
+        fcntl.flock(f, fcntl.LOCK_UN)
+    worker.join()
+    assert column.rows == 30
@@ -0,0 +1,94 @@
+"""截面因子：逐只证券用 pandas 算出的因子值、标准化和合成分数与向量化结果相同"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from jqdata.factors import (FACTORS, ZSCORE_CLIP, composite_score, compute_factors, rank_codes, rank_normalize,
+                            zscore_normalize)
+
+
+WINDOW = 20
+
+
+def _reference(store, end, window):
+    """逐只证券的 pandas 实现"""
+    close = pd.DataFrame(store.field('close')[:end])
+    money = pd.DataFrame(store.field('money')[:end])
+    cap = store.field('market_cap')[end - 1].astype(np.float64)
+    momentum, volatility, avg_money = [], [], []
+    for col in close.columns:
+        c = close[col]
+        momentum.append(c.iloc[-1] / c.iloc[-1 - window] - 1 if end > window else np.nan)
+        returns = np.log(c.iloc[-1 - window:]).diff().iloc[1:]
+        returns = returns[np.isfinite(returns)]
+        volatility.append(returns.std(ddof=1) if len(returns) * 2 >= window else np.nan)
+        m = money[col].iloc[-window:]
+        m = m[np.isfinite(m) & (m > 0)]
+        avg_money.append(m.mean() if len(m) * 2 >= window else np.nan)
+    avg_money = np.array(avg_money)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'cap': cap,
+            'momentum': np.array(momentum),
+            'volatility': np.array(volatility),
+            'turnover': avg_money / (cap * 1e8),
+            'liquidity': np.log(avg_money),
+        }
+
+
+@pytest.mark.parametrize('end', [1, 15, 21, 120, 199])
+def test_compute_factors_matches_reference(store, end):
+    actual = compute_factors(store, end, FACTORS, WINDOW)
+    expected = _reference(store, end, WINDOW)
+    for name in FACTORS:
+        np.testing.assert_allclose(actual[name], expected[name], rtol=1e-9, equal_nan=True, err_msg=name)
+
+
+def test_compute_factors_rejects_bad_input(store):
+    with pytest.raises(ValueError):
+        compute_factors(store, 50, ['beta'])
+    with pytest.raises(ValueError):
+        compute_factors(store, 0, ['cap'])
+
+
+def test_rank_normalize():
+    values = np.array([3.0, 1.0, 2.0, 1.0, 5.0])
+    # 相同的值按出现的先后排
+    np.testing.assert_allclose(rank_normalize(values), [3, 0, 2, 1, 4] / np.float64(4))
+    assert rank_normalize(np.array([7.0])).tolist() == [0.0]
+
+
+def test_zscore_normalize_clips():
+    values = np.concatenate((np.zeros(99), [1000.0]))
+    z = zscore_normalize(values)
+    assert z.max() == ZSCORE_CLIP
+    np.testing.assert_allclose(z[:99], -values.mean() / values.std())
+    assert zscore_normalize(np.full(5, 2.0)).tolist() == [0.0] * 5
+
+
+@pytest.mark.parametrize('method', ['rank', 'zscore'])
+def test_composite_score(method):
+    rng = np.random.default_rng(5)
+    a, b, unused = rng.normal(size=(3, 50))
+    a[[3, 7]] = np.nan
+    unused[[10]] = np.nan
+    weights = {'a': -1.0, 'b': 0.5, 'unused': 0.0}
+    score = composite_score({'a': a, 'b': b, 'unused': unused}, weights, method)
+    # 权重为 0 的因子也要有值才参与打分
+    missing = [3, 7, 10]
+    assert np.isnan(score[missing]).all()
+    valid = np.setdiff1d(np.arange(50), missing)
+    normalize = rank_normalize if method == 'rank' else zscore_normalize
+    np.testing.assert_allclose(score[valid], -normalize(a[valid]) + 0.5 * normalize(b[valid]))
+    with pytest.raises(ValueError):
+        composite_score({'a': a}, {'a': 1.0}, 'minmax')
+
+
+@pytest.mark.parametrize('count', [None, 1, 10, 10000])
+def test_rank_codes_order(store, count):
+    weights = {'cap': -1.0, 'momentum': -0.3, 'volatility': -0.3}
+    factors = compute_factors(store, 150, list(weights), WINDOW)
+    score = composite_score(factors, weights)
+    order = [i for i in np.argsort(-score, kind='stable') if not np.isnan(score[i])]
+    expected = [store.codes[i] for i in order][:count]
+    assert rank_codes(store, 150, weights, window=WINDOW, count=count) == expected
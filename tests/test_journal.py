@@ -0,0 +1,60 @@
+"""交易流水：写出后读回的记录与写入的相同（Parquet 和退回的 CSV）"""
+import datetime
+
+import numpy as np
+import pytest
+
+from jqdata import journal
+from jqdata.journal import Journal, read_journal
+
+
+EVENTS = [
+    ('buy', {'orders': 10}),
+    ('sell_signal', {'hold_days': 8.0, 'portfolio_avg_return': 0.16, 'volume_ratio': 0.7, 'reason': '成交量萎缩'}),
+    ('stop_loss', {'drawdown': 0.11, 'orders': 9}),
+    ('cleared', {}),
+    ('buy', {'orders': 10, 'bandwidth_ratio': 0.55}),
+]
+
+
+def _write(path, buffer_size=2):
+    start = datetime.datetime(2020, 1, 2, 9, 30)
+    with Journal(path, buffer_size=buffer_size) as j:
+        for i, (event, fields) in enumerate(EVENTS):
+            j.record(start + datetime.timedelta(days=i), event, **fields)
+    return j
+
+
+def _check(frame):
+    assert list(frame.columns) == list(journal.COLUMNS)
+    assert frame['event'].tolist() == [event for event, _ in EVENTS]
+    assert frame['time'].tolist() == [datetime.datetime(2020, 1, 2 + i, 9, 30) for i in range(len(EVENTS))]
+    for (_, fields), (_, row) in zip(EVENTS, frame.iterrows()):
+        for name, empty in journal.COLUMNS.items():
+            if name in ('time', 'event'):
+                continue
+            expected = fields.get(name, empty)
+            if isinstance(expected, float) and np.isnan(expected):
+                assert np.isnan(row[name]), name
+            else:
+                assert row[name] == expected, name
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    j = _write(str(tmp_path / 'journal.parquet'))
+    assert j.rows == len(EVENTS)
+    _check(read_journal(j.path))
+
+
+def test_csv_fallback_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, 'pq', None)
+    j = _write(str(tmp_path / 'journal.parquet'))
+    assert j.path.endswith('.csv')
+    _check(read_journal(j.path))
+
+
+def test_unknown_field_rejected(tmp_path):
+    with Journal(str(tmp_path / 'journal.parquet')) as j:
+        with pytest.raises(ValueError):
+            j.record(datetime.datetime(2020, 1, 2), 'buy', price=1.0)
@@ -0,0 +1,57 @@
+"""异步日志：环形缓冲满时丢弃最旧的记录，stop_logging 写完缓冲里剩下的日志"""
+import io
+import logging
+import threading
+
+from jqdata import api
+from jqdata.api import _RingQueue, setup_logging, stop_logging
+
+
+class _BlockingStream(io.StringIO):
+    """第一次写入时卡住，直到 release 被置位，用来让后台线程来不及取走缓冲里的记录"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, s):
+        self.release.wait()
+        return super().write(s)
+
+
+def test_ring_queue_drops_oldest():
+    q = _RingQueue(3)
+    for i in range(5):
+        q.put_nowait(i)
+    assert q.dropped == 2
+    assert [q.get_nowait() for _ in range(q.qsize())] == [2, 3, 4]
+
+
+def test_stop_logging_flushes_buffer():
+    stream = io.StringIO()
+    setup_logging('info', stream=stream, buffer_size=1000)
+    logger = logging.getLogger('jqdata.test')
+    for i in range(200):
+        logger.info('记录 %d', i)
+    stop_logging()
+    lines = stream.getvalue().splitlines()
+    assert [line.rsplit(' ', 1)[1] for line in lines] == [str(i) for i in range(200)]
+    assert api._listener is None
+
+
+def test_stop_logging_reports_dropped():
+    stream = _BlockingStream()
+    setup_logging('info', stream=stream, buffer_size=2)
+    ring = api._listener.queue
+    logger = logging.getLogger('jqdata.test')
+    for i in range(10):
+        logger.info('记录 %d', i)
+    dropped = ring.dropped
+    assert dropped > 0
+    stream.release.set()
+    stop_logging()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 10 - dropped + 1
+    # 留下的是最新的记录
+    assert lines[-3].endswith('记录 8') and lines[-2].endswith('记录 9')
+    assert f'丢弃了 {dropped} 条日志' in lines[-1]
@@ -0,0 +1,150 @@
+"""撮合规则：取整、涨跌停和保护价、T+1、成交量额度、资金，以及逐笔撮合与整批撮合的结果一致"""
+import numpy as np
+import pytest
+
+from jqdata.matching import (OK, PAUSED, LIMIT_UP, LIMIT_DOWN, PROTECTED, ZERO_AMOUNT, VOLUME_CAP,
+                             match_order, match_orders)
+from jqdata.portfolio import OrderCost
+
+
+COST = OrderCost()
+
+
+def _order(amount, price=10.0, limit_price=None, paused=False, high_limit=11.0, low_limit=9.0,
+           volume_left=10 ** 9, closeable=0, kcb=False, cash=1e9):
+    """单笔委托分别用 match_order 和只有一笔的 match_orders 撮合，两者必须相同"""
+    result = match_order(amount, price, limit_price, paused, high_limit, low_limit,
+                         volume_left, closeable, kcb, cash, COST)
+    arrays = ([amount], [price], [np.nan if limit_price is None else limit_price], [paused],
+              [high_limit], [low_limit], [float(volume_left)], [closeable], [kcb])
+    filled, reasons = match_orders(*map(np.array, arrays), cash, COST)
+    assert (int(filled[0]), int(reasons[0])) == result
+    return result
+
+
+def _sequential(amounts, prices, limit_prices, paused, high_limit, low_limit, volume_left, closeable, kcb, cash,
+                keys):
+    """
+    逐笔 match_order：先卖后买，每笔成交后扣减这只证券的成交量额度、可卖数量和可用资金
+    （与引擎逐笔下单时 _volume_used 和持仓的记账相同）
+    """
+    n = len(amounts)
+    filled = np.zeros(n, dtype=np.int64)
+    reasons = np.zeros(n, dtype=np.int8)
+    volume = {key: volume_left[i] for i, key in enumerate(keys)}
+    sellable = {key: closeable[i] for i, key in enumerate(keys)}
+    for i in sorted(range(n), key=lambda i: amounts[i] > 0):
+        key = keys[i]
+        limit = None if np.isnan(limit_prices[i]) else limit_prices[i]
+        filled[i], reasons[i] = match_order(
+            int(amounts[i]), prices[i], limit, paused[i], high_limit[i], low_limit[i],
+            volume[key], sellable[key], kcb[i], cash, COST)
+        if filled[i] == 0:
+            continue
+        value = filled[i] * prices[i]
+        volume[key] -= filled[i]
+        if amounts[i] > 0:
+            cash -= value + COST.cost(value, True)
+        else:
+            sellable[key] -= filled[i]
+            cash += value - COST.cost(value, False)
+    return filled, reasons
+
+
+def _random_batch(rng):
+    n = int(rng.integers(1, 40))
+    # 约三成的批次里有同一证券的多笔委托
+    keys = rng.integers(0, max(n // 3, 1), n) if rng.random() < 0.3 else np.arange(n)
+    prices = np.round(rng.uniform(2, 200, n), 2)
+    prices[rng.random(n) < 0.03] = np.nan
+    amounts = rng.integers(1, 30000, n) * np.where(rng.random(n) < 0.3, -1, 1)
+    amounts[rng.random(n) < 0.5] //= 100
+    amounts[amounts == 0] = 1
+    high_limit = np.where(rng.random(n) < 0.1, prices, np.round(prices * 1.1, 2))
+    low_limit = np.where(rng.random(n) < 0.1, prices, np.round(prices * 0.9, 2))
+    limit_prices = np.where(rng.random(n) < 0.3, prices * rng.uniform(0.97, 1.03, n), np.nan)[keys]
+    closeable = np.where(rng.random(n) < 0.5, rng.integers(0, 200, n) * 100, rng.integers(0, 20000, n))
+    volume_left = np.select([rng.random(n) < 0.2, rng.random(n) < 0.5], [rng.integers(0, 400, n), rng.integers(0, 30000, n)],
+                            10 ** 9).astype(np.float64)
+    kcb = rng.random(n) < 0.3
+    paused = rng.random(n) < 0.05
+    cash = float(rng.choice([1e3, 5e3, 5e4, 5e5, 5e6]) * rng.uniform(0.5, 1.5))
+    # 行情和账户数据按证券取，同一证券的各笔委托相同
+    return (amounts, prices[keys], limit_prices, paused[keys], high_limit[keys], low_limit[keys],
+            volume_left[keys], closeable[keys], kcb[keys], cash, keys)
+
+
+def test_match_orders_equals_sequential_match_order():
+    rng = np.random.default_rng(20251214)
+    for case in range(3000):
+        *arrays, cash, keys = _random_batch(rng)
+        filled, reasons = match_orders(*arrays, cash, COST, keys=keys)
+        expected_filled, expected_reasons = _sequential(*arrays, cash, keys)
+        assert filled.tolist() == expected_filled.tolist(), case
+        assert reasons.tolist() == expected_reasons.tolist(), case
+
+
+def test_buy_rounds_to_lots():
+    assert _order(250) == (200, OK)
+    assert _order(99) == (0, ZERO_AMOUNT)
+    # 科创板最少 200 股、1 股递增
+    assert _order(250, kcb=True) == (250, OK)
+    assert _order(199, kcb=True) == (0, ZERO_AMOUNT)
+
+
+def test_price_limits_and_protection():
+    assert _order(100, price=11.0) == (0, LIMIT_UP)
+    assert _order(-100, price=9.0, closeable=100) == (0, LIMIT_DOWN)
+    assert _order(100, limit_price=9.99) == (0, PROTECTED)
+    assert _order(-100, limit_price=10.01, closeable=100) == (0, PROTECTED)
+    assert _order(100, paused=True) == (0, PAUSED)
+
+
+def test_sell_limited_to_closeable():
+    # T+1：今天买入的不可卖，只能卖可卖数量
+    assert _order(-500, closeable=0) == (0, ZERO_AMOUNT)
+    assert _order(-500, closeable=300) == (300, OK)
+    # 零股只能一次性卖出
+    assert _order(-150, closeable=150) == (150, OK)
+
+
+def test_volume_cap():
+    assert _order(1000, volume_left=450) == (400, VOLUME_CAP)
+    assert _order(1000, volume_left=450, kcb=True) == (450, VOLUME_CAP)
+    assert _order(-1000, volume_left=450, closeable=1000) == (400, VOLUME_CAP)
+    # 剩余可卖正好在额度内时可以带零股
+    assert _order(-450, volume_left=450, closeable=450) == (450, OK)
+
+
+def test_cash_limit():
+    # 10 元 × 1000 股 + 5 元最低佣金
+    assert _order(1000, cash=10005) == (1000, OK)
+    assert _order(1000, cash=10004.99) == (900, OK)
+    assert _order(100, cash=500) == (0, ZERO_AMOUNT)
+
+
+def test_volume_capped_kcb_buy_below_200_shares():
+    # 科创板部分成交可以少于 200 股，资金够这 150 股时两种撮合都成交 150 股
+    assert _order(1000, volume_left=150, kcb=True, cash=1800) == (150, VOLUME_CAP)
+
+
+def test_same_code_orders_share_volume_cap_and_closeable():
+    # 同一证券的两笔卖出共用 450 股成交量额度和 1000 股可卖数量，两笔买入也共用额度
+    arrays = ([-300, -300, 500, 500], [10.0] * 4, [np.nan] * 4, [False] * 4, [11.0] * 4, [9.0] * 4,
+              [450.0, 450.0, 250.0, 250.0], [1000, 1000, 0, 0], [False, False, True, True])
+    filled, reasons = match_orders(*map(np.array, arrays), 1e9, COST, keys=np.array([7, 7, 8, 8]))
+    assert filled.tolist() == [300, 100, 250, 0]
+    assert reasons.tolist() == [OK, VOLUME_CAP, VOLUME_CAP, VOLUME_CAP]
+    # 不给 keys 时当作不同的证券，各自用满额度
+    filled, _ = match_orders(*map(np.array, arrays), 1e9, COST)
+    assert filled.tolist() == [300, 300, 250, 250]
+
+
+@pytest.mark.parametrize('kcb, bought', [(False, 900), (True, 998)])
+def test_batch_sell_proceeds_fund_buys(kcb, bought):
+    arrays = ([1000, -1000], [10.0, 10.0], [np.nan, np.nan], [False, False], [11.0, 11.0], [9.0, 9.0],
+              [1e9, 1e9], [0, 1000], [kcb, False])
+    # 卖出到手 10000 - 5 - 10 = 9985 元，非科创板只够买 900 股，科创板 998 股
+    filled, reasons = match_orders(*map(np.array, arrays), 0.0, COST)
+    assert reasons.tolist() == [OK, OK]
+    assert filled.tolist() == [bought, 1000]
@@ -0,0 +1,45 @@
+"""分钟回放：同一根分钟线上的多个定时函数共用这根 bar 的成交量额度"""
+import numpy as np
+
+from jqdata.bench import make_synthetic_store
+from jqdata.engine import Engine, load_strategy
+from jqdata.minute import MINUTE_BARS, MINUTE_TIMES, write_minute_bars
+
+STRATEGY = '''
+from jqdata import *
+
+fills = []
+
+
+def initialize(context):
+    set_option('order_volume_ratio', 0.25)
+    run_daily(buy, '10:00')
+    run_daily(buy, '10:00')
+    run_daily(buy, '10:01')
+
+
+def buy(context):
+    order_obj = order(g.code, 10 ** 8)
+    fills.append((context.current_dt.time(), order_obj.filled if order_obj else None))
+'''
+
+
+def test_same_minute_jobs_share_volume_cap(tmp_path):
+    store = make_synthetic_store(str(tmp_path / 'store'), n_codes=10, n_days=5, seed=5)
+    row = 4
+    col = next(c for c in range(len(store.codes)) if not store.field('paused')[row, c]
+               and not store.codes[c].startswith('688'))
+    # 每根分钟线成交 2400 股，价格等于前收盘价（不涨停）
+    close = np.repeat(store.field('close')[row - 1][:, None], MINUTE_BARS, axis=1)
+    write_minute_bars(store, store.dates[row], {'close': close, 'volume': np.full(close.shape, 2400.0)})
+
+    path = tmp_path / 'minute_strategy.py'
+    path.write_text(STRATEGY, encoding='utf-8')
+    strategy = load_strategy(str(path))
+    engine = Engine(store, store.dates[row], store.dates[row], starting_cash=1e12, frequency='minute')
+    engine.start(strategy)
+    engine.g.code = store.codes[col]
+    engine.run_day(row)
+
+    ten, ten_one = MINUTE_TIMES[29], MINUTE_TIMES[30]
+    assert strategy.fills == [(ten, 600), (ten, 0), (ten_one, 600)]
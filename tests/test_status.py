@@ -0,0 +1,72 @@
+"""状态矩阵和 tradable_mask 与逐只检查停牌、ST 的结果一致"""
+import os
+
+import numpy as np
+import pytest
+
+from jqdata import api
+from jqdata.bench import _Harness
+from jqdata.engine import load_strategy
+from jqdata.store import (DELISTING_DAYS, NEW_LISTING_DAYS, STATUS_DELISTING, STATUS_NEW, STATUS_PAUSED,
+                          STATUS_ST, STATUS_UNLISTED, DataStore)
+
+from conftest import REPO
+
+
+def test_status_bits_match_fields(store):
+    status = store.status
+    close, paused, is_st = store.field('close'), store.field('paused'), store.field('is_st')
+    n_days = len(store.dates)
+    for col in range(len(store.codes)):
+        listed = np.flatnonzero(~np.isnan(close[:, col]))
+        for row in range(n_days):
+            expected = 0 if not np.isnan(close[row, col]) else STATUS_UNLISTED
+            expected |= STATUS_PAUSED * bool(paused[row, col]) | STATUS_ST * bool(is_st[row, col])
+            if len(listed):
+                first, last = listed[0], listed[-1]
+                if last < n_days - 1 and last - DELISTING_DAYS < row <= last:
+                    expected |= STATUS_DELISTING
+                if 0 < first <= row < first + NEW_LISTING_DAYS:
+                    expected |= STATUS_NEW
+            assert status[row, col] == expected, (row, col)
+
+
+def test_status_marks_delisting(store):
+    # 把第一只证券在第 150 天之后改成退市
+    fields = {name: np.array(store.field(name)) for name in store.fields}
+    fields['close'][151:, 0] = np.nan
+    status = DataStore(store.dates, store.codes, fields).status[:, 0]
+    assert (status[151 - DELISTING_DAYS:151] & STATUS_DELISTING).all()
+    assert not (status[:151 - DELISTING_DAYS] & STATUS_DELISTING).any()
+    assert (status[151:] & STATUS_UNLISTED).all()
+
+
+@pytest.fixture(scope='module')
+def strategy():
+    return load_strategy(os.path.join(REPO, '251214-rel.py'))
+
+
+@pytest.mark.parametrize('row', [1, 50, 120, 199])
+def test_filter_paused_stock_matches_platform_path(store, strategy, row, monkeypatch):
+    h = _Harness(store, strategy, row)
+    candidates = list(store.codes)
+    local = h.call('filter_paused_stock', candidates)
+    # 平台上没有 tradable_mask，逐只看 get_current_data 的 paused / is_st
+    monkeypatch.setattr(strategy, 'tradable_mask', None)
+    platform = h.call('filter_paused_stock', candidates)
+    listed = set(np.asarray(store.codes)[store.listed(row)])
+    assert local == [code for code in platform if code in listed]
+
+
+def test_tradable_mask_flags(store, strategy):
+    h = _Harness(store, strategy, 199)
+    codes = list(store.codes) + ['999999.XSHG']
+    with api.activate(h.engine):
+        status = h.engine.status(codes)
+        default = api.tradable_mask(codes)
+        everything = api.tradable_mask(codes, paused=False, st=False)
+        strict = api.tradable_mask(codes, delisting=True, new=True)
+    assert status[-1] == STATUS_UNLISTED and not default[-1] and not everything[-1]
+    np.testing.assert_array_equal(default, status & (STATUS_UNLISTED | STATUS_PAUSED | STATUS_ST) == 0)
+    np.testing.assert_array_equal(everything, status & STATUS_UNLISTED == 0)
+    np.testing.assert_array_equal(strict, status == 0)
@@ -0,0 +1,67 @@
+"""DataStore.volume_window 与逐只证券跳过停牌日的滚动均值一致，并按数据版本缓存在磁盘上"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from jqdata.bench import make_synthetic_store
+from jqdata.store import VOLUME_WINDOW_DIR, DataStore, write_store
+
+
+def _naive(store, row, col, lookback):
+    close = store.field('close')[:row, col]
+    tradable = ~store.field('paused')[:row, col] & ~np.isnan(close)
+    volume = pd.Series(store.field('volume')[:row, col][tradable])
+    if len(volume) == 0:
+        return np.nan, np.nan
+    means = volume.shift(1).rolling(lookback).mean()
+    return volume.iloc[-1], means.iloc[-1]
+
+
+def _check(store, lookback, rows, cols):
+    last, means = store.volume_window(lookback)
+    for row in rows:
+        expected = np.array([_naive(store, int(row), col, lookback) for col in cols])
+        # 矩阵是 float32
+        np.testing.assert_allclose(last[row, cols], expected[:, 0], rtol=1e-6)
+        np.testing.assert_allclose(means[row, cols], expected[:, 1], rtol=1e-6)
+
+
+@pytest.mark.parametrize('lookback', [1, 4, 10])
+def test_volume_window_matches_rolling_mean(store, lookback):
+    rng = np.random.default_rng(lookback)
+    rows = np.concatenate((np.arange(0, 15), rng.integers(15, len(store.dates), 20)))
+    _check(store, lookback, rows, rng.choice(len(store.codes), 40, replace=False))
+
+
+def test_volume_window_reaches_back_over_long_suspension(store):
+    # 第一只证券停牌 100 天，回看时要越过整段停牌；第二只从未上市
+    fields = {name: np.array(store.field(name)) for name in store.fields}
+    fields['paused'][80:180, 0] = True
+    fields['close'][:, 1] = np.nan
+    in_memory = DataStore(store.dates, store.codes, fields)
+    _check(in_memory, 4, [79, 100, 185, 199], [0, 1])
+
+
+def test_volume_window_cached_per_data_version(tmp_path):
+    root = str(tmp_path / 'store')
+    store = make_synthetic_store(root, n_codes=20, n_days=40, seed=3)
+    store.volume_window(4)
+    directory = os.path.join(root, VOLUME_WINDOW_DIR)
+    [name] = os.listdir(directory)
+    # 另一个进程打开同一个行情库时直接映射已有的文件
+    last, _ = DataStore.open(root).volume_window(4)
+    assert isinstance(last, np.memmap) and os.listdir(directory) == [name]
+
+    fields = {field: np.array(store.field(field)) for field in store.fields}
+    fields['volume'][30] *= 2
+    store = write_store(root, store.dates, store.codes, fields)
+    store.volume_window(4)
+    assert os.listdir(directory) != [name] and len(os.listdir(directory)) == 1
+    _check(store, 4, [31, 35], range(20))
+
+
+def test_volume_window_rejects_bad_lookback(store):
+    with pytest.raises(ValueError):
+        store.volume_window(0)
@@ -0,0 +1,144 @@
+"""策略脚本里的向量化计算与逐窗口计算一致"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from jqdata.bench import _Harness
+from jqdata.engine import load_strategy
+
+from conftest import REPO
+
+
+@pytest.fixture(scope='module', params=['251214-rel.py', '251214-ab.py'])
+def strategy(request):
+    return load_strategy(os.path.join(REPO, request.param))
+
+
+@pytest.mark.parametrize('window, k', [(20, 2), (5, 1.5)])
+def test_rolling_bollinger_matches_pandas(strategy, window, k):
+    rng = np.random.default_rng(window)
+    # 价格水平很高、波动很小时累计平方和最容易丢精度
+    prices = 1000 + np.cumsum(rng.normal(0, 0.05, (6, 60)), axis=1)
+    mean, bandwidth = strategy.rolling_bollinger(prices, window, k)
+    rolling = pd.DataFrame(prices.T).rolling(window)
+    expected_mean = rolling.mean().values.T[:, window - 1:]
+    expected_bandwidth = 2 * k * rolling.std(ddof=0).values.T[:, window - 1:]
+    np.testing.assert_allclose(mean, expected_mean, rtol=1e-12)
+    np.testing.assert_allclose(bandwidth, expected_bandwidth, rtol=1e-6, atol=1e-9)
+
+    # 一维序列与多只股票的结果相同
+    single_mean, single_bandwidth = strategy.rolling_bollinger(prices[0], window, k)
+    np.testing.assert_allclose(single_mean, mean[0])
+    np.testing.assert_allclose(single_bandwidth, bandwidth[0])
+
+
+def _replay_indicator(strategy, close, volume, start, window=20, k=2, history=40, volume_days=5):
+    """在 (天数 × 股票) 的行情上从第 start 天起逐日推进 BasketIndicator，get_bars 换成按当前天数切片"""
+    dates = np.arange(len(close))
+    bar = np.dtype([('date', 'i8'), ('close', 'f8'), ('volume', 'f8')])
+
+    class Indicator(strategy.BasketIndicator):
+        today = start
+
+        def _fetch(self, count):
+            lo = max(0, self.today - count)
+            return [np.rec.fromarrays([dates[lo:self.today], close[lo:self.today, i], volume[lo:self.today, i]],
+                                      dtype=bar) for i in range(close.shape[1])]
+
+    indicator = Indicator(range(close.shape[1]), window, k, history, volume_days)
+    for today in range(start, len(close) + 1):
+        if today > start:
+            indicator.today = today
+            indicator.update()
+        yield today, indicator
+
+
+def test_basket_indicator_ring_buffers_match_batch(strategy):
+    rng = np.random.default_rng(4)
+    close = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, (200, 5)), axis=0))
+    volume = rng.lognormal(14, 0.5, (200, 5))
+    window, k, history, volume_days = 20, 2, 40, 5
+    for today, indicator in _replay_indicator(strategy, close, volume, 60, window, k, history, volume_days):
+        assert indicator.ready
+        prices = close[today - history:today].mean(axis=1)
+        mean, bandwidths = strategy.rolling_bollinger(prices, window, k)
+        volumes = volume[today - volume_days:today].sum(axis=1)
+        assert indicator.ma == pytest.approx(mean[-1], rel=1e-10)
+        assert indicator.current_bandwidth == pytest.approx(bandwidths[-1], rel=1e-6)
+        assert indicator.avg_bandwidth == pytest.approx(bandwidths[:-1].mean(), rel=1e-6)
+        assert indicator.volume_ratio == pytest.approx(volumes[-1] / volumes[:-1].mean(), rel=1e-10)
+
+
+def test_basket_indicator_not_ready_with_short_history(strategy):
+    close = np.full((30, 2), 10.0)
+    _, indicator = next(_replay_indicator(strategy, close, close, 30))
+    assert not indicator.ready
+
+
+def _band_by_full_sort(codes, values, low, high):
+    n = len(values)
+    idx_low, idx_high = int(n * low), int(n * high)
+    if idx_low >= idx_high:
+        idx_high = min(idx_low + 1, n)
+    order = np.argsort(values, kind='stable')
+    return [codes[i] for i in order[idx_low:idx_high]]
+
+
+@pytest.mark.parametrize('n, low, high', [(1, 0.05, 0.1), (7, 0.05, 0.1), (100, 0.05, 0.1), (5000, 0.05, 0.1),
+                                          (300, 0.0, 1.0), (300, 0.5, 0.5), (20, 0.99, 1.0)])
+def test_select_quantile_band_matches_full_sort(strategy, n, low, high):
+    rng = np.random.default_rng(n)
+    codes = [f'{i:06d}.XSHE' for i in range(n)]
+    values = rng.lognormal(3, 1, n)
+    assert strategy.select_quantile_band(codes, values, low, high) == _band_by_full_sort(codes, values, low, high)
+    # 有相同市值时区间边界上可以选到不同的代码，但市值序列相同
+    ties = np.round(values)
+    band = strategy.select_quantile_band(codes, ties, low, high)
+    expected = _band_by_full_sort(codes, ties, low, high)
+    index = {code: i for i, code in enumerate(codes)}
+    assert [ties[index[c]] for c in band] == [ties[index[c]] for c in expected]
+
+
+def test_select_quantile_band_empty(strategy):
+    assert strategy.select_quantile_band([], np.array([]), 0.05, 0.1) == []
+
+
+def test_drawdown_tracker_matches_running_peak(strategy):
+    rng = np.random.default_rng(14)
+    values = 1e6 * np.exp(np.cumsum(rng.normal(0, 0.01, 500)))
+    tracker = strategy.DrawdownTracker()
+    peaks = np.maximum.accumulate(values)
+    for value, peak in zip(values, peaks):
+        assert tracker.update(value) == pytest.approx((peak - value) / peak)
+    tracker.reset()
+    assert (tracker.high, tracker.drawdown) == (0, 0)
+    assert tracker.update(5.0) == 0 and tracker.high == 5.0
+
+
+@pytest.mark.parametrize('drawdown, triggered', [(0.05, False), (0.12, True)])
+def test_intraday_stop_loss_triggers_and_resets(store, strategy, drawdown, triggered):
+    h = _Harness(store, strategy, len(store.dates) - 1)
+    h.hold_basket()
+    g, context = h.engine.g, h.engine.context
+    assert len(context.portfolio.positions)
+    g.intraday_stop_loss = True
+    g.max_drawdown_threshold = 0.1
+    value = context.portfolio.total_value
+    g.drawdown_tracker.reset(value / (1 - drawdown))
+
+    h.at('every_bar')
+    h.call('trade', context)
+    assert g.stop_loss_status == ('clearing' if triggered else 'normal')
+    # 触发后同一根 bar 就开始卖出
+    assert any(amount < 0 for _, _, amount, _, _ in h.engine.trades) == triggered
+    if not triggered:
+        return
+
+    # 清仓完成后收盘时回到正常状态，回撤监控从头开始
+    h.engine.portfolio.positions.clear()
+    h.at('after_close')
+    h.call('after_market_update', context)
+    assert g.stop_loss_status == 'normal'
+    assert (g.drawdown_tracker.high, g.drawdown_tracker.drawdown) == (0, 0)